@@ -57,3 +57,15 @@ def get_user_from_token(token):
         return user
     except User.DoesNotExist:
         return None
+
+
+async def aget_user_from_token(token):
+    """Async variant of get_user_from_token for async views."""
+    payload = verify_token(token)
+    if not payload:
+        return None
+    
+    try:
+        return await User.objects.aget(id=payload['user_id'])
+    except User.DoesNotExist:
+        return None
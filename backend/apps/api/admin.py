@@ -0,0 +1,34 @@
+from django.contrib import admin
+from django.utils.html import format_html
+from .models import RequestProfile
+from .profiling import top_functions
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view', 'status_code', 'duration_ms', 'samples', 'user']
+    list_filter = ['method', 'view', 'created_at']
+    search_fields = ['path', 'view', 'user__email']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'id', 'user', 'method', 'path', 'view', 'status_code', 'duration_ms',
+        'interval_ms', 'samples', 'created_at', 'top_functions', 'folded_stacks'
+    ]
+    exclude = ['stacks']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def top_functions(self, obj):
+        rows = top_functions(obj.stacks)
+        lines = [f"{'total':>7} {'self':>7}  function"]
+        lines += [f"{total:>7} {own:>7}  {function}" for function, own, total in rows]
+        return format_html('<pre>{}</pre>', "\n".join(lines))
+    top_functions.short_description = 'Top functions (samples)'
+    
+    def folded_stacks(self, obj):
+        return format_html('<pre style="white-space: pre">{}</pre>', obj.stacks)
+    folded_stacks.short_description = 'Stacks (folded)'
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.api'
+    
+    def ready(self):
+        # Registers the query budget system check
+        from . import query_budgets  # noqa: F401
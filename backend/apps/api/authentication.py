@@ -1,6 +1,10 @@
-"""JWT authentication for Django REST Framework."""
+"""JWT authentication for Django REST Framework and WebSocket connections."""
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
 from rest_framework import authentication, exceptions
-from apps.accounts.jwt import get_user_from_token
+from apps.accounts.jwt import get_user_from_token, aget_user_from_token
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -26,3 +30,59 @@ class JWTAuthentication(authentication.BaseAuthentication):
     
     def authenticate_header(self, request):
         return 'Bearer'
+
+
+async def authenticate_async(request):
+    """
+    Authenticate a plain async Django view with the JWT scheme used by DRF.
+    
+    Returns:
+        The active user, or None when the Bearer token is missing or invalid
+    """
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    
+    if not auth_header.startswith('Bearer '):
+        return None
+    
+    token = auth_header.split(' ')[1]
+    user = await aget_user_from_token(token)
+    
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populate ``scope['user']`` for WebSocket connections from a JWT access token.
+    
+    Browsers cannot set headers on a WebSocket handshake, so the token is read
+    from the ``token`` query parameter, falling back to an
+    ``Authorization: Bearer`` header for non-browser clients.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        token = self.get_token(scope)
+        scope['user'] = await self.get_user(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+    
+    @staticmethod
+    def get_token(scope):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if query.get('token'):
+            return query['token'][0]
+        
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                auth_header = value.decode()
+                if auth_header.startswith('Bearer '):
+                    return auth_header.split(' ')[1]
+        return None
+    
+    @database_sync_to_async
+    def get_user(self, token):
+        user = get_user_from_token(token)
+        if user is None or not user.is_active:
+            return AnonymousUser()
+        return user
@@ -0,0 +1,144 @@
+"""WebSocket chat gateway."""
+import asyncio
+import json
+import logging
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework.utils.encoders import JSONEncoder
+from apps.chat.models import Conversation
+from core.bruno_integration import AdmissionRejected, tracer, span
+from core.services import chat_service
+from .serializers import MessageSerializer
+from .views import overloaded_payload
+
+logger = logging.getLogger(__name__)
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Long-lived chat connection for the user's single conversation with Meggy.
+    
+    Client messages:
+        ``{"type": "message", "content": "..."}`` starts a turn
+        ``{"type": "ping"}`` is answered with ``{"type": "pong"}``
+    
+    Server messages:
+        ``connected``, ``user_message``, ``token`` (one per generated chunk),
+        ``done`` (persisted assistant message, also used for notes-mode
+        responses) and ``error``.
+    """
+    # Overridable via ChatConsumer.as_asgi(chat_service=...)
+    chat_service = chat_service
+    
+    # Close code sent when the handshake carries no valid token
+    UNAUTHORIZED = 4401
+    
+    def __init__(self, *args, chat_service=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if chat_service is not None:
+            self.chat_service = chat_service
+    
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=self.UNAUTHORIZED)
+            return
+        
+        self.user = user
+        self.turn = None
+        self.conversation, self.agent = await self.get_conversation()
+        
+        await self.accept()
+        await self.send_json({
+            'type': 'connected',
+            'conversation_id': str(self.conversation.id)
+        })
+    
+    async def disconnect(self, code):
+        turn = getattr(self, 'turn', None)
+        if turn and not turn.done():
+            turn.cancel()
+    
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get('type')
+        
+        if message_type == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif message_type == 'message':
+            text = content.get('content')
+            if not text:
+                await self.send_error('Content is required')
+            elif self.turn and not self.turn.done():
+                await self.send_error('A response is already being generated')
+            else:
+                # Run the turn as a task so pings and disconnects are still handled
+                self.turn = asyncio.create_task(self.run_turn(text))
+        else:
+            await self.send_error(f'Unknown message type: {message_type}')
+    
+    async def run_turn(self, text):
+        """Persist the user message, stream the reply, then persist the reply."""
+        with tracer.trace('ws_turn'):
+            try:
+                with span('message.create'):
+                    user_message = await database_sync_to_async(self.conversation.add_user_message)(text)
+                await self.send_json({
+                    'type': 'user_message',
+                    'message': MessageSerializer(user_message).data
+                })
+                
+                result = {}
+                try:
+                    async for event in self.chat_service.stream_message(
+                        conversation_id=str(self.conversation.id),
+                        user_message=text,
+                        agent_id=str(self.agent.id),
+                        user_id=str(self.user.id)
+                    ):
+                        if event['type'] == 'token':
+                            await self.send_json({'type': 'token', 'content': event['content']})
+                        else:
+                            result = event
+                except AdmissionRejected as e:
+                    # The turn never started; drop the user message so the client can resend it
+                    await user_message.adelete()
+                    await self.send_json({'type': 'error', **overloaded_payload(e)})
+                    return
+                
+                with span('reply.record'):
+                    assistant_message = await self.chat_service.record_reply(
+                        conversation=self.conversation,
+                        agent=self.agent,
+                        user_message=user_message,
+                        response=result,
+                        user_id=str(self.user.id)
+                    )
+                
+                done = {
+                    'type': 'done',
+                    'assistant_message': MessageSerializer(assistant_message).data,
+                    'success': result.get('success', True),
+                    'is_notes_response': result.get('is_notes_response', False)
+                }
+                if result.get('error'):
+                    done['error'] = result['error']
+                await self.send_json(done)
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket turn failed: {str(e)}", exc_info=True)
+                await self.send_error('I apologize, but I encountered an error processing your message.')
+    
+    async def send_error(self, error):
+        await self.send_json({'type': 'error', 'error': error})
+    
+    @database_sync_to_async
+    def get_conversation(self):
+        conversation, _ = Conversation.get_or_create_for_user(self.user)
+        return conversation, conversation.agent
+    
+    @classmethod
+    async def encode_json(cls, content):
+        # Serializer output contains UUIDs and datetimes
+        return json.dumps(content, cls=JSONEncoder)
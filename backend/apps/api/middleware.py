@@ -0,0 +1,289 @@
+"""Request latency and database query metrics for every API request, and on-demand profiling."""
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from functools import lru_cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from apps.accounts.jwt import aget_user_from_token, get_user_from_token
+from core.bruno_integration.metrics import MultiprocessStore, registry
+from .models import RequestProfile
+from .profiling import Profiler
+from .query_budgets import QueryBudgetExceeded, budget_for
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = registry.histogram(
+    'bruno_http_request_duration_seconds',
+    'Time until the response is returned, by view and DRF action',
+    ['view', 'action', 'method', 'status']
+)
+REQUEST_QUERIES = registry.histogram(
+    'bruno_http_request_db_queries',
+    'Database queries issued while handling a request, by view and DRF action',
+    ['view', 'action'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+BUDGET_EXCEEDED = registry.counter(
+    'bruno_http_query_budget_exceeded_total',
+    'Requests that ran more database queries than their view declares',
+    ['view', 'action']
+)
+
+# Queries of the current request; a mutable cell so sync_to_async threads share it
+_queries: ContextVar = ContextVar('bruno_db_queries', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender=None, connection=None, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+@lru_cache(maxsize=None)
+def metrics_store():
+    """Cross-worker store, or None when BRUNO_METRICS_DIR is unset (single process)."""
+    if not settings.BRUNO_METRICS_DIR:
+        return None
+    return MultiprocessStore(settings.BRUNO_METRICS_DIR, settings.BRUNO_METRICS_FLUSH_INTERVAL)
+
+
+def view_labels(request):
+    """``(view, action)`` for the resolved view; DRF viewsets report the action name."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', request.method.lower()
+    func = match.func
+    view = getattr(getattr(func, 'cls', None), '__name__', None) or getattr(func, '__name__', 'unknown')
+    actions = getattr(func, 'actions', None) or {}
+    return view, actions.get(request.method.lower(), request.method.lower())
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency and query count for every request, labelled by view and action,
+    and checks the count against the view's query budget (see ``query_budgets``).
+    
+    Works in both sync and async stacks without adding a thread hop. Queries
+    are counted through a connection execute wrapper, including those run in
+    ``sync_to_async`` threads. Streaming responses are measured until the
+    response starts, so work done while streaming is not included. With
+    ``DEBUG`` on, responses carry an ``X-Query-Count`` header.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        
+        connection_created.connect(_install_query_counter, dispatch_uid='bruno_query_counter')
+        for connection in connections.all(initialized_only=True):
+            _install_query_counter(connection=connection)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, counter, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self._finish(request, response, started, counter)
+        return response
+    
+    async def __acall__(self, request):
+        started, counter, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self._finish(request, response, started, counter)
+        return response
+    
+    def _start(self):
+        store = metrics_store()
+        if store is not None:
+            store.ensure_running(registry)
+        counter = [0]
+        return time.perf_counter(), counter, _queries.set(counter)
+    
+    def _finish(self, request, response, started, counter):
+        view, action = view_labels(request)
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            view=view, action=action, method=request.method, status=response.status_code
+        )
+        queries = counter[0]
+        REQUEST_QUERIES.observe(queries, view=view, action=action)
+        
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(queries)
+        budget = budget_for(request, action)
+        if budget is None or queries <= budget:
+            return
+        
+        BUDGET_EXCEEDED.inc(view=view, action=action)
+        logger.warning(f"{view}.{action} ran {queries} queries, over its budget of {budget}")
+        if settings.DEBUG:
+            response['X-Query-Budget-Exceeded'] = f"{queries}/{budget}"
+        if settings.BRUNO_QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(view, action, queries, budget)
+
+
+def _bearer_token(request):
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+
+def _profile_requested(request):
+    return request.headers.get('X-Bruno-Profile') == '1' or request.GET.get('_profile') == '1'
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests from staff users who ask for it with an
+    ``X-Bruno-Profile: 1`` header or a ``_profile=1`` query parameter.
+    
+    The request runs under the sampling ``Profiler``, the profile is saved as
+    a ``RequestProfile`` (see the admin) and the response carries its ID in
+    ``X-Profile-Id``. Streaming responses are profiled until the stream ends.
+    Staff are recognised by their JWT, so this sits first in MIDDLEWARE and
+    its own queries stay out of the request's query count.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        if not settings.BRUNO_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.roots = [
+            type(self).__call__.__code__,
+            type(self).__acall__.__code__,
+            type(self)._stream.__code__,
+            type(self)._astream.__code__,
+        ]
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not _profile_requested(request):
+            return self.get_response(request)
+        token = _bearer_token(request)
+        user = get_user_from_token(token) if token else None
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+        
+        profiler, profile_id, reset = self._start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.stop(reset)
+            raise
+        
+        response['X-Profile-Id'] = str(profile_id)
+        if response.streaming:
+            response.streaming_content = self._stream(
+                response.streaming_content, profiler, profile_id, request, response, user, reset
+            )
+            return response
+        
+        profiler.stop(reset)
+        self._save(RequestProfile.record, profiler, profile_id, request, response, user)
+        return response
+    
+    async def __acall__(self, request):
+        if not _profile_requested(request):
+            return await self.get_response(request)
+        token = _bearer_token(request)
+        user = await aget_user_from_token(token) if token else None
+        if user is None or not user.is_staff:
+            return await self.get_response(request)
+        
+        profiler, profile_id, reset = self._start()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            profiler.stop(reset)
+            raise
+        
+        response['X-Profile-Id'] = str(profile_id)
+        if response.streaming:
+            # The profiler stays current for the rest of the request's task; its
+            # context ends with the task, so there is nothing to reset
+            stream = self._astream if response.is_async else self._stream
+            response.streaming_content = stream(response.streaming_content, profiler, profile_id, request, response, user)
+            return response
+        
+        profiler.stop(reset)
+        await self._asave(profiler, profile_id, request, response, user)
+        return response
+    
+    def _start(self):
+        profiler = Profiler(settings.BRUNO_PROFILE_INTERVAL_MS / 1000, roots=self.roots)
+        return profiler, uuid.uuid4(), profiler.start()
+    
+    def _stream(self, content, profiler, profile_id, request, response, user, reset=None):
+        # The profiler stays current until the stream ends; a WSGI worker thread
+        # keeps its context between requests, so it is reset then
+        try:
+            yield from content
+        finally:
+            profiler.stop(reset)
+            self._save(RequestProfile.record, profiler, profile_id, request, response, user)
+    
+    async def _astream(self, content, profiler, profile_id, request, response, user):
+        # ASGI servers may send the response from another task than the view's
+        profiler.follow_task()
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            profiler.stop()
+            await self._asave(profiler, profile_id, request, response, user)
+    
+    @staticmethod
+    def _fields(profiler, profile_id, request, response, user):
+        view, action = view_labels(request)
+        return {
+            'id': profile_id,
+            'user': user,
+            'method': request.method,
+            'path': request.get_full_path()[:500],
+            'view': f"{view}.{action}",
+            'status_code': response.status_code,
+            'duration_ms': round(profiler.duration * 1000, 2),
+            'interval_ms': profiler.interval * 1000,
+            'samples': profiler.samples,
+            'stacks': profiler.folded(),
+        }
+    
+    def _save(self, record, profiler, profile_id, request, response, user):
+        try:
+            record(**self._fields(profiler, profile_id, request, response, user))
+        except Exception as e:
+            logger.error(f"Could not save profile of {request.method} {request.path}: {e}")
+    
+    async def _asave(self, profiler, profile_id, request, response, user):
+        try:
+            await RequestProfile.arecord(**self._fields(profiler, profile_id, request, response, user))
+        except Exception as e:
+            logger.error(f"Could not save profile of {request.method} {request.path}: {e}")
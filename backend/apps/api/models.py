@@ -0,0 +1,56 @@
+from django.db import models
+from django.conf import settings
+import uuid
+
+
+class RequestProfile(models.Model):
+    """
+    A sampled profile of one API request, taken on demand for a staff user.
+    
+    Only the newest ``BRUNO_PROFILE_HISTORY`` profiles are kept, as a ring
+    buffer browsable from the admin.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='request_profiles'
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField(null=True, blank=True)
+    duration_ms = models.FloatField(default=0)
+    interval_ms = models.FloatField(default=0)
+    samples = models.IntegerField(default=0)
+    stacks = models.TextField(blank=True, help_text='Sampled stacks in folded format (flamegraph.pl, speedscope)')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'request_profiles'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+    
+    @classmethod
+    def record(cls, **fields):
+        """Save a profile and drop those older than the newest BRUNO_PROFILE_HISTORY."""
+        profile = cls.objects.create(**fields)
+        stale = cls.objects.values_list('id', flat=True)[settings.BRUNO_PROFILE_HISTORY:]
+        cls.objects.filter(id__in=list(stale)).delete()
+        return profile
+    
+    @classmethod
+    async def arecord(cls, **fields):
+        """Async variant of ``record``."""
+        profile = await cls.objects.acreate(**fields)
+        stale = cls.objects.values_list('id', flat=True)[settings.BRUNO_PROFILE_HISTORY:]
+        await cls.objects.filter(id__in=[pk async for pk in stale]).adelete()
+        return profile
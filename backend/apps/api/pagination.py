@@ -0,0 +1,115 @@
+"""
+Keyset pagination for message history.
+
+Page-number pagination counts every row and skips ``OFFSET`` rows for each
+page, so paging deep into a conversation that has grown for months gets
+slower the further back it goes. Keyset pages instead continue from the
+(created_at, id) position of the page edge along the messages index and
+cost the same at any depth.
+"""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.bruno_integration import decode_cursor, encode_cursor, keyset_filter
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Pages of messages, oldest first within a page.
+    
+    Without a cursor a page holds the newest messages. ``previous`` links
+    page back through older history with a ``before`` cursor; ``next`` links
+    fetch newer messages with an ``after`` cursor. ``next`` is set on every
+    non-empty page, so a client can poll it for messages sent since.
+    
+    ``count`` is the total across all pages. Views can supply it from
+    denormalized counters with ``get_message_count()``; otherwise it is
+    counted from the queryset.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    before_query_param = 'before'
+    after_query_param = 'after'
+    invalid_cursor_message = 'Invalid cursor'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            before = self.decode(request, self.before_query_param)
+            after = self.decode(request, self.after_query_param)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        
+        self.count = self.get_count(queryset, view)
+        queryset = queryset.filter(keyset_filter(before, after))
+        if after:
+            page = list(queryset.order_by('created_at', 'id')[:self.page_size])
+            # At least the message the cursor came from
+            self.has_older = True
+        else:
+            page = list(queryset.order_by('-created_at', '-id')[:self.page_size + 1])
+            self.has_older = len(page) > self.page_size
+            page = page[:self.page_size]
+            page.reverse()
+        
+        self.page = page
+        self.after = request.query_params.get(self.after_query_param)
+        return page
+    
+    def get_count(self, queryset, view):
+        if hasattr(view, 'get_message_count'):
+            return view.get_message_count()
+        return queryset.count()
+    
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+    
+    def decode(self, request, param):
+        cursor = request.query_params.get(param)
+        return decode_cursor(cursor) if cursor else None
+    
+    def get_next_link(self):
+        if self.page:
+            cursor = encode_cursor(self.page[-1].created_at, self.page[-1].pk)
+        elif self.after:
+            # Nothing newer yet; poll again from the same position
+            cursor = self.after
+        else:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.before_query_param)
+        return replace_query_param(url, self.after_query_param, cursor)
+    
+    def get_previous_link(self):
+        if not (self.page and self.has_older):
+            return None
+        cursor = encode_cursor(self.page[0].created_at, self.page[0].pk)
+        url = remove_query_param(self.request.build_absolute_uri(), self.after_query_param)
+        return replace_query_param(url, self.before_query_param, cursor)
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,237 @@
+"""
+Wall-clock sampling profiler for single requests.
+
+A background thread samples the request every few milliseconds and counts
+the stacks it finds, in the folded format read by flamegraph.pl and
+speedscope (``outer;inner;leaf count``). Samples cover:
+
+- the request thread, for sync requests;
+- the request's task on the event loop, for async requests: its frames
+  while it runs, and its chain of awaited coroutines while it is suspended;
+- threads running ``sync_to_async`` or ``async_to_sync`` work on behalf of
+  the request, found through the context asgiref copies into them, and
+  appended below the await chain that is waiting for them.
+
+Unlike ``cProfile``, which only sees the thread it was enabled in, this
+follows ``send_message`` across its thread hops and shows where wall-clock
+time goes, including time spent waiting on Ollama or the database.
+"""
+import asyncio
+import gc
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import asgiref.sync
+from django.conf import settings
+
+# The profiler of the current request; copied into sync_to_async threads with the context
+_current: ContextVar = ContextVar('bruno_profiler', default=None)
+
+ASGIREF_SYNC = asgiref.sync.__file__
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        return filename[len(base):]
+    _, marker, rest = filename.rpartition('site-packages' + os.sep)
+    return rest if marker else os.path.basename(filename)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def thread_stack(frame) -> list:
+    """Frames of a thread, outermost first."""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def await_chain(task: asyncio.Task) -> list:
+    """Frames of a suspended task's coroutines, from the task's own down to the innermost awaited."""
+    chain = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = (
+            getattr(awaitable, 'cr_frame', None)
+            or getattr(awaitable, 'gi_frame', None)
+            or getattr(awaitable, 'ag_frame', None)
+        )
+        if frame is None:
+            if type(awaitable).__name__ not in ('async_generator_asend', 'async_generator_athrow'):
+                break
+            # ``async for`` awaits an opaque asend object; step through to its generator
+            awaitable = next((ref for ref in gc.get_referents(awaitable) if inspect.isasyncgen(ref)), None)
+            continue
+        chain.append(frame)
+        awaitable = (
+            getattr(awaitable, 'cr_await', None)
+            or getattr(awaitable, 'gi_yieldfrom', None)
+            or getattr(awaitable, 'ag_await', None)
+        )
+    return chain
+
+
+def asgiref_context(frame):
+    """The context asgiref runs a thread hop's work in, when ``frame`` is where it enters it."""
+    code = frame.f_code
+    if code.co_filename != ASGIREF_SYNC:
+        return None
+    if code.co_name == 'run_child':
+        # sync_to_async: the sync function runs inside ``context``
+        return frame.f_locals.get('context')
+    if code.co_name == 'main_wrap':
+        # async_to_sync: the coroutine runs in ``context[0]``
+        contexts = frame.f_locals.get('context')
+        return contexts[0] if contexts else None
+    return None
+
+
+class Profiler:
+    """Samples one request until stopped; use ``start`` on the thread or task serving it."""
+    
+    def __init__(self, interval: float, roots=()):
+        """
+        Args:
+            interval: Seconds between samples
+            roots: Code objects where stacks start; frames above the first
+                of them (server and event loop plumbing) are dropped
+        """
+        self.interval = interval
+        self.roots = frozenset(roots)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        
+        self.thread_id = None
+        self.loop = None
+        self.task = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+    
+    def start(self):
+        """
+        Start sampling the calling thread, or the calling task when there is
+        a running event loop.
+        
+        Returns:
+            A token for ``stop`` to reset the current profiler with
+        """
+        self.thread_id = threading.get_ident()
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.task = asyncio.current_task()
+        except RuntimeError:
+            pass
+        token = _current.set(self)
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name='bruno-profiler', daemon=True)
+        self._sampler.start()
+        return token
+    
+    def follow_task(self):
+        """Sample the calling task from now on (e.g. a streaming response sent by another task)."""
+        self.task = asyncio.current_task()
+    
+    def stop(self, token=None):
+        """Stop sampling; pass the token from ``start`` to also stop being the current profiler."""
+        try:
+            if self._sampler is not None:
+                self._stop.set()
+                self._sampler.join()
+                self._sampler = None
+                self.duration = time.perf_counter() - self.started
+        finally:
+            if token is not None:
+                _current.reset(token)
+    
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for stack in self.sample(sys._current_frames(), own):
+                self.stacks[";".join(frame_label(frame) for frame in stack)] += 1
+            self.samples += 1
+    
+    def sample(self, frames: Dict[int, object], own: int) -> List[list]:
+        """Stacks belonging to this request in one snapshot of every thread's frames."""
+        stacks = []
+        chain = None
+        if self.task is None:
+            leaf = frames.get(self.thread_id)
+            if leaf is not None:
+                stacks.append(self._trim(thread_stack(leaf)))
+        elif asyncio.current_task(self.loop) is self.task:
+            leaf = frames.get(self.thread_id)
+            if leaf is not None:
+                stacks.append(self._trim(thread_stack(leaf)))
+        elif not self.task.done():
+            chain = self._trim(await_chain(self.task))
+        
+        waited_on = False
+        for ident, leaf in frames.items():
+            if ident in (own, self.thread_id):
+                continue
+            stack = thread_stack(leaf)
+            for depth in range(len(stack) - 1, -1, -1):
+                context = asgiref_context(stack[depth])
+                if context is not None:
+                    break
+            else:
+                continue
+            if context.get(_current) is not self:
+                continue
+            # Hang the thread's work below the coroutine awaiting it
+            stacks.append((chain or []) + stack[depth + 1:])
+            waited_on = True
+        
+        if chain and not waited_on:
+            stacks.append(chain)
+        return stacks
+    
+    def _trim(self, stack: list) -> list:
+        for depth, frame in enumerate(stack):
+            if frame.f_code in self.roots:
+                return stack[depth:]
+        return stack
+    
+    def folded(self) -> str:
+        """Sampled stacks in folded format, most frequent first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def top_functions(folded: str, limit: int = 30) -> List[Tuple[str, int, int]]:
+    """
+    Functions ranked by samples from a folded profile.
+    
+    Returns:
+        ``(function, self samples, total samples)`` tuples, by total samples;
+        self counts samples where the function was the innermost frame, total
+        those where it was anywhere on the stack
+    """
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if not stack:
+            continue
+        count = int(count)
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, own[frame], count) for frame, count in total.most_common(limit)]
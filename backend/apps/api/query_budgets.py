@@ -0,0 +1,77 @@
+"""
+Declared database query budgets for API views.
+
+Viewsets declare ``query_budgets = {action: max queries}``; function views use
+the ``query_budget`` decorator. ``RequestMetricsMiddleware`` compares every
+request's query count with its budget, logs and counts overruns, adds an
+``X-Query-Budget-Exceeded`` header when ``DEBUG`` is on and raises
+``QueryBudgetExceeded`` when ``BRUNO_QUERY_BUDGET_STRICT`` is on, so a test
+run fails on the first N+1 regression. The ``api.W001`` system check flags
+viewset actions without a budget.
+"""
+from django.core import checks
+
+# Actions DRF routes to when a viewset defines the matching method
+STANDARD_ACTIONS = ('list', 'create', 'retrieve', 'update', 'partial_update', 'destroy')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more database queries than its view declares."""
+    
+    def __init__(self, view, action, queries, budget):
+        self.view = view
+        self.action = action
+        self.queries = queries
+        self.budget = budget
+        super().__init__(f"{view}.{action} ran {queries} queries, budget is {budget}")
+
+
+def query_budget(queries):
+    """
+    Declare the most database queries a function view may run per request.
+    
+    Apply it outermost, above ``api_view`` and other view decorators, so the
+    budget is set on the function the URL resolves to.
+    """
+    def decorate(view):
+        view.query_budget = queries
+        return view
+    return decorate
+
+
+def budget_for(request, action):
+    """The declared budget of the view serving this request, or None."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    budget = getattr(match.func, 'query_budget', None)
+    if budget is not None:
+        return budget
+    budgets = getattr(getattr(match.func, 'cls', None), 'query_budgets', None) or {}
+    return budgets.get(action)
+
+
+def viewset_actions(viewset):
+    """Every action name a viewset serves."""
+    actions = [name for name in STANDARD_ACTIONS if hasattr(viewset, name)]
+    actions.extend(extra.__name__ for extra in viewset.get_extra_actions())
+    return actions
+
+
+@checks.register(checks.Tags.urls)
+def check_query_budgets(app_configs, **kwargs):
+    """Warn about routed viewset actions that declare no query budget."""
+    from .urls import router
+    
+    warnings = []
+    for prefix, viewset, basename in router.registry:
+        budgets = getattr(viewset, 'query_budgets', None) or {}
+        for action in viewset_actions(viewset):
+            if action not in budgets:
+                warnings.append(checks.Warning(
+                    f"{viewset.__name__}.{action} has no query budget",
+                    hint=f"Add '{action}' to {viewset.__name__}.query_budgets.",
+                    obj=viewset,
+                    id='api.W001',
+                ))
+    return warnings
@@ -1,7 +1,10 @@
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from apps.accounts.models import User
 from apps.agents.models import Agent
 from apps.chat.models import Conversation, Message
+from core.bruno_integration import encode_cursor
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -47,42 +50,74 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+def head_messages_prefetch():
+    """Prefetch of each conversation's newest messages into ``head_messages``, newest first."""
+    return Prefetch(
+        'messages',
+        queryset=Message.objects.order_by('-created_at', '-id')[:settings.BRUNO_CONVERSATION_HEAD_MESSAGES],
+        to_attr='head_messages'
+    )
+
+
 class ConversationSerializer(serializers.ModelSerializer):
-    """Serializer for Conversation model."""
-    messages = MessageSerializer(many=True, read_only=True)
-    message_count = serializers.SerializerMethodField()
+    """
+    Serializer for Conversation model.
+    
+    Carries only the newest ``BRUNO_CONVERSATION_HEAD_MESSAGES`` messages,
+    oldest first, so the payload stays the same size however long the
+    conversation grows. ``before_cursor`` pages back through older messages
+    (``messages/?before=``) and ``sync_cursor`` fetches newer ones
+    (``conversations/{id}/sync/?since=``).
+    """
+    messages = serializers.SerializerMethodField()
+    before_cursor = serializers.SerializerMethodField()
+    sync_cursor = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
         fields = [
             'id', 'agent', 'title', 'messages', 'message_count',
-            'created_at', 'updated_at'
+            'before_cursor', 'sync_cursor', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'message_count', 'created_at', 'updated_at']
+    
+    def head(self, obj):
+        """The newest messages, oldest first."""
+        if not hasattr(obj, 'head_messages'):
+            prefetch_related_objects([obj], head_messages_prefetch())
+        return obj.head_messages[::-1]
     
-    def get_message_count(self, obj):
-        return obj.messages.count()
+    def get_messages(self, obj):
+        return MessageSerializer(self.head(obj), many=True).data
+    
+    def get_before_cursor(self, obj):
+        head = self.head(obj)
+        if not head or len(head) >= obj.message_count:
+            return None
+        return encode_cursor(head[0].created_at, head[0].pk)
+    
+    def get_sync_cursor(self, obj):
+        head = self.head(obj)
+        if not head:
+            return None
+        return encode_cursor(head[-1].created_at, head[-1].pk)
 
 
 class ConversationListSerializer(serializers.ModelSerializer):
     """Lightweight serializer for conversation lists."""
-    message_count = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
         fields = ['id', 'agent', 'title', 'message_count', 'last_message', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_message_count(self, obj):
-        return obj.messages.count()
+        read_only_fields = ['id', 'message_count', 'created_at', 'updated_at']
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
-            return {
-                'role': last_msg.role,
-                'content': last_msg.content[:100],
-                'created_at': last_msg.created_at
-            }
-        return None
+        # The snapshot stored on the conversation, so rows need no query of their own
+        if obj.last_message_at is None:
+            return None
+        return {
+            'role': obj.last_message_role,
+            'content': obj.last_message_preview,
+            'created_at': obj.last_message_at
+        }
@@ -0,0 +1,27 @@
+"""Server-Sent Events helpers for streaming chat responses."""
+import json
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def sse_event(event: str, data) -> bytes:
+    """Encode one Server-Sent Event frame with a JSON payload."""
+    payload = json.dumps(data, cls=JSONEncoder, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class ServerSentEventRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept ``text/event-stream`` clients.
+    
+    Successful streams bypass rendering entirely; this only renders the
+    regular error responses (404, 400, ...) as a single ``error`` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return sse_event('error', data)
@@ -0,0 +1,114 @@
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase
+
+from apps.accounts.jwt import generate_access_token
+from apps.accounts.models import User
+from apps.api.authentication import JWTAuthMiddleware
+from apps.api.consumers import ChatConsumer
+from apps.chat.models import Conversation, Message
+from core.bruno_integration import AdmissionRejected
+from core.services import chat_service
+
+
+class StubChatService:
+    """Streams a canned reply instead of calling the LLM; replies are recorded for real."""
+    
+    def __init__(self, tokens=('Hi', ' there'), rejected=None):
+        self.tokens = tokens
+        self.rejected = rejected
+    
+    async def stream_message(self, conversation_id, user_message, agent_id, user_id=None):
+        if self.rejected:
+            raise self.rejected
+        for token in self.tokens:
+            yield {'type': 'token', 'content': token}
+        yield {'type': 'done', 'content': ''.join(self.tokens), 'model': 'llama3.2',
+               'prompt_eval_count': 12, 'completion_tokens': len(self.tokens), 'success': True}
+    
+    async def record_reply(self, **kwargs):
+        return await chat_service.record_reply(**kwargs)
+
+
+class ChatConsumerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='ws@example.com', name='Socket', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+    
+    def setUp(self):
+        # Keep record_reply from reaching the LLM through memory extraction or summaries
+        from core.bruno_integration.memory_extraction import memory_extractor
+        for patcher in (
+            mock.patch.object(chat_service, 'summarizer', None),
+            mock.patch.object(memory_extractor, 'extract_memories_from_conversation', mock.AsyncMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def communicator(self, service, token=None):
+        application = JWTAuthMiddleware(ChatConsumer.as_asgi(chat_service=service))
+        path = f'/ws?token={token}' if token else '/ws'
+        return WebsocketCommunicator(application, path)
+    
+    async def connect(self, service):
+        communicator = self.communicator(service, generate_access_token(self.user))
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        hello = await communicator.receive_json_from()
+        self.assertEqual(hello, {'type': 'connected', 'conversation_id': str(self.conversation.id)})
+        return communicator
+    
+    async def test_rejects_missing_and_invalid_tokens(self):
+        for token in (None, 'not-a-jwt'):
+            communicator = self.communicator(StubChatService(), token)
+            connected, code = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, ChatConsumer.UNAUTHORIZED)
+    
+    async def test_streams_tokens_then_done_with_saved_reply(self):
+        communicator = await self.connect(StubChatService())
+        await communicator.send_json_to({'type': 'message', 'content': 'Hello'})
+        
+        user_frame = await communicator.receive_json_from()
+        self.assertEqual(user_frame['type'], 'user_message')
+        self.assertEqual(user_frame['message']['content'], 'Hello')
+        
+        tokens = [await communicator.receive_json_from() for _ in range(2)]
+        self.assertEqual(tokens, [{'type': 'token', 'content': 'Hi'}, {'type': 'token', 'content': ' there'}])
+        
+        done = await communicator.receive_json_from()
+        self.assertEqual(done['type'], 'done')
+        self.assertTrue(done['success'])
+        self.assertFalse(done['is_notes_response'])
+        self.assertEqual(done['assistant_message']['content'], 'Hi there')
+        await communicator.disconnect()
+        
+        reply = await Message.objects.aget(pk=done['assistant_message']['id'])
+        self.assertEqual(reply.role, 'assistant')
+        self.assertEqual(reply.conversation_id, self.conversation.id)
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 2)
+    
+    async def test_overload_sends_error_frame_and_drops_user_message(self):
+        rejected = AdmissionRejected('ollama|llama3.2', 'queue full', 3)
+        communicator = await self.connect(StubChatService(rejected=rejected))
+        await communicator.send_json_to({'type': 'message', 'content': 'Hello'})
+        
+        self.assertEqual((await communicator.receive_json_from())['type'], 'user_message')
+        error = await communicator.receive_json_from()
+        self.assertEqual(error['type'], 'error')
+        self.assertEqual(error['reason'], 'queue full')
+        self.assertEqual(error['retry_after'], 3)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+        
+        self.assertFalse(await Message.objects.filter(conversation=self.conversation).aexists())
+    
+    async def test_ping_and_empty_message(self):
+        communicator = await self.connect(StubChatService())
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.send_json_to({'type': 'message', 'content': ''})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'error', 'error': 'Content is required'})
+        await communicator.disconnect()
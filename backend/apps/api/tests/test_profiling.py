@@ -0,0 +1,47 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from apps.accounts.jwt import generate_access_token
+from apps.accounts.models import User
+from apps.api.middleware import ProfilingMiddleware
+from apps.api.profiling import _current
+
+
+@override_settings(BRUNO_PROFILING_ENABLED=True)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', name='Staff', password='secret-pass', is_staff=True
+        )
+    
+    def request(self):
+        return RequestFactory().get(
+            '/api/conversations/', HTTP_X_BRUNO_PROFILE='1',
+            HTTP_AUTHORIZATION=f'Bearer {generate_access_token(self.staff)}'
+        )
+    
+    def test_failed_request_leaves_no_current_profiler(self):
+        def view(request):
+            raise RuntimeError('view failed')
+        
+        with self.assertRaises(RuntimeError):
+            ProfilingMiddleware(view)(self.request())
+        self.assertIsNone(_current.get())
+    
+    async def test_failed_async_request_leaves_no_current_profiler(self):
+        async def view(request):
+            raise RuntimeError('view failed')
+        
+        with self.assertRaises(RuntimeError):
+            await ProfilingMiddleware(view)(self.request())
+        self.assertIsNone(_current.get())
+    
+    def test_profiler_is_reset_after_response_and_stream(self):
+        response = ProfilingMiddleware(lambda request: HttpResponse('ok'))(self.request())
+        self.assertIn('X-Profile-Id', response)
+        self.assertIsNone(_current.get())
+        
+        streamed = ProfilingMiddleware(lambda request: StreamingHttpResponse(iter(['a', 'b'])))(self.request())
+        self.assertEqual(b''.join(streamed.streaming_content), b'ab')
+        self.assertIsNone(_current.get())
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from apps.accounts.jwt import generate_access_token
+from apps.accounts.models import User
+from core.services import chat_service
+
+
+class PrometheusMetricsAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', name='User', password='secret-pass')
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', name='Staff', password='secret-pass', is_staff=True
+        )
+    
+    def test_closed_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {generate_access_token(self.user)}')
+        self.assertEqual(response.status_code, 404)
+    
+    def test_staff_can_read(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {generate_access_token(self.staff)}')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+    
+    @override_settings(BRUNO_METRICS_TOKEN='scrape-secret')
+    def test_scrape_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+    
+    def test_summarizer_stats_exported(self):
+        summarizer = mock.Mock()
+        summarizer.stats.return_value = {
+            'updates': 3, 'failures': 1, 'conflicts': 0, 'deferred': 2, 'turns': 10,
+            'turns_with_summary': 4, 'tokens_saved': 800, 'running': 1,
+        }
+        with mock.patch.object(chat_service, 'summarizer', summarizer):
+            body = self.client.get(
+                '/metrics', HTTP_AUTHORIZATION=f'Bearer {generate_access_token(self.staff)}'
+            ).content.decode()
+        for sample in ('bruno_summary_updates_total{result="deferred"} 2',
+                       'bruno_summary_updates_total{result="failed"} 1',
+                       'bruno_summary_turns_total{summary="used"} 4',
+                       'bruno_summary_turns_total{summary="none"} 6',
+                       'bruno_summary_prompt_tokens_saved_total 800',
+                       'bruno_summary_updates_running 1'):
+            self.assertIn(sample, body)
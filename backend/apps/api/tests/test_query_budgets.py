@@ -0,0 +1,140 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+from rest_framework import viewsets
+from rest_framework.routers import DefaultRouter
+
+from apps.accounts.jwt import generate_access_token
+from apps.accounts.models import User
+from apps.api.query_budgets import QueryBudgetExceeded, budget_for, check_query_budgets, query_budget
+from apps.api.views import ConversationViewSet
+from apps.chat.models import Conversation, Message
+from core.bruno_integration import encode_cursor
+from core.services import chat_service
+
+
+class UnbudgetedViewSet(viewsets.ViewSet):
+    query_budgets = {'list': 2}
+    
+    def list(self, request):
+        pass
+    
+    def retrieve(self, request, pk=None):
+        pass
+
+
+class QueryBudgetTests(SimpleTestCase):
+    def test_query_budget_sets_budget(self):
+        @query_budget(4)
+        def view(request):
+            pass
+        self.assertEqual(view.query_budget, 4)
+    
+    def test_budget_for_function_view(self):
+        request = RequestFactory().get('/api/metrics/')
+        request.resolver_match = resolve('/api/metrics/')
+        self.assertEqual(budget_for(request, 'get'), 1)
+    
+    def test_budget_for_viewset_action(self):
+        request = RequestFactory().get('/api/conversations/')
+        request.resolver_match = resolve('/api/conversations/')
+        self.assertEqual(budget_for(request, 'list'), ConversationViewSet.query_budgets['list'])
+        self.assertIsNone(budget_for(request, 'unknown'))
+    
+    def test_budget_for_unresolved_request(self):
+        self.assertIsNone(budget_for(RequestFactory().get('/'), 'get'))
+    
+    def test_routed_actions_have_budgets(self):
+        self.assertEqual(check_query_budgets(None), [])
+    
+    def test_check_flags_action_without_budget(self):
+        router = DefaultRouter()
+        router.register(r'things', UnbudgetedViewSet, basename='thing')
+        with mock.patch('apps.api.urls.router', router):
+            warnings = check_query_budgets(None)
+        self.assertEqual([warning.id for warning in warnings], ['api.W001'])
+        self.assertIn('UnbudgetedViewSet.retrieve', warnings[0].msg)
+
+
+@override_settings(BRUNO_QUERY_BUDGET_STRICT=True)
+class StrictBudgetTests(TestCase):
+    """Budgeted API actions run within their budgets; any overrun raises QueryBudgetExceeded."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='budget@example.com', name='Budget', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+        for i in range(30):
+            Message.objects.create(conversation=cls.conversation, role='user' if i % 2 == 0 else 'assistant',
+                                   content=f'Message {i}')
+    
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {generate_access_token(self.user)}'
+    
+    def test_conversation_list(self):
+        self.assertEqual(self.client.get('/api/conversations/').status_code, 200)
+    
+    def test_conversation_detail(self):
+        response = self.client.get(f'/api/conversations/{self.conversation.pk}/')
+        self.assertEqual(response.status_code, 200)
+        unchanged = self.client.get(
+            f'/api/conversations/{self.conversation.pk}/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(unchanged.status_code, 304)
+    
+    def test_get_or_create(self):
+        self.assertEqual(self.client.get('/api/conversations/get_or_create/').status_code, 200)
+        newcomer = User.objects.create_user(email='new@example.com', name='New', password='secret-pass')
+        response = self.client.get(
+            '/api/conversations/get_or_create/',
+            HTTP_AUTHORIZATION=f'Bearer {generate_access_token(newcomer)}'
+        )
+        self.assertTrue(response.json()['created'])
+    
+    def test_messages_page(self):
+        first = self.client.get('/api/messages/?page_size=10').json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['count'], 30)
+        older = self.client.get(first['previous'])
+        self.assertEqual(older.status_code, 200)
+    
+    def test_messages_filtered_by_conversation(self):
+        other = User.objects.create_user(email='other@example.com', name='Other', password='secret-pass')
+        other_conversation, _ = Conversation.get_or_create_for_user(other)
+        response = self.client.get(f'/api/messages/?conversation={self.conversation.pk}&page_size=5').json()
+        self.assertEqual(response['count'], 30)
+        self.assertEqual(len(response['results']), 5)
+        foreign = self.client.get(f'/api/messages/?conversation={other_conversation.pk}').json()
+        self.assertEqual((foreign['count'], foreign['results']), (0, []))
+        self.assertEqual(self.client.get('/api/messages/?conversation=nope').status_code, 400)
+    
+    def test_sync(self):
+        url = f'/api/conversations/{self.conversation.pk}/sync/'
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['messages']), 30)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        
+        # A validator from one cursor must not answer a sync from another
+        seen = Message.objects.filter(conversation=self.conversation).order_by('created_at', 'id')[19]
+        later = self.client.get(
+            url, {'since': encode_cursor(seen.created_at, seen.pk)}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(later.status_code, 200)
+        self.assertEqual(len(later.json()['messages']), 10)
+    
+    def test_send_message(self):
+        reply = {'content': 'Hi there', 'model': 'llama3.2', 'tokens_used': 12, 'success': True}
+        with mock.patch.object(chat_service, 'process_message', mock.AsyncMock(return_value=reply)), \
+                mock.patch.object(chat_service, 'summarizer', None):
+            response = self.client.post(
+                f'/api/conversations/{self.conversation.pk}/send_message/',
+                {'content': 'Hello'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['assistant_message']['content'], 'Hi there')
+    
+    def test_overrun_raises(self):
+        with mock.patch.dict(ConversationViewSet.query_budgets, {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/conversations/')
@@ -0,0 +1,49 @@
+import asyncio
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.chat.models import Conversation, DailyUsage, Message
+from core.bruno_integration import AdmissionRejected
+from core.services import chat_service
+
+
+class SendTurnTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='turn@example.com', name='Turn', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+    
+    async def load_conversation(self):
+        return await Conversation.objects.select_related('agent').aget(pk=self.conversation.pk)
+    
+    async def test_resubmits_share_one_stored_turn(self):
+        async def generate(**kwargs):
+            await asyncio.sleep(0.05)
+            return {'content': 'Hi there', 'model': 'llama3.2', 'prompt_eval_count': 20, 'completion_tokens': 5,
+                    'success': True}
+        
+        process = mock.AsyncMock(side_effect=generate)
+        with mock.patch.object(chat_service, 'process_message', process), \
+                mock.patch.object(chat_service, 'summarizer', None):
+            turns = await asyncio.gather(*[
+                chat_service.send_turn(await self.load_conversation(), 'Hello', str(self.user.id))
+                for _ in range(3)
+            ])
+        
+        self.assertEqual(process.await_count, 1)
+        self.assertEqual({turn[0].pk for turn in turns}, {turns[0][0].pk})
+        self.assertEqual({turn[1].pk for turn in turns}, {turns[0][1].pk})
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 2)
+        conversation = await Conversation.objects.aget(pk=self.conversation.pk)
+        self.assertEqual(conversation.message_count, 2)
+        usage = await DailyUsage.objects.aget(user=self.user)
+        self.assertEqual(usage.replies, 1)
+    
+    async def test_rejected_turn_keeps_no_messages(self):
+        rejected = AdmissionRejected('ollama|llama3.2', 'queue full', 3)
+        with mock.patch.object(chat_service, 'process_message', mock.AsyncMock(side_effect=rejected)):
+            with self.assertRaises(AdmissionRejected):
+                await chat_service.send_turn(await self.load_conversation(), 'Hello', str(self.user.id))
+        self.assertFalse(await Message.objects.filter(conversation=self.conversation).aexists())
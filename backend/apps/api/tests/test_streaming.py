@@ -0,0 +1,92 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from apps.accounts.jwt import generate_access_token
+from apps.accounts.models import User
+from apps.api.streaming import sse_event
+from apps.chat.models import Conversation, Message
+from core.bruno_integration import AdmissionRejected
+from core.services import chat_service
+
+
+def parse_events(body):
+    """(event, data) pairs of an SSE body; every frame must be complete."""
+    text = body.decode('utf-8')
+    assert text.endswith('\n\n'), text
+    events = []
+    for frame in text[:-2].split('\n\n'):
+        event, data = frame.split('\n')
+        assert event.startswith('event: ') and data.startswith('data: '), frame
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class SseEventTests(SimpleTestCase):
+    def test_frame_layout(self):
+        self.assertEqual(
+            sse_event('token', {'content': 'Hi'}),
+            b'event: token\ndata: {"content": "Hi"}\n\n'
+        )
+    
+    def test_newlines_and_unicode_stay_inside_the_data_line(self):
+        frame = sse_event('token', {'content': 'line one\nline two — ok'})
+        self.assertEqual(frame.count(b'\n'), 3)
+        self.assertEqual(parse_events(frame), [('token', {'content': 'line one\nline two — ok'})])
+
+
+class SendMessageStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='sse@example.com', name='Stream', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+    
+    def setUp(self):
+        from core.bruno_integration.memory_extraction import memory_extractor
+        for patcher in (
+            mock.patch.object(chat_service, 'summarizer', None),
+            mock.patch.object(memory_extractor, 'extract_memories_from_conversation', mock.AsyncMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    async def stream(self, events):
+        async def stream_message(**kwargs):
+            for event in events:
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        
+        with mock.patch.object(chat_service, 'stream_message', stream_message):
+            response = await self.async_client.post(
+                f'/api/conversations/{self.conversation.pk}/send_message_stream/',
+                {'content': 'Hello'}, content_type='application/json',
+                headers={'Authorization': f'Bearer {generate_access_token(self.user)}'}
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        return parse_events(body)
+    
+    async def test_tokens_then_done_with_saved_reply(self):
+        events = await self.stream([
+            {'type': 'token', 'content': 'Hi'},
+            {'type': 'token', 'content': ' there'},
+            {'type': 'done', 'content': 'Hi there', 'model': 'llama3.2', 'success': True},
+        ])
+        
+        self.assertEqual([name for name, _ in events], ['user_message', 'token', 'token', 'done'])
+        self.assertEqual(events[0][1]['content'], 'Hello')
+        self.assertEqual([data['content'] for name, data in events if name == 'token'], ['Hi', ' there'])
+        done = events[-1][1]
+        self.assertTrue(done['success'])
+        self.assertFalse(done['is_notes_response'])
+        reply = await Message.objects.aget(pk=done['assistant_message']['id'])
+        self.assertEqual((reply.role, reply.content), ('assistant', 'Hi there'))
+    
+    async def test_overload_ends_with_error_event(self):
+        events = await self.stream([AdmissionRejected('ollama|llama3.2', 'queue full', 3)])
+        
+        self.assertEqual([name for name, _ in events], ['user_message', 'error'])
+        self.assertEqual(events[-1][1]['retry_after'], 3)
+        self.assertFalse(await Message.objects.filter(conversation=self.conversation).aexists())
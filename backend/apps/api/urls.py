@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from .views import UserViewSet, AgentViewSet, ConversationViewSet, MessageViewSet
+from .views import UserViewSet, AgentViewSet, ConversationViewSet, MessageViewSet, send_message, metrics
 from .auth_views import register, login, refresh_token, logout
 
 @api_view(['GET'])
@@ -30,6 +30,12 @@ urlpatterns = [
     path('auth/refresh/', refresh_token, name='refresh_token'),
     path('auth/logout/', logout, name='logout'),
     
+    # Async chat endpoint (must precede the router so it serves this path)
+    path('conversations/<uuid:pk>/send_message/', send_message, name='conversation-send-message'),
+    
+    # Pipeline timings and counters (staff only)
+    path('metrics/', metrics, name='metrics'),
+    
     # API endpoints
     path('', include(router.urls)),
 ]
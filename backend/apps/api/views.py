@@ -1,24 +1,60 @@
+import hashlib
+import json
+import logging
+import uuid
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
 from django.contrib.auth import authenticate
-from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db.models import Sum, prefetch_related_objects
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from apps.accounts.jwt import get_user_from_token
 from apps.accounts.models import User
 from apps.agents.models import Agent
 from apps.chat.models import Conversation, Message
+from core.bruno_integration import (
+    AdmissionRejected, tracer, span, registry, render, decode_cursor, encode_cursor, keyset_filter,
+)
 from core.services import chat_service
 from .serializers import (
     UserSerializer, UserCreateSerializer,
     AgentSerializer,
     ConversationSerializer, ConversationListSerializer,
-    MessageSerializer
+    MessageSerializer, head_messages_prefetch
 )
+from .authentication import authenticate_async
+from .middleware import metrics_store
+from .pagination import MessageCursorPagination
+from .query_budgets import query_budget
+from .streaming import sse_event, ServerSentEventRenderer
+
+logger = logging.getLogger(__name__)
 
 
 class UserViewSet(viewsets.ModelViewSet):
     """ViewSet for User operations."""
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    # Most database queries per request, authentication included (see query_budgets)
+    query_budgets = {
+        'list': 3,
+        'retrieve': 2,
+        'me': 1,
+        'create': 3,
+        'update': 4,
+        'partial_update': 4,
+        # Cascades through every table holding the user's data
+        'destroy': 16,
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -40,6 +76,15 @@ class AgentViewSet(viewsets.ModelViewSet):
     """ViewSet for Agent operations."""
     serializer_class = AgentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {
+        'list': 3,
+        'retrieve': 2,
+        'default': 3,
+        'create': 3,
+        'update': 5,
+        'partial_update': 5,
+        'destroy': 6,
+    }
     
     def get_queryset(self):
         return Agent.objects.filter(user=self.request.user)
@@ -68,6 +113,19 @@ class ConversationViewSet(viewsets.ModelViewSet):
     Note: Each user has ONE conversation with Meggy (continuous timeline).
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {
+        'list': 3,
+        'retrieve': 3,
+        # Creating the conversation also creates the default agent
+        'get_or_create': 10,
+        'create': 6,
+        'update': 7,
+        'partial_update': 6,
+        'destroy': 6,
+        'sync': 3,
+        # Counted until the stream starts; the reply is saved after the response
+        'send_message_stream': 6,
+    }
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -78,6 +136,16 @@ class ConversationViewSet(viewsets.ModelViewSet):
         # Users only see their single conversation
         return Conversation.objects.filter(user=self.request.user)
     
+    def retrieve(self, request, *args, **kwargs):
+        conversation = self.get_object()
+        etag = conversation_etag(conversation)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        
+        prefetch_related_objects([conversation], head_messages_prefetch())
+        return with_etag(Response(self.get_serializer(conversation).data), etag)
+    
     def perform_create(self, serializer):
         # This shouldn't normally be called - use get_or_create endpoint instead
         serializer.save(user=self.request.user)
@@ -89,15 +157,74 @@ class ConversationViewSet(viewsets.ModelViewSet):
         This is the primary way to access the conversation.
         """
         conversation, created = Conversation.get_or_create_for_user(request.user)
+        if created:
+            # Nothing to prefetch yet
+            conversation.head_messages = []
+        
+        etag = conversation_etag(conversation)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        
+        if not hasattr(conversation, 'head_messages'):
+            prefetch_related_objects([conversation], head_messages_prefetch())
         serializer = self.get_serializer(conversation)
-        return Response({
+        return with_etag(Response({
             'conversation': serializer.data,
             'created': created
-        })
+        }), etag)
+    
+    @action(detail=True, methods=['get'])
+    def sync(self, request, pk=None):
+        """
+        Messages added since a sync cursor, oldest first.
+        
+        ``since`` is the ``sync_cursor`` of the conversation payload or of the
+        previous sync (from the first message when absent). While
+        ``has_more`` is true, call again with the returned cursor. A client
+        whose ``message_count`` no longer matches what it holds should reload
+        the conversation, since messages can also be deleted.
+        """
+        conversation = self.get_object()
+        since = request.query_params.get('since')
+        try:
+            position = decode_cursor(since) if since else None
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # The body depends on the cursor, so responses for different cursors must not share a validator
+        etag = conversation_etag(conversation, variant=f'sync:{since or ""}')
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        
+        limit = MessageCursorPagination.max_page_size
+        messages = list(
+            conversation.messages.filter(keyset_filter(after=position)).order_by('created_at', 'id')[:limit + 1]
+        )
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        
+        return with_etag(Response({
+            'messages': MessageSerializer(messages, many=True).data,
+            'sync_cursor': encode_cursor(messages[-1].created_at, messages[-1].pk) if messages else since,
+            'has_more': has_more,
+            'message_count': conversation.message_count
+        }), etag)
     
-    @action(detail=True, methods=['post'])
-    def send_message(self, request, pk=None):
-        """Send a message in a conversation."""
+    @action(
+        detail=True,
+        methods=['post'],
+        renderer_classes=[JSONRenderer, ServerSentEventRenderer]
+    )
+    def send_message_stream(self, request, pk=None):
+        """
+        Send a message and stream the assistant reply as Server-Sent Events.
+        
+        Emits a ``user_message`` event, one ``token`` event per generated
+        chunk, then a ``done`` event carrying the persisted assistant message.
+        Tokens only arrive incrementally when served by an ASGI server.
+        """
         conversation = self.get_object()
         content = request.data.get('content')
         
@@ -107,78 +234,249 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=content
-        )
-        
-        # Update conversation title if this is the first message
-        if conversation.messages.count() == 1 and conversation.title == 'New Conversation':
-            # Generate title from first user message (first 50 chars)
-            new_title = content[:50] + ('...' if len(content) > 50 else '')
-            conversation.title = new_title
-            conversation.save()
+        user_message = conversation.add_user_message(content)
         
-        try:
-            # Process message through Bruno chat service
-            response = async_to_sync(chat_service.process_message)(
-                conversation_id=str(conversation.id),
-                user_message=content,
-                agent_id=str(conversation.agent.id),
-                user_id=str(request.user.id)
-            )
-            
-            # Create assistant message with response
-            assistant_message = Message.objects.create(
-                conversation=conversation,
-                role='assistant',
-                content=response.get('content', 'I apologize, but I encountered an error.'),
-                model=response.get('model', conversation.agent.model),
-                tokens_used=response.get('tokens_used', 0)
-            )
+        response = StreamingHttpResponse(
+            self._stream_reply(conversation, conversation.agent, user_message, str(request.user.id)),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    async def _stream_reply(self, conversation, agent, user_message, user_id):
+        """Relay agent tokens as SSE frames, then persist the assistant message."""
+        with tracer.trace('send_message_stream'):
+            yield sse_event('user_message', MessageSerializer(user_message).data)
             
-            # Extract and save long-term memories from user message (async background task)
+            result = {}
             try:
-                from core.bruno_integration.memory_extraction import memory_extractor
-                async_to_sync(memory_extractor.extract_memories_from_conversation)(
-                    user_id=str(request.user.id),
-                    conversation_text=content,
-                    message_id=str(user_message.id)
+                async for event in chat_service.stream_message(
+                    conversation_id=str(conversation.id),
+                    user_message=user_message.content,
+                    agent_id=str(agent.id),
+                    user_id=user_id
+                ):
+                    if event['type'] == 'token':
+                        yield sse_event('token', {'content': event['content']})
+                    else:
+                        result = event
+            except AdmissionRejected as e:
+                # The turn never started; drop the user message so the client can resend it
+                await user_message.adelete()
+                yield sse_event('error', overloaded_payload(e))
+                return
+            
+            with span('reply.record'):
+                assistant_message = await chat_service.record_reply(
+                    conversation=conversation,
+                    agent=agent,
+                    user_message=user_message,
+                    response=result,
+                    user_id=user_id
                 )
-            except Exception as mem_error:
-                # Don't fail the request if memory extraction fails
-                import logging
-                logging.getLogger(__name__).warning(f"Memory extraction failed: {mem_error}")
             
-            return Response({
-                'user_message': MessageSerializer(user_message).data,
+            done = {
                 'assistant_message': MessageSerializer(assistant_message).data,
-                'success': response.get('success', True)
-            })
-            
-        except Exception as e:
-            # Create error response message
-            assistant_message = Message.objects.create(
-                conversation=conversation,
-                role='assistant',
-                content='I apologize, but I encountered an error processing your message. Please try again.',
-                model=conversation.agent.model
-            )
-            
-            return Response({
+                'success': result.get('success', True),
+                'is_notes_response': result.get('is_notes_response', False)
+            }
+            if result.get('error'):
+                done['error'] = result['error']
+            yield sse_event('done', done)
+
+
+def conversation_etag(conversation, variant=''):
+    """
+    Validator for responses built from a conversation; it changes whenever a
+    message is added or deleted or the conversation itself is saved.
+    
+    ``variant`` distinguishes different representations of the same state,
+    such as sync responses for different cursors.
+    """
+    state = (
+        f"{conversation.pk}:{conversation.message_count}:{conversation.last_message_at}:"
+        f"{conversation.updated_at.isoformat()}:{variant}"
+    )
+    return quote_etag(hashlib.md5(state.encode(), usedforsecurity=False).hexdigest())
+
+
+def with_etag(response, etag):
+    """Mark a response with its ETag and have clients revalidate it on every use."""
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, etag):
+    """A 304 response when the request's If-None-Match already matches ``etag``, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return with_etag(response, etag)
+
+
+def overloaded_payload(error):
+    """Body sent to clients when a turn is rejected by admission control."""
+    return {
+        'error': 'Meggy is busy right now. Please try again shortly.',
+        'reason': error.reason,
+        'retry_after': error.retry_after
+    }
+
+
+@query_budget(18)
+@csrf_exempt
+@require_POST
+async def send_message(request, pk):
+    """
+    Send a message in a conversation.
+    
+    Natively async so that no worker thread is held while the LLM generates:
+    authentication, ORM access and the chat service are all awaited, and
+    concurrency is bounded by the LLM backend instead of the thread pool.
+    When the model's wait queue is full the turn is rejected with 429 and a
+    ``Retry-After`` header, and the user message is not kept. Resubmitting a
+    message while its turn is still running returns that turn's messages
+    rather than storing them again.
+    Routed at ``conversations/{id}/send_message/`` ahead of the viewset.
+    """
+    with tracer.trace('send_message'):
+        return await _send_message(request, pk)
+
+
+async def _send_message(request, pk):
+    with span('auth'):
+        user = await authenticate_async(request)
+    if user is None:
+        response = JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    
+    try:
+        with span('conversation.fetch'):
+            conversation = await Conversation.objects.select_related('agent').aget(pk=pk, user=user)
+    except Conversation.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        content = json.loads(request.body or b'{}').get('content')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not content:
+        return JsonResponse(
+            {'error': 'Content is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        # Persists both messages; a resubmit of a running turn gets that turn's messages
+        user_message, assistant_message, response = await chat_service.send_turn(
+            conversation, content, str(user.id)
+        )
+        
+        with span('serialize'):
+            return JsonResponse({
                 'user_message': MessageSerializer(user_message).data,
                 'assistant_message': MessageSerializer(assistant_message).data,
-                'success': False,
-                'error': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'success': response.get('success', True)
+            }, encoder=JSONEncoder)
+    
+    except AdmissionRejected as e:
+        # The turn never started and its user message was dropped; the client can resend it
+        response = JsonResponse(overloaded_payload(e), status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    
+    except Exception as e:
+        # Generation errors are recorded as error replies by the turn; this is
+        # a failure to store the turn itself, so there is nothing to show
+        logger.error(f"Error sending message: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def can_scrape_metrics(request):
+    """Whether the request carries the configured scrape token or comes from a staff user."""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    token = settings.BRUNO_METRICS_TOKEN
+    if token and constant_time_compare(auth_header, f'Bearer {token}'):
+        return True
+    
+    user = request.user
+    if not user.is_authenticated and auth_header.startswith('Bearer '):
+        user = get_user_from_token(auth_header.split(' ')[1])
+    return bool(user and user.is_active and user.is_staff)
+
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint, served at ``/metrics``.
+    
+    Reports every worker when ``BRUNO_METRICS_DIR`` is shared between them,
+    otherwise this process only. Closed by default: only staff users (session
+    or access token) may read it, and scrapers are let in by configuring
+    ``BRUNO_METRICS_TOKEN`` and sending ``Authorization: Bearer <token>``.
+    Anyone else gets 403 when scraping is configured and 404 otherwise.
+    """
+    if not can_scrape_metrics(request):
+        if settings.BRUNO_METRICS_TOKEN:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    
+    store = metrics_store()
+    families = store.collect() if store is not None else registry.snapshot()
+    return HttpResponse(render(families), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """Per-stage latency totals and LLM pipeline counters for this worker (staff only)."""
+    return Response(chat_service.metrics())
 
 
 class MessageViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet for Message operations (read-only)."""
+    """
+    ViewSet for Message operations (read-only).
+    
+    ``?conversation=<id>`` limits the list to one of the user's conversations.
+    """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
+    query_budgets = {
+        'list': 3,
+        'retrieve': 2,
+    }
     
     def get_queryset(self):
-        return Message.objects.filter(conversation__user=self.request.user)
+        queryset = Message.objects.filter(conversation__user=self.request.user)
+        conversation_id = self.conversation_filter()
+        if conversation_id:
+            queryset = queryset.filter(conversation_id=conversation_id)
+        return queryset
+    
+    def conversation_filter(self):
+        conversation_id = self.request.query_params.get('conversation')
+        if not conversation_id:
+            return None
+        try:
+            return uuid.UUID(conversation_id)
+        except ValueError:
+            raise ValidationError({'error': 'Invalid conversation id'})
+    
+    def get_message_count(self):
+        """Total for the paginated list, from the conversation counters instead of a COUNT over messages."""
+        conversations = Conversation.objects.filter(user=self.request.user)
+        conversation_id = self.conversation_filter()
+        if conversation_id:
+            conversations = conversations.filter(id=conversation_id)
+        return conversations.aggregate(count=Sum('message_count'))['count'] or 0
@@ -1,22 +1,33 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, DailyUsage, Message
 
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'user', 'agent', 'created_at', 'updated_at']
+    list_display = ['title', 'user', 'agent', 'message_count', 'last_message_at', 'created_at', 'updated_at']
     list_filter = ['created_at']
     search_fields = ['title', 'user__email']
     ordering = ['-updated_at']
+    # Maintained by message writes (see backfill_conversation_stats)
+    readonly_fields = ['message_count', 'last_message_at', 'last_message_role', 'last_message_preview']
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['conversation', 'role', 'content_preview', 'tokens_used', 'created_at']
-    list_filter = ['role', 'created_at']
+    list_display = ['conversation', 'role', 'content_preview', 'tokens_used', 'completion_tokens', 'total_duration_ms', 'created_at']
+    list_filter = ['role', 'model', 'created_at']
     search_fields = ['content', 'conversation__title']
     ordering = ['-created_at']
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
+
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(admin.ModelAdmin):
+    list_display = ['date', 'user', 'replies', 'cached_replies', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'eval_duration_ms']
+    list_filter = ['date']
+    search_fields = ['user__email']
+    ordering = ['-date', '-total_tokens']
+    date_hierarchy = 'date'
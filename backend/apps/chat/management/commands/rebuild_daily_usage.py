@@ -0,0 +1,68 @@
+"""
+Management command to rebuild the per-user daily usage rollup from messages
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from apps.chat.models import DailyUsage, Message
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyUsage rows from the usage stored on assistant messages'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='First UTC day to rebuild (YYYY-MM-DD); defaults to all history',
+        )
+    
+    def handle(self, *args, **options):
+        since = options.get('since')
+        # The same replies live accounting counts (see DailyUsage.arecord)
+        messages = DailyUsage.counted_replies(Message.objects.all())
+        rollups = DailyUsage.objects.all()
+        
+        if since:
+            try:
+                since = date.fromisoformat(since)
+            except ValueError:
+                raise CommandError(f'Invalid date: {since}')
+            messages = messages.filter(created_at__date__gte=since)
+            rollups = rollups.filter(date__gte=since)
+        
+        rows = (
+            messages
+            .annotate(day=TruncDate('created_at'))
+            .values('conversation__user_id', 'day')
+            .annotate(
+                replies=Count('id'),
+                cached_replies=Count('id', filter=Q(cached=True)),
+                prompt_tokens=Coalesce(Sum('prompt_tokens'), 0),
+                completion_tokens=Coalesce(Sum('completion_tokens'), 0),
+                total_tokens=Coalesce(Sum('tokens_used'), 0),
+                prompt_eval_duration_ms=Coalesce(Sum('prompt_eval_duration_ms'), 0.0),
+                eval_duration_ms=Coalesce(Sum('eval_duration_ms'), 0.0),
+                total_duration_ms=Coalesce(Sum('total_duration_ms'), 0.0),
+            )
+            .order_by()
+        )
+        
+        usage = [
+            DailyUsage(
+                user_id=row.pop('conversation__user_id'),
+                date=row.pop('day'),
+                **row
+            )
+            for row in rows
+        ]
+        
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            DailyUsage.objects.bulk_create(usage, batch_size=1000)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt {len(usage)} daily usage rows (replaced {deleted})'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_usermemory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True, default='', help_text='Summary of the messages folded out of the prompt history'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='summary_through',
+            field=models.DateTimeField(blank=True, help_text='Creation time of the newest message folded into the summary', null=True),
+        ),
+    ]
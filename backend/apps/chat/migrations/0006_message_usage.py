@@ -0,0 +1,75 @@
+# Generated by Django 5.0.1 on 2026-10-17 06:56
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='completion_tokens',
+            field=models.IntegerField(blank=True, help_text='Tokens generated for this reply', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='eval_duration_ms',
+            field=models.FloatField(blank=True, help_text='Time spent generating the completion', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='load_duration_ms',
+            field=models.FloatField(blank=True, help_text='Time spent loading the model', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='prompt_eval_duration_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='prompt_tokens',
+            field=models.IntegerField(blank=True, help_text='Prompt tokens evaluated for this reply', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='total_duration_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='tokens_used',
+            field=models.IntegerField(blank=True, help_text='Prompt plus completion tokens', null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('replies', models.IntegerField(default=0)),
+                ('cached_replies', models.IntegerField(default=0, help_text='Replies served from the response cache')),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('total_tokens', models.BigIntegerField(default=0)),
+                ('prompt_eval_duration_ms', models.FloatField(default=0)),
+                ('eval_duration_ms', models.FloatField(default=0)),
+                ('total_duration_ms', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily usage',
+                'db_table': 'daily_usage',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='daily_usage_date_fcebe7_idx')],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-17 07:26
+
+from django.db import migrations, models, transaction
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_message_stats(apps, schema_editor):
+    # The historical model has no custom methods; reuse the live one's UPDATE
+    from apps.chat.models import Conversation as LiveConversation
+    
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ids = list(Conversation.objects.order_by('pk').values_list('pk', flat=True))
+    # One short transaction per batch, so a large table is not locked for the whole backfill
+    for start in range(0, len(ids), BACKFILL_BATCH_SIZE):
+        with transaction.atomic():
+            LiveConversation.refresh_message_stats(
+                Conversation.objects.filter(pk__in=ids[start:start + BACKFILL_BATCH_SIZE]),
+                message_model=Message
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('chat', '0007_message_conversation_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', help_text='Start of the newest message', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_role',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
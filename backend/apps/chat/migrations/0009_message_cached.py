@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-17 07:47
+
+from django.db import migrations, models
+
+
+def mark_cached_replies(apps, schema_editor):
+    # Replies served from the response cache were stored with zero prompt and completion tokens
+    Message = apps.get_model('chat', 'Message')
+    Message.objects.filter(role='assistant', prompt_tokens=0, completion_tokens=0).update(cached=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_conversation_message_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='cached',
+            field=models.BooleanField(default=False, help_text='Reply served from the response cache'),
+        ),
+        migrations.RunPython(mark_cached_replies, migrations.RunPython.noop),
+    ]
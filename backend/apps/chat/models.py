@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Left
 from django.conf import settings
 import uuid
 
@@ -125,9 +127,23 @@ class Conversation(models.Model):
     # Proactive agent settings
     is_active = models.BooleanField(default=True, help_text='Whether Meggy is actively monitoring and can proactively engage')
     
+    # Rolling summary of older turns, sent to the LLM in place of the raw messages
+    summary = models.TextField(blank=True, default='', help_text='Summary of the messages folded out of the prompt history')
+    summary_through = models.DateTimeField(null=True, blank=True, help_text='Creation time of the newest message folded into the summary')
+    
+    # Kept up to date by Message.save and Message.delete, so reading them needs
+    # no query over the messages; rebuild with backfill_conversation_stats
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_role = models.CharField(max_length=20, blank=True, default='')
+    last_message_preview = models.CharField(max_length=100, blank=True, default='', help_text='Start of the newest message')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Written only by the atomic updates in Message, never from a possibly stale instance
+    MESSAGE_STATS_FIELDS = ('message_count', 'last_message_at', 'last_message_role', 'last_message_preview')
+    
     class Meta:
         db_table = 'conversations'
         ordering = ['-updated_at']
@@ -135,12 +151,56 @@ class Conversation(models.Model):
     def __str__(self):
         return f"Meggy & {self.user.email}"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MESSAGE_STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def empty_message_stats():
+        """Counter values of a conversation without messages."""
+        return {'message_count': 0, 'last_message_at': None, 'last_message_role': '', 'last_message_preview': ''}
+    
+    @classmethod
+    def refresh_message_stats(cls, conversations=None, message_model=None):
+        """
+        Recompute message counters from the messages, in one UPDATE.
+        
+        Args:
+            conversations: Queryset of the conversations to refresh (default: all)
+            message_model: Message model to count from; migrations pass their
+                historical model (default: Message)
+        
+        Returns:
+            Number of conversations updated
+        """
+        messages = (message_model or Message).objects.filter(conversation=OuterRef('pk'))
+        latest = messages.order_by('-created_at', '-id')
+        count = messages.order_by().values('conversation').annotate(total=Count('id')).values('total')
+        preview = Left('content', Message.PREVIEW_LENGTH)
+        if conversations is None:
+            conversations = cls.objects.all()
+        return conversations.update(
+            message_count=Coalesce(Subquery(count), 0),
+            last_message_role=Coalesce(Subquery(latest.values('role')[:1]), Value('')),
+            last_message_preview=Coalesce(Subquery(latest.annotate(preview=preview).values('preview')[:1]), Value('')),
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+        )
+    
     @classmethod
     def get_or_create_for_user(cls, user):
         """
         Get or create the single conversation for a user.
         Each user has exactly one conversation with Meggy.
         """
+        # Returning users already have one; skip the agent lookup
+        conversation = cls.objects.filter(user=user).first()
+        if conversation:
+            return conversation, False
+        
         # Get or create default agent for user
         from apps.agents.models import Agent
         agent = user.agents.filter(is_default=True).first() or user.agents.first()
@@ -182,6 +242,40 @@ class Conversation(models.Model):
             }
         )
         return conversation, created
+    
+    def add_user_message(self, content):
+        """Persist a user message, titling the conversation from its first message."""
+        user_message = Message.objects.create(
+            conversation=self,
+            role='user',
+            content=content
+        )
+        
+        # Update conversation title if this is the first message
+        if self.title == 'New Conversation' and self.message_count == 1:
+            self.title = self._title_from(content)
+            self.save()
+        
+        return user_message
+    
+    async def aadd_user_message(self, content):
+        """Async variant of add_user_message using the async ORM."""
+        user_message = await Message.objects.acreate(
+            conversation=self,
+            role='user',
+            content=content
+        )
+        
+        if self.title == 'New Conversation' and self.message_count == 1:
+            self.title = self._title_from(content)
+            await self.asave()
+        
+        return user_message
+    
+    @staticmethod
+    def _title_from(content):
+        """Generate title from first user message (first 50 chars)."""
+        return content[:50] + ('...' if len(content) > 50 else '')
 
 
 class Message(models.Model):
@@ -199,14 +293,165 @@ class Message(models.Model):
     content = models.TextField()
     
     # Metadata
-    tokens_used = models.IntegerField(null=True, blank=True)
+    tokens_used = models.IntegerField(null=True, blank=True, help_text='Prompt plus completion tokens')
     model = models.CharField(max_length=100, blank=True)
     
+    # LLM usage for assistant replies, as reported by Ollama's final stats frame
+    prompt_tokens = models.IntegerField(null=True, blank=True, help_text='Prompt tokens evaluated for this reply')
+    completion_tokens = models.IntegerField(null=True, blank=True, help_text='Tokens generated for this reply')
+    prompt_eval_duration_ms = models.FloatField(null=True, blank=True)
+    eval_duration_ms = models.FloatField(null=True, blank=True, help_text='Time spent generating the completion')
+    load_duration_ms = models.FloatField(null=True, blank=True, help_text='Time spent loading the model')
+    total_duration_ms = models.FloatField(null=True, blank=True)
+    cached = models.BooleanField(default=False, help_text='Reply served from the response cache')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Characters of a message kept in Conversation.last_message_preview
+    PREVIEW_LENGTH = 100
+    
     class Meta:
         db_table = 'messages'
         ordering = ['created_at']
+        indexes = [
+            # History reads and keyset pages: one conversation in time order,
+            # with the ID as tie-breaker for messages created in the same instant
+            models.Index(fields=['conversation', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            preview = self.content[:self.PREVIEW_LENGTH]
+            # Replace the snapshot unless a newer message is already there; every
+            # SET expression sees the row as it was before this UPDATE
+            newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=self.created_at)
+            Conversation.objects.filter(pk=self.conversation_id).update(
+                message_count=F('message_count') + 1,
+                last_message_role=Case(When(newer, then=Value(self.role)), default=F('last_message_role')),
+                last_message_preview=Case(When(newer, then=Value(preview)), default=F('last_message_preview')),
+                last_message_at=Case(When(newer, then=Value(self.created_at)), default=F('last_message_at')),
+            )
+        
+        # Keep a conversation instance the caller holds in step
+        if Message.conversation.is_cached(self):
+            conversation = self.conversation
+            conversation.message_count += 1
+            if conversation.last_message_at is None or conversation.last_message_at <= self.created_at:
+                conversation.last_message_at = self.created_at
+                conversation.last_message_role = self.role
+                conversation.last_message_preview = preview
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Conversation.refresh_message_stats(Conversation.objects.filter(pk=self.conversation_id))
+        return result
+    
+    @staticmethod
+    def usage_fields(response):
+        """
+        Message fields for the usage in an agent response.
+        
+        Stats the response does not report (notes replies, errors) stay None,
+        so a reply the model produced is one whose ``prompt_tokens`` is set.
+        """
+        return {
+            'cached': response.get('cached', False),
+            'tokens_used': response.get('tokens_used', 0),
+            'prompt_tokens': response.get('prompt_eval_count'),
+            'completion_tokens': response.get('completion_tokens'),
+            'prompt_eval_duration_ms': response.get('prompt_eval_duration_ms'),
+            'eval_duration_ms': response.get('eval_duration_ms'),
+            'load_duration_ms': response.get('load_duration_ms'),
+            'total_duration_ms': response.get('total_duration_ms'),
+        }
+
+
+class DailyUsage(models.Model):
+    """
+    LLM usage per user and UTC day, kept up to date as replies are saved.
+    
+    Lets capacity dashboards read token and model-time totals without
+    scanning the messages table. Only replies the model produced count,
+    including those served from the response cache; notes and error replies
+    do not.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_usage'
+    )
+    date = models.DateField()
+    
+    replies = models.IntegerField(default=0)
+    cached_replies = models.IntegerField(default=0, help_text='Replies served from the response cache')
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    total_tokens = models.BigIntegerField(default=0)
+    prompt_eval_duration_ms = models.FloatField(default=0)
+    eval_duration_ms = models.FloatField(default=0)
+    total_duration_ms = models.FloatField(default=0)
+    
+    class Meta:
+        db_table = 'daily_usage'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        unique_together = [['user', 'date']]
+        verbose_name_plural = 'Daily usage'
+    
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.total_tokens} tokens"
+    
+    @staticmethod
+    def counts(usage):
+        """Whether a reply with these usage fields is counted."""
+        return usage.get('prompt_tokens') is not None
+    
+    @staticmethod
+    def counted_replies(messages):
+        """The messages ``counts`` accepts, as a queryset filter for rebuilding the rollup."""
+        return messages.filter(role='assistant', prompt_tokens__isnull=False)
+    
+    @classmethod
+    async def arecord(cls, user_id, date, usage):
+        """
+        Add one reply's usage to the user's row for the day.
+        
+        Args:
+            user_id: ID of the user the reply was for
+            date: UTC day the reply was saved
+            usage: Message fields from ``Message.usage_fields``
+        """
+        if not cls.counts(usage):
+            return
+        amounts = {
+            'replies': 1,
+            'cached_replies': int(usage.get('cached', False)),
+            'prompt_tokens': usage.get('prompt_tokens') or 0,
+            'completion_tokens': usage.get('completion_tokens') or 0,
+            'total_tokens': usage.get('tokens_used') or 0,
+            'prompt_eval_duration_ms': usage.get('prompt_eval_duration_ms') or 0,
+            'eval_duration_ms': usage.get('eval_duration_ms') or 0,
+            'total_duration_ms': usage.get('total_duration_ms') or 0,
+        }
+        increments = {field: F(field) + amount for field, amount in amounts.items()}
+        rows = cls.objects.filter(user_id=user_id, date=date)
+        
+        if await rows.aupdate(**increments):
+            return
+        try:
+            await cls.objects.acreate(user_id=user_id, date=date, **amounts)
+        except IntegrityError:
+            # Another worker created the day's row first
+            await rows.aupdate(**increments)
@@ -0,0 +1,52 @@
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.chat.models import Conversation, DailyUsage
+from core.services import chat_service
+
+USAGE = {
+    'tokens_used': 150, 'prompt_eval_count': 100, 'completion_tokens': 50,
+    'prompt_eval_duration_ms': 80.0, 'eval_duration_ms': 900.0, 'total_duration_ms': 1000.0,
+}
+
+REPLIES = [
+    {'content': 'Generated', 'model': 'llama3.2', 'success': True, **USAGE},
+    # Served from the response cache
+    {'content': 'Generated', 'model': 'llama3.2', 'success': True, 'cached': True, 'tokens_used': 0,
+     'prompt_eval_count': 0, 'completion_tokens': 0, 'prompt_eval_duration_ms': 0.0,
+     'eval_duration_ms': 0.0, 'total_duration_ms': 0.0},
+    # Notes command and failed generation: no model usage
+    {'content': 'Your notes', 'model': 'llama3.2', 'tokens_used': 0, 'success': True, 'is_notes_response': True},
+    {'content': 'I apologize', 'model': 'llama3.2', 'tokens_used': 0, 'success': False, 'error': 'boom'},
+]
+
+FIELDS = [
+    'replies', 'cached_replies', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+    'prompt_eval_duration_ms', 'eval_duration_ms', 'total_duration_ms',
+]
+
+
+class DailyUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='usage@example.com', name='Usage', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+    
+    def rollup(self):
+        return list(DailyUsage.objects.values_list(*FIELDS))
+    
+    async def test_rebuild_matches_live_accounting(self):
+        conversation = await Conversation.objects.select_related('agent').aget(pk=self.conversation.pk)
+        for response in REPLIES:
+            user_message = await conversation.aadd_user_message('Hello')
+            await chat_service.record_reply(conversation, conversation.agent, user_message, response, str(self.user.id))
+        
+        live = await sync_to_async(self.rollup)()
+        self.assertEqual(live, [(2, 1, 100, 50, 150, 80.0, 900.0, 1000.0)])
+        
+        await sync_to_async(call_command)('rebuild_daily_usage', stdout=StringIO())
+        self.assertEqual(await sync_to_async(self.rollup)(), live)
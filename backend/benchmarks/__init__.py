@@ -0,0 +1 @@
+"""Performance benchmarks and load-testing tools for the backend."""
@@ -0,0 +1,218 @@
+"""
+Fake Ollama server for benchmarks - serves canned completions with
+configurable latency, model load time, failures and streaming behaviour so
+the backend can be load-tested without a GPU.
+
+Runs in-process (see ``send_message_load``) or standalone, for a backend
+started separately with ``OLLAMA_BASE_URL`` pointing at it:
+
+    python -m benchmarks.fake_ollama --port 11434 --token-latency 0.02 --parallel 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+from aiohttp import web
+
+
+class FakeOllama:
+    """In-process stand-in for the Ollama HTTP API."""
+    
+    def __init__(
+        self,
+        tokens: int = 20,
+        token_latency: float = 0.025,
+        model: str = "llama3.2:latest",
+        prompt_token_latency: float = 0.0,
+        load_time: float = 0.0,
+        error_rate: float = 0.0,
+        stream_error_rate: float = 0.0,
+        chunk_tokens: int = 1,
+        parallel: int = 0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            tokens: Number of tokens generated per completion
+            token_latency: Seconds spent generating each token
+            model: Model name advertised by /api/tags
+            prompt_token_latency: Seconds spent evaluating each prompt token
+            load_time: Seconds the first request for each model waits while it loads
+            error_rate: Fraction of requests answered with HTTP 500 before generating
+            stream_error_rate: Fraction of streams cut off halfway through
+            chunk_tokens: Tokens sent per streamed frame
+            parallel: Generations run at once, like OLLAMA_NUM_PARALLEL;
+                the rest wait their turn (0 for unlimited)
+            seed: Seed for the failure draws, for reproducible runs
+        """
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.model = model
+        self.prompt_token_latency = prompt_token_latency
+        self.load_time = load_time
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.parallel = parallel
+        self.random = random.Random(seed)
+        
+        self.requests = 0
+        self.errors = 0
+        self._loaded = set()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runner = None
+    
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/generate', self.generate)
+        app.router.add_post('/api/chat', self.chat)
+        app.router.add_get('/api/tags', self.tags)
+        return app
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 11434) -> None:
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+    
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+    
+    def _token(self, index: int) -> str:
+        return f"tok{index} "
+    
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        return await self._complete(request, lambda text: {"response": text})
+    
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        return await self._complete(request, lambda text: {"message": {"role": "assistant", "content": text}})
+    
+    @staticmethod
+    def _prompt_tokens(body: Dict[str, Any]) -> int:
+        """Rough prompt size: words in the prompt or every chat message."""
+        if 'messages' in body:
+            text = " ".join(msg.get('content', '') for msg in body['messages'])
+        else:
+            text = body.get('prompt', '')
+        return len(text.split())
+    
+    async def _load(self, model: str) -> float:
+        """Wait for the model to be loaded; returns the seconds this request waited."""
+        if model in self._loaded or not self.load_time:
+            return 0.0
+        started = time.perf_counter()
+        task = self._loading.get(model)
+        if task is None:
+            task = self._loading[model] = asyncio.ensure_future(asyncio.sleep(self.load_time))
+        await asyncio.shield(task)
+        self._loaded.add(model)
+        return time.perf_counter() - started
+    
+    async def _complete(self, request: web.Request, frame) -> web.StreamResponse:
+        """Serve a completion, shaping each chunk with ``frame(text)``."""
+        self.requests += 1
+        body = await request.json()
+        model = body.get('model', self.model)
+        
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": "fake failure"}, status=500)
+        
+        if self.parallel and self._slots is None:
+            self._slots = asyncio.Semaphore(self.parallel)
+        
+        started = time.perf_counter()
+        if self._slots:
+            await self._slots.acquire()
+        try:
+            load = await self._load(model)
+            prompt_tokens = self._prompt_tokens(body)
+            prompt_eval = prompt_tokens * self.prompt_token_latency
+            await asyncio.sleep(prompt_eval)
+            
+            def stats(eval_seconds: float) -> Dict[str, Any]:
+                # Ollama reports durations in nanoseconds
+                return {
+                    "done": True,
+                    "model": model,
+                    "eval_count": self.tokens,
+                    "prompt_eval_count": prompt_tokens,
+                    "load_duration": int(load * 1e9),
+                    "prompt_eval_duration": int(prompt_eval * 1e9),
+                    "eval_duration": int(eval_seconds * 1e9),
+                    "total_duration": int((time.perf_counter() - started) * 1e9),
+                }
+            
+            if not body.get('stream'):
+                await asyncio.sleep(self.tokens * self.token_latency)
+                text = "".join(self._token(i) for i in range(self.tokens))
+                return web.json_response({**frame(text), **stats(self.tokens * self.token_latency)})
+            
+            fail_at = self.tokens // 2 if self.random.random() < self.stream_error_rate else None
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+            generating = time.perf_counter()
+            for first in range(0, self.tokens, self.chunk_tokens):
+                if fail_at is not None and first >= fail_at:
+                    # Drop the connection without the final stats frame
+                    self.errors += 1
+                    request.transport.close()
+                    return response
+                count = min(self.chunk_tokens, self.tokens - first)
+                await asyncio.sleep(count * self.token_latency)
+                text = "".join(self._token(i) for i in range(first, first + count))
+                await response.write(json.dumps({**frame(text), "done": False}).encode() + b"\n")
+            await response.write(json.dumps({**frame(""), **stats(time.perf_counter() - generating)}).encode() + b"\n")
+            await response.write_eof()
+            return response
+        finally:
+            if self._slots:
+                self._slots.release()
+    
+    async def tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": self.model}]})
+
+
+async def serve(args) -> None:
+    fake = FakeOllama(
+        tokens=args.tokens,
+        token_latency=args.token_latency,
+        model=args.model,
+        prompt_token_latency=args.prompt_token_latency,
+        load_time=args.load_time,
+        error_rate=args.error_rate,
+        stream_error_rate=args.stream_error_rate,
+        chunk_tokens=args.chunk_tokens,
+        parallel=args.parallel,
+        seed=args.seed
+    )
+    await fake.start(args.host, args.port)
+    print(f"Fake Ollama serving {args.model} on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+        print(f"Served {fake.requests} requests, {fake.errors} failed")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--model', default='llama3.2:latest', help='model advertised by /api/tags')
+    parser.add_argument('--tokens', type=int, default=20, help='tokens generated per completion')
+    parser.add_argument('--token-latency', type=float, default=0.025, help='seconds per generated token')
+    parser.add_argument('--prompt-token-latency', type=float, default=0.0, help='seconds per prompt token')
+    parser.add_argument('--load-time', type=float, default=0.0, help='seconds to load a model on first use')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 500')
+    parser.add_argument('--stream-error-rate', type=float, default=0.0, help='fraction of streams cut off midway')
+    parser.add_argument('--chunk-tokens', type=int, default=1, help='tokens per streamed frame')
+    parser.add_argument('--parallel', type=int, default=0, help='generations run at once (0 for unlimited)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the failure draws')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,159 @@
+"""
+Memory benchmark for conversation history records.
+
+Builds the history of many conversations from rows shaped like the ones
+``DjangoMemoryBackend.get_messages`` reads, once as the dicts history used
+to be kept as (role, content, ISO timestamp, metadata dict) and once as
+``HistoryMessage`` records, and reports the heap each format retains (via
+``tracemalloc``) and the time to build it and to turn it into prompt
+messages. Message content is the same in both formats; the ``overhead``
+figures leave it out.
+
+Usage (from backend/):
+    python -m benchmarks.history_memory
+    python -m benchmarks.history_memory --conversations 5000 --messages 40 --json history.json
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from core.bruno_integration.bruno_memory import USAGE_FIELDS, HistoryMessage
+
+
+def history_rows(conversations: int, messages: int, words: int) -> List[List[tuple]]:
+    """``values_list`` rows of every conversation: role, content, created_at, model, usage."""
+    sentence = " ".join(f"word{i}" for i in range(words))
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    history = []
+    for c in range(conversations):
+        rows = []
+        for m in range(messages):
+            assistant = m % 2 == 1
+            # Database drivers return a new string for every role they read
+            role = ("assistant" if assistant else "user").encode().decode()
+            usage = (120 + m, 80 + m, 40, 150, 900, None, 1100) if assistant else (None,) * len(USAGE_FIELDS)
+            rows.append((
+                role,
+                f"Message {c}.{m}: {sentence}.",
+                started + timedelta(seconds=c * messages + m),
+                "llama3.2" if assistant else "",
+                *usage,
+            ))
+        history.append(rows)
+    return history
+
+
+def legacy_message(row: tuple) -> Dict[str, Any]:
+    return {
+        "role": row[0],
+        "content": row[1],
+        "timestamp": row[2].isoformat(),
+        "metadata": {"model": row[3], **dict(zip(USAGE_FIELDS, row[4:]))},
+    }
+
+
+def record_message(row: tuple) -> HistoryMessage:
+    return HistoryMessage(*row[:4], row[4:])
+
+
+FORMATS: Dict[str, Dict[str, Callable]] = {
+    'dict': {
+        'build': legacy_message,
+        'prompt': lambda message: {"role": message["role"], "content": message["content"]},
+    },
+    'record': {
+        'build': record_message,
+        'prompt': HistoryMessage.to_prompt,
+    },
+}
+
+
+def retained(build: Callable[[], Any]) -> int:
+    """Bytes still allocated once ``build`` returns, counting only what its result keeps."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def measure(name: str, args) -> Dict[str, Any]:
+    make = FORMATS[name]['build']
+    to_prompt = FORMATS[name]['prompt']
+    
+    def build():
+        return [
+            [make(row) for row in rows]
+            for rows in history_rows(args.conversations, args.messages, args.words)
+        ]
+    
+    total = retained(build)
+    
+    rows = history_rows(args.conversations, args.messages, args.words)
+    started = time.perf_counter()
+    history = [[make(row) for row in conversation] for conversation in rows]
+    built = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for conversation in history:
+        [to_prompt(message) for message in conversation]
+    prompted = time.perf_counter() - started
+    
+    count = args.conversations * args.messages
+    return {
+        'bytes': total,
+        'bytes_per_message': round(total / count, 1),
+        'build_us_per_message': round(built / count * 1e6, 3),
+        'prompt_us_per_message': round(prompted / count * 1e6, 3),
+    }
+
+
+def main(args) -> int:
+    count = args.conversations * args.messages
+    content = retained(lambda: [
+        [row[1] for row in rows]
+        for rows in history_rows(args.conversations, args.messages, args.words)
+    ])
+    
+    results = {name: measure(name, args) for name in FORMATS}
+    for result in results.values():
+        result['overhead_per_message'] = round((result['bytes'] - content) / count, 1)
+    
+    print(f"{args.conversations} conversations x {args.messages} messages "
+          f"({content / count:.0f} bytes of content per message)")
+    print(f"{'format':<10}{'MB':>10}{'B/msg':>10}{'overhead':>10}{'build us':>10}{'prompt us':>11}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['bytes'] / 2**20:>10.1f}{result['bytes_per_message']:>10.1f}"
+              f"{result['overhead_per_message']:>10.1f}{result['build_us_per_message']:>10.3f}"
+              f"{result['prompt_us_per_message']:>11.3f}")
+    saved = 1 - results['record']['overhead_per_message'] / results['dict']['overhead_per_message']
+    print(f"records keep {saved:.0%} less per message besides content")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'conversations': args.conversations,
+                'messages': args.messages,
+                'content_bytes_per_message': round(content / count, 1),
+                'results': results,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=2000, help='conversations held in memory')
+    parser.add_argument('--messages', type=int, default=40, help='messages per conversation')
+    parser.add_argument('--words', type=int, default=30, help='words of content per message')
+    parser.add_argument('--json', help='write the results to this file')
+    sys.exit(main(parser.parse_args()))
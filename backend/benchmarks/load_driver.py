@@ -0,0 +1,256 @@
+"""
+End-to-end load driver for a running backend.
+
+Registers a set of users through ``auth/register/``, then has each of them
+send messages to their conversation back to back (a closed loop, so offered
+load follows server capacity) and reports throughput and latency
+percentiles. Unlike ``send_message_load``, requests go over real HTTP to a
+separately started server, so worker counts, server choice (runserver,
+uvicorn, daphne) and settings can be compared as deployed.
+
+Typical CPU-only setup, each in its own shell (from backend/):
+
+    python -m benchmarks.fake_ollama --token-latency 0.02 --parallel 4
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 uvicorn config.asgi:application --workers 2
+    python -m benchmarks.load_driver --users 32 --duration 30 --json results.json
+
+Pass ``--baseline`` with an earlier ``--json`` file to print the change in
+every figure, e.g. to compare two configurations or catch a regression.
+Use ``--stream`` to drive ``send_message_stream/`` and also report time to
+first token.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+
+class LoadDriver:
+    """Simulated users chatting with the backend over HTTP."""
+    
+    def __init__(
+        self,
+        base_url: str,
+        users: int,
+        duration: float,
+        messages: int = 0,
+        stream: bool = False,
+        think_time: float = 0.0,
+        timeout: float = 120.0
+    ):
+        """
+        Args:
+            base_url: API root, e.g. http://127.0.0.1:8000/api
+            users: Concurrent simulated users
+            duration: Seconds to keep sending messages
+            messages: Stop each user after this many messages instead (0 to use duration)
+            stream: Use the streaming endpoint and measure time to first token
+            think_time: Seconds each user pauses between messages
+            timeout: Seconds before a single request counts as failed
+        """
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.duration = duration
+        self.messages = messages
+        self.stream = stream
+        self.think_time = think_time
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        
+        self.latencies: List[float] = []
+        self.first_tokens: List[float] = []
+        self.statuses: Counter = Counter()
+    
+    async def register(self, session: aiohttp.ClientSession, run_id: str, index: int) -> Dict[str, str]:
+        """Create one user and return its access token and conversation ID."""
+        async with session.post(f"{self.base_url}/auth/register/", json={
+            'email': f'load-{run_id}-{index}@example.com',
+            'name': f'Load {index}',
+            'password': f'load-{run_id}-password',
+        }) as response:
+            if response.status != 201:
+                raise RuntimeError(f"Registration failed ({response.status}): {await response.text()}")
+            token = (await response.json())['access_token']
+        
+        headers = {'Authorization': f'Bearer {token}'}
+        async with session.get(f"{self.base_url}/conversations/get_or_create/", headers=headers) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Conversation lookup failed ({response.status}): {await response.text()}")
+            conversation_id = (await response.json())['conversation']['id']
+        return {'token': token, 'conversation_id': conversation_id}
+    
+    async def send(self, session: aiohttp.ClientSession, user: Dict[str, str], content: str) -> None:
+        """Send one message and record its status and latency."""
+        action = 'send_message_stream' if self.stream else 'send_message'
+        url = f"{self.base_url}/conversations/{user['conversation_id']}/{action}/"
+        headers = {'Authorization': f"Bearer {user['token']}"}
+        if self.stream:
+            headers['Accept'] = 'text/event-stream'
+        
+        started = time.perf_counter()
+        try:
+            async with session.post(url, json={'content': content}, headers=headers) as response:
+                status = response.status
+                first_token = None
+                if self.stream and status == 200:
+                    status, first_token = await self._read_stream(response, started)
+                elif status == 200:
+                    # Failed turns still answer 200, with an apology and success false
+                    if not (await response.json()).get('success', True):
+                        status = 'reply_error'
+                else:
+                    await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.statuses[type(e).__name__] += 1
+            return
+        
+        self.statuses[status] += 1
+        if status == 200:
+            self.latencies.append(time.perf_counter() - started)
+            if first_token is not None:
+                self.first_tokens.append(first_token)
+    
+    @staticmethod
+    async def _read_stream(response: aiohttp.ClientResponse, started: float):
+        """
+        Consume an SSE reply.
+        
+        Returns:
+            ``(outcome, seconds to the first token or None)``, where outcome is
+            200, or 'reply_error' when the reply failed or ended early
+        """
+        event = None
+        outcome = 'reply_error'
+        first_token = None
+        async for line in response.content:
+            line = line.decode('utf-8').strip()
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+                if event == 'token' and first_token is None:
+                    first_token = time.perf_counter() - started
+            elif line.startswith('data:') and event == 'done':
+                if json.loads(line[len('data:'):]).get('success', True):
+                    outcome = 200
+        return outcome, first_token
+    
+    async def user_loop(self, session: aiohttp.ClientSession, user: Dict[str, str], deadline: float) -> None:
+        sent = 0
+        while time.perf_counter() < deadline and (not self.messages or sent < self.messages):
+            await self.send(session, user, f"Load test message {sent}")
+            sent += 1
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+    
+    async def run(self) -> Dict[str, Any]:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout) as session:
+            run_id = uuid.uuid4().hex[:8]
+            users = await asyncio.gather(*(self.register(session, run_id, i) for i in range(self.users)))
+            
+            started = time.perf_counter()
+            deadline = started + (self.duration if not self.messages else float('inf'))
+            await asyncio.gather(*(self.user_loop(session, user, deadline) for user in users))
+            elapsed = time.perf_counter() - started
+        
+        return self.report(elapsed)
+    
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """Throughput, latency percentiles (ms) and outcome counts for the run."""
+        return {
+            'config': {
+                'base_url': self.base_url,
+                'users': self.users,
+                'duration': self.duration,
+                'messages': self.messages,
+                'stream': self.stream,
+                'think_time': self.think_time,
+            },
+            'elapsed_s': round(elapsed, 2),
+            'requests': sum(self.statuses.values()),
+            'succeeded': len(self.latencies),
+            'throughput_rps': round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': summarize(self.latencies),
+            'first_token_ms': summarize(self.first_tokens) if self.stream else None,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+        }
+
+
+def summarize(samples: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99, mean and max of samples in seconds, as milliseconds."""
+    if not samples:
+        return None
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49] * 1000, 1),
+        'p95': round(cuts[94] * 1000, 1),
+        'p99': round(cuts[98] * 1000, 1),
+        'mean': round(statistics.fmean(samples) * 1000, 1),
+        'max': round(max(samples) * 1000, 1),
+    }
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    def change(value, previous) -> str:
+        if previous in (None, 0) or value is None:
+            return ''
+        return f"  ({(value - previous) / previous * 100:+.1f}%)"
+    
+    print(f"{result['succeeded']}/{result['requests']} succeeded in {result['elapsed_s']}s, "
+          f"statuses: {result['statuses']}")
+    print(f"throughput: {result['throughput_rps']} req/s"
+          f"{change(result['throughput_rps'], baseline and baseline['throughput_rps'])}")
+    for key, label in (('latency_ms', 'latency'), ('first_token_ms', 'first token')):
+        figures = result.get(key)
+        if not figures:
+            continue
+        previous = (baseline or {}).get(key) or {}
+        print(f"{label} ms: " + ", ".join(
+            f"{name}={value}{change(value, previous.get(name))}" for name, value in figures.items()
+        ))
+
+
+def main(args) -> int:
+    driver = LoadDriver(
+        args.base_url,
+        users=args.users,
+        duration=args.duration,
+        messages=args.messages,
+        stream=args.stream,
+        think_time=args.think_time,
+        timeout=args.timeout
+    )
+    result = asyncio.run(driver.run())
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0 if result['succeeded'] else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api', help='API root of the server under test')
+    parser.add_argument('--users', type=int, default=16, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to keep sending')
+    parser.add_argument('--messages', type=int, default=0, help='messages per user instead of --duration')
+    parser.add_argument('--stream', action='store_true', help='use send_message_stream and measure first token')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds each user waits between messages')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds before a request counts as failed')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='earlier --json results to compare against')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,216 @@
+"""
+Load benchmark for send_message: concurrent-request capacity before and after
+the native async view.
+
+- ``wsgi`` (before): requests are served by a fixed pool of sync workers, as
+  with runserver/gunicorn; each turn holds its worker for the whole generation.
+- ``asgi`` (after): requests go through the ASGI application, where the view
+  awaits the LLM without holding a thread.
+
+Both drive the server in-process against a fake Ollama server that generates
+tokens with a fixed latency, so the numbers reflect how many turns the server
+can overlap rather than model speed.
+
+Usage (from backend/):
+    python -m benchmarks.send_message_load --concurrency 1 8 32 --sync-workers 4
+
+Admission control limits come from the regular settings, so overload
+behaviour can be exercised with e.g.
+    OLLAMA_MAX_CONCURRENCY=2 OLLAMA_MAX_QUEUE=8 python -m benchmarks.send_message_load --modes asgi
+Turns rejected with 429 are counted separately and excluded from latencies.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+
+async def asgi_post(app, path, token, body):
+    """POST a JSON body through an ASGI app and return (status, finish time)."""
+    data = json.dumps(body).encode()
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode()),
+            (b'authorization', f'Bearer {token}'.encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    received = False
+    status = None
+    
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': data, 'more_body': False}
+        await asyncio.Event().wait()
+    
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+    
+    await app(scope, receive, send)
+    return status, time.perf_counter()
+
+
+def wsgi_post(app, path, token, body):
+    """POST a JSON body through a WSGI app and return (status, finish time)."""
+    data = json.dumps(body).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'HTTP_HOST': 'localhost',
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(data),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+    status = []
+    
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split(' ', 1)[0]))
+    
+    response = app(environ, start_response)
+    b''.join(response)
+    response.close()
+    return status[0], time.perf_counter()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(mode, users, concurrency, workers):
+    """
+    Send one message per user concurrently; return wall time, latencies of
+    completed turns and the number of turns rejected with 429.
+    
+    Latency is measured from when the whole batch is submitted, so time spent
+    queued for a sync worker counts against the request.
+    """
+    route = '/api/conversations/{pk}/send_message/'
+    batch = [
+        (route.format(pk=conversation_id), token, {'content': f'Benchmark turn {i}'})
+        for i, (token, conversation_id) in enumerate(users[:concurrency])
+    ]
+    
+    start = time.perf_counter()
+    if mode == 'asgi':
+        from config.asgi import application
+        results = await asyncio.gather(*(asgi_post(application, *request) for request in batch))
+    else:
+        from django.core.handlers.wsgi import WSGIHandler
+        application = WSGIHandler()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, wsgi_post, application, *request) for request in batch
+            ))
+    wall = time.perf_counter() - start
+    
+    failed = [status for status, _ in results if status not in (200, 429)]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[:5]}")
+    latencies = [finished - start for status, finished in results if status == 200]
+    rejected = len(results) - len(latencies)
+    return wall, latencies, rejected
+
+
+def create_users(count):
+    """Create benchmark users, each with their single conversation."""
+    from django.db import transaction
+    from apps.accounts.models import User
+    from apps.accounts.jwt import generate_access_token
+    from apps.chat.models import Conversation
+    
+    users = []
+    with transaction.atomic():
+        for i in range(count):
+            user = User.objects.create_user(
+                email=f'bench{i}@example.com', name=f'Bench {i}', password='benchmark-pass'
+            )
+            conversation, _ = Conversation.get_or_create_for_user(user)
+            users.append((generate_access_token(user), str(conversation.id)))
+    return users
+
+
+async def run_benchmark(args, users):
+    from benchmarks.fake_ollama import FakeOllama
+    
+    fake = FakeOllama(tokens=args.tokens, token_latency=args.token_latency)
+    await fake.start(port=args.ollama_port)
+    
+    generation = args.tokens * args.token_latency
+    print(f"Fake generation time per turn: {generation:.2f}s "
+          f"({args.tokens} tokens x {args.token_latency * 1000:.0f}ms)\n")
+    print(f"{'mode':<8}{'concurrency':>12}{'wall s':>10}{'req/s':>10}{'p50 s':>10}{'p95 s':>10}{'429':>6}")
+    
+    try:
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                wall, latencies, rejected = await run_level(mode, users, concurrency, args.sync_workers)
+                p50 = statistics.median(latencies) if latencies else 0.0
+                p95 = percentile(latencies, 95) if latencies else 0.0
+                print(f"{mode:<8}{concurrency:>12}{wall:>10.2f}{len(latencies) / wall:>10.2f}"
+                      f"{p50:>10.2f}{p95:>10.2f}{rejected:>6}")
+    finally:
+        await fake.stop()
+
+
+def main(args):
+    import django
+    django.setup()
+    
+    from django.conf import settings
+    from django.core.management import call_command
+    
+    call_command('migrate', verbosity=0)
+    try:
+        users = create_users(max(args.concurrency))
+        asyncio.run(run_benchmark(args, users))
+    finally:
+        os.remove(settings.DATABASES['default']['NAME'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--sync-workers', type=int, default=4, help='worker threads in wsgi mode')
+    parser.add_argument('--tokens', type=int, default=20, help='tokens generated per turn')
+    parser.add_argument('--token-latency', type=float, default=0.025, help='seconds per generated token')
+    parser.add_argument('--ollama-port', type=int, default=11434, help='port for the fake Ollama server')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,30 @@
+"""
+Settings for running benchmarks in-process.
+
+Based on the development settings, minus the debug toolbar: its middleware is
+sync-only, and a single sync-only middleware makes Django run every async view
+pinned to the shared sync thread, which would hide the effect being measured.
+"""
+import os
+import tempfile
+
+from config.settings.development import *  # noqa: F401,F403
+from config.settings.development import INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = False
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [m for m in MIDDLEWARE if m != 'debug_toolbar.middleware.DebugToolbarMiddleware']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.gettempdir(), f'bruno_benchmark_{os.getpid()}.sqlite3'),
+    }
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'root': {'level': 'WARNING'},
+}
@@ -6,6 +6,15 @@ import os
 from pathlib import Path
 from decouple import config
 
+
+def model_map(value):
+    """Parse 'model=n,model=n' settings into a dict of ints."""
+    return {
+        model.strip(): int(n)
+        for model, n in (item.split('=') for item in value.split(',') if item.strip())
+    }
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -29,6 +38,7 @@ INSTALLED_APPS = [
     # Third party apps
     'rest_framework',
     'corsheaders',
+    'channels',
     'django_extensions',
     
     # Local apps
@@ -39,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.api.middleware.ProfilingMiddleware',
+    'apps.api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -159,11 +171,97 @@ JWT_REFRESH_TOKEN_EXPIRE_DAYS = config('JWT_REFRESH_TOKEN_EXPIRE_DAYS', default=
 # LLM Provider Settings
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 OLLAMA_BASE_URL = config('OLLAMA_BASE_URL', default='http://localhost:11434')
+# Comma-separated Ollama servers to balance across; defaults to OLLAMA_BASE_URL alone
+OLLAMA_ENDPOINTS = config(
+    'OLLAMA_ENDPOINTS',
+    default=OLLAMA_BASE_URL,
+    cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+# 'chat' uses /api/chat; 'generate' uses /api/generate with per-conversation context reuse
+OLLAMA_API_MODE = config('OLLAMA_API_MODE', default='chat')
+# How long Ollama keeps a model (and its prompt cache) loaded after a request
+OLLAMA_KEEP_ALIVE = config('OLLAMA_KEEP_ALIVE', default='30m')
+OLLAMA_CONTEXT_CACHE_SIZE = config('OLLAMA_CONTEXT_CACHE_SIZE', default=1024, cast=int)
+
+# Ollama HTTP connection pool
+OLLAMA_POOL_LIMIT = config('OLLAMA_POOL_LIMIT', default=100, cast=int)
+OLLAMA_POOL_LIMIT_PER_HOST = config('OLLAMA_POOL_LIMIT_PER_HOST', default=0, cast=int)
+OLLAMA_KEEPALIVE_TIMEOUT = config('OLLAMA_KEEPALIVE_TIMEOUT', default=30.0, cast=float)
+OLLAMA_DNS_CACHE_TTL = config('OLLAMA_DNS_CACHE_TTL', default=300, cast=int)
+OLLAMA_CONNECT_TIMEOUT = config('OLLAMA_CONNECT_TIMEOUT', default=10.0, cast=float)
+
+# Ollama endpoint health checks: /api/tags polling and passive ejection of failing nodes
+OLLAMA_HEALTH_CHECK_INTERVAL = config('OLLAMA_HEALTH_CHECK_INTERVAL', default=10.0, cast=float)
+OLLAMA_HEALTH_CHECK_TIMEOUT = config('OLLAMA_HEALTH_CHECK_TIMEOUT', default=2.0, cast=float)
+OLLAMA_MAX_FAILURES = config('OLLAMA_MAX_FAILURES', default=3, cast=int)
+OLLAMA_EJECT_SECONDS = config('OLLAMA_EJECT_SECONDS', default=30.0, cast=float)
+# Conversations stick to one endpoint (consistent hashing) to keep its prompt cache warm;
+# they spill over to the next endpoint once theirs has this many outstanding requests
+OLLAMA_AFFINITY_MAX_OUTSTANDING = config('OLLAMA_AFFINITY_MAX_OUTSTANDING', default=4, cast=int)
+OLLAMA_AFFINITY_VIRTUAL_NODES = config('OLLAMA_AFFINITY_VIRTUAL_NODES', default=100, cast=int)
+
+# Opt-in exact-match cache of deterministic (temperature 0) completions
+OLLAMA_RESPONSE_CACHE_ENABLED = config('OLLAMA_RESPONSE_CACHE_ENABLED', default=False, cast=bool)
+OLLAMA_RESPONSE_CACHE_TTL = config('OLLAMA_RESPONSE_CACHE_TTL', default=300.0, cast=float)
+OLLAMA_RESPONSE_CACHE_SIZE = config('OLLAMA_RESPONSE_CACHE_SIZE', default=1024, cast=int)
+# Django cache alias shared between workers as a second tier ('' = in-process only)
+OLLAMA_RESPONSE_CACHE_ALIAS = config('OLLAMA_RESPONSE_CACHE_ALIAS', default='')
+
+# Ollama admission control (per endpoint and model); overflow is answered with 429
+OLLAMA_MAX_CONCURRENCY = config('OLLAMA_MAX_CONCURRENCY', default=4, cast=int)
+OLLAMA_MAX_QUEUE = config('OLLAMA_MAX_QUEUE', default=32, cast=int)
+OLLAMA_QUEUE_TIMEOUT = config('OLLAMA_QUEUE_TIMEOUT', default=30.0, cast=float)
+# Per-model concurrency overrides, e.g. 'llama3.2=8,mistral=2'
+OLLAMA_MODEL_CONCURRENCY = config('OLLAMA_MODEL_CONCURRENCY', default='', cast=model_map)
+
+# Context window per model (prompt + reply tokens); sent to Ollama as num_ctx
+OLLAMA_CONTEXT_WINDOW = config('OLLAMA_CONTEXT_WINDOW', default=4096, cast=int)
+OLLAMA_MODEL_CONTEXT_WINDOWS = config('OLLAMA_MODEL_CONTEXT_WINDOWS', default='', cast=model_map)
 DEFAULT_LLM_PROVIDER = config('DEFAULT_LLM_PROVIDER', default='openai')
 DEFAULT_MODEL = config('DEFAULT_MODEL', default='gpt-4')
 
 # Bruno Integration Settings
 BRUNO_LOG_LEVEL = config('BRUNO_LOG_LEVEL', default='INFO')
+# Prompt assembly: candidates considered for each section and the memories' share of the budget
+BRUNO_CONTEXT_HISTORY_CANDIDATES = config('BRUNO_CONTEXT_HISTORY_CANDIDATES', default=50, cast=int)
+BRUNO_CONTEXT_MEMORY_CANDIDATES = config('BRUNO_CONTEXT_MEMORY_CANDIDATES', default=10, cast=int)
+BRUNO_CONTEXT_MEMORY_SHARE = config('BRUNO_CONTEXT_MEMORY_SHARE', default=0.25, cast=float)
+# Seconds each context-gathering stage (history, memories, summary) may take; notes commands are not cut short
+BRUNO_CONTEXT_STAGE_TIMEOUT = config('BRUNO_CONTEXT_STAGE_TIMEOUT', default=2.0, cast=float)
+# Opt-in cache of the newest messages of up to BRUNO_HISTORY_CACHE_SIZE conversations (0 = off).
+# With more than one worker process, BRUNO_HISTORY_CACHE_ALIAS must name a Django cache
+# every worker shares (e.g. Redis), so a write in one worker invalidates the others
+BRUNO_HISTORY_CACHE_SIZE = config('BRUNO_HISTORY_CACHE_SIZE', default=0, cast=int)
+BRUNO_HISTORY_CACHE_MESSAGES = config('BRUNO_HISTORY_CACHE_MESSAGES', default=BRUNO_CONTEXT_HISTORY_CANDIDATES, cast=int)
+BRUNO_HISTORY_CACHE_ALIAS = config('BRUNO_HISTORY_CACHE_ALIAS', default='')
+# Newest messages sent with a conversation; clients page back or sync for the rest
+BRUNO_CONVERSATION_HEAD_MESSAGES = config('BRUNO_CONVERSATION_HEAD_MESSAGES', default=20, cast=int)
+# Rolling conversation summary: older turns are folded in after a turn, in the background,
+# only while the model has no user turns running or queued (opt-in)
+BRUNO_SUMMARY_ENABLED = config('BRUNO_SUMMARY_ENABLED', default=False, cast=bool)
+BRUNO_SUMMARY_KEEP_RECENT = config('BRUNO_SUMMARY_KEEP_RECENT', default=20, cast=int)
+BRUNO_SUMMARY_MIN_BATCH = config('BRUNO_SUMMARY_MIN_BATCH', default=10, cast=int)
+BRUNO_SUMMARY_MAX_BATCH = config('BRUNO_SUMMARY_MAX_BATCH', default=40, cast=int)
+BRUNO_SUMMARY_MAX_TOKENS = config('BRUNO_SUMMARY_MAX_TOKENS', default=300, cast=int)
+# Per-stage turn tracing; traces slower than BRUNO_TRACE_SLOW_MS are logged at INFO
+BRUNO_TRACING_ENABLED = config('BRUNO_TRACING_ENABLED', default=True, cast=bool)
+BRUNO_TRACE_SLOW_MS = config('BRUNO_TRACE_SLOW_MS', default=1000.0, cast=float)
+# Prometheus /metrics: with several worker processes, point BRUNO_METRICS_DIR at a
+# directory they share so the endpoint reports all of them; counters of exited
+# workers are kept in its retired.json
+BRUNO_METRICS_DIR = config('BRUNO_METRICS_DIR', default='')
+BRUNO_METRICS_FLUSH_INTERVAL = config('BRUNO_METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+# Bearer token that lets Prometheus scrape /metrics; when empty only staff users can read it
+BRUNO_METRICS_TOKEN = config('BRUNO_METRICS_TOKEN', default='')
+# Raise QueryBudgetExceeded when a request runs more queries than its view's budget
+# (for test runs; otherwise overruns are logged and counted)
+BRUNO_QUERY_BUDGET_STRICT = config('BRUNO_QUERY_BUDGET_STRICT', default=False, cast=bool)
+# On-demand profiling of staff requests (X-Bruno-Profile: 1); the newest
+# BRUNO_PROFILE_HISTORY profiles are kept and shown in the admin. Off unless an
+# environment turns it on (development does)
+BRUNO_PROFILING_ENABLED = config('BRUNO_PROFILING_ENABLED', default=False, cast=bool)
+BRUNO_PROFILE_INTERVAL_MS = config('BRUNO_PROFILE_INTERVAL_MS', default=5.0, cast=float)
+BRUNO_PROFILE_HISTORY = config('BRUNO_PROFILE_HISTORY', default=50, cast=int)
 
 # Logging
 LOGGING = {
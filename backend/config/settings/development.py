@@ -20,6 +20,9 @@ INSTALLED_APPS += [
 
 MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
 
+# On-demand request profiling for staff (X-Bruno-Profile: 1)
+BRUNO_PROFILING_ENABLED = config('BRUNO_PROFILING_ENABLED', default=True, cast=bool)
+
 INTERNAL_IPS = [
     '127.0.0.1',
     'localhost',
@@ -4,10 +4,12 @@ URL configuration for Bruno PA project.
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
+from apps.api.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('apps.api.urls')),
+    path('metrics', prometheus_metrics, name='prometheus-metrics'),
 ]
 
 if settings.DEBUG:
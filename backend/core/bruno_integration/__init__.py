@@ -2,16 +2,58 @@
 Bruno Integration - Main integration module
 """
 from .bruno_core import BrunoAgent, AgentConfig
-from .bruno_llm import OllamaClient, LLMFactory
-from .bruno_memory import MemoryManager, DjangoMemoryBackend
+from .bruno_llm import OllamaClient, OllamaSessionPool, LLMFactory
+from .admission import AdmissionController, AdmissionRejected
+from .balancer import OllamaBalancer, OllamaAPIError, NoEndpointAvailable
+from .response_cache import ResponseCache, CacheTier, DjangoCacheTier
+from .single_flight import SingleFlight
+from .context_builder import ContextBuilder, TokenCounter, estimate_tokens
+from .summarizer import ConversationSummarizer, DjangoSummaryStore
+from .tracing import Tracer, tracer, span, record
+from .metrics import MetricsRegistry, MultiprocessStore, Family, registry, render
+from .bruno_memory import (
+    MemoryManager, DjangoMemoryBackend, HistoryCache, SharedVersions, HistoryMessage, Role,
+    encode_cursor, decode_cursor, keyset_filter,
+)
 from .bruno_abilities import AbilityManager, Ability, create_default_abilities
 
 __all__ = [
     'BrunoAgent',
     'AgentConfig',
     'OllamaClient',
+    'OllamaSessionPool',
     'LLMFactory',
+    'AdmissionController',
+    'AdmissionRejected',
+    'OllamaBalancer',
+    'OllamaAPIError',
+    'NoEndpointAvailable',
+    'ResponseCache',
+    'CacheTier',
+    'DjangoCacheTier',
+    'SingleFlight',
+    'ContextBuilder',
+    'TokenCounter',
+    'estimate_tokens',
+    'ConversationSummarizer',
+    'DjangoSummaryStore',
+    'Tracer',
+    'tracer',
+    'span',
+    'record',
+    'MetricsRegistry',
+    'MultiprocessStore',
+    'Family',
+    'registry',
+    'render',
     'MemoryManager',
+    'HistoryCache',
+    'SharedVersions',
+    'HistoryMessage',
+    'Role',
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_filter',
     'DjangoMemoryBackend',
     'AbilityManager',
     'Ability',
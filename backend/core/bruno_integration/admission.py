@@ -0,0 +1,270 @@
+"""
+Bruno Admission - Bounded concurrency in front of LLM backends
+"""
+from typing import Any, Deque, Dict, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a generation cannot be admitted; callers should answer 429."""
+    
+    def __init__(self, key: str, reason: str, retry_after: int):
+        self.key = key
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Generation rejected for {key}: {reason} (retry after {retry_after}s)")
+
+
+class _Waiter:
+    """A queued acquisition, woken on its own event loop."""
+    __slots__ = ('loop', 'future', 'granted')
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+class ConcurrencyLimiter:
+    """
+    Limits concurrent generations for one key with a bounded FIFO wait queue.
+    
+    State is guarded by a thread lock and waiters are woken on their own loop,
+    so one limiter is safe to share between the ASGI loop and the throwaway
+    loops created by ``async_to_sync``.
+    """
+    
+    def __init__(self, key: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        """
+        Args:
+            key: Name of the endpoint/model this limiter guards
+            max_concurrency: Generations allowed to run at once
+            max_queue: Generations allowed to wait for a slot; more are rejected
+            queue_timeout: Seconds a generation may wait before it is rejected
+        """
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._max_queue_depth = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self._avg_hold: Optional[float] = None
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a generation slot for the duration of the block."""
+        with span('ollama.queue'):
+            await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+    
+    def idle(self) -> bool:
+        """Whether no generation is running or waiting."""
+        with self._lock:
+            return self._in_flight == 0 and not self._waiters
+    
+    async def acquire(self) -> None:
+        """Wait for a slot, raising AdmissionRejected when the queue is full or too slow."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        
+        with self._lock:
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                self._record_admission(0.0)
+                return
+            
+            if len(self._waiters) >= self.max_queue:
+                self._rejected_queue_full += 1
+                raise AdmissionRejected(self.key, "queue full", self._retry_after())
+            
+            waiter = _Waiter(loop, loop.create_future())
+            self._waiters.append(waiter)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if waiter.granted:
+                    # A slot was handed over just as we gave up; pass it on
+                    self._release_locked()
+                else:
+                    self._waiters.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._rejected_timeout += 1
+                    raise AdmissionRejected(self.key, "queue timeout", self._retry_after()) from None
+            raise
+        
+        with self._lock:
+            self._record_admission(time.monotonic() - started)
+    
+    def release(self, held_for: Optional[float] = None) -> None:
+        """Return a slot, handing it directly to the oldest waiter if any."""
+        with self._lock:
+            if held_for is not None:
+                # Exponentially weighted average of generation time, for Retry-After
+                self._avg_hold = held_for if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held_for
+            self._release_locked()
+    
+    def _release_locked(self) -> None:
+        if self._waiters:
+            # The slot moves straight to the next waiter; in_flight is unchanged
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(self._wake, waiter.future)
+        else:
+            self._in_flight -= 1
+    
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+    
+    def _record_admission(self, waited: float) -> None:
+        self._admitted += 1
+        self._wait_times.append(waited)
+    
+    def _retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request."""
+        if self._avg_hold is None:
+            return 1
+        backlog = (len(self._waiters) + 1) / self.max_concurrency
+        return max(1, math.ceil(self._avg_hold * backlog))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current load plus admission counters and wait-time percentiles."""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            stats = {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self._max_queue_depth,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+            }
+        
+        def percentile(pct: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(pct * len(waits)))] * 1000
+        
+        stats["wait_ms_p50"] = percentile(0.50)
+        stats["wait_ms_p95"] = percentile(0.95)
+        stats["wait_ms_max"] = waits[-1] * 1000 if waits else 0.0
+        return stats
+
+
+class AdmissionController:
+    """
+    Per endpoint/model concurrency limiters for LLM generations.
+    
+    Background work (conversation summaries) has limiters of its own and
+    never takes a slot from user turns: it only starts while the endpoint's
+    live limiter is idle, never waits, and runs at most
+    ``background_concurrency`` at a time.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        background_concurrency: int = 1
+    ):
+        """
+        Args:
+            max_concurrency: Default concurrent generations per endpoint and model
+            max_queue: Generations allowed to wait per endpoint and model
+            queue_timeout: Seconds a generation may wait for a slot
+            model_concurrency: Per-model overrides of max_concurrency
+            background_concurrency: Background generations allowed at once per
+                endpoint and model
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.model_concurrency = model_concurrency or {}
+        self.background_concurrency = background_concurrency
+        self._limiters: Dict[Tuple[str, str], ConcurrencyLimiter] = {}
+        self._background: Dict[Tuple[str, str], ConcurrencyLimiter] = {}
+        self._lock = threading.Lock()
+        logger.info(
+            f"Initialized AdmissionController: concurrency={max_concurrency}, "
+            f"queue={max_queue}, timeout={queue_timeout}s"
+        )
+    
+    def limiter(self, endpoint: str, model: str) -> ConcurrencyLimiter:
+        """Get or create the limiter for an endpoint/model pair."""
+        key = (endpoint, model)
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = ConcurrencyLimiter(
+                    key=f"{endpoint}|{model}",
+                    max_concurrency=self.model_concurrency.get(model, self.max_concurrency),
+                    max_queue=self.max_queue,
+                    queue_timeout=self.queue_timeout
+                )
+            return self._limiters[key]
+    
+    def slot(self, endpoint: str, model: str):
+        """Async context manager holding a generation slot for endpoint/model."""
+        return self.limiter(endpoint, model).slot()
+    
+    def background_slot(self, endpoint: str, model: str):
+        """
+        Async context manager holding a background slot for endpoint/model.
+        
+        Raises AdmissionRejected at once while user turns are running or
+        waiting, or while another background generation holds the slots.
+        """
+        live = self.limiter(endpoint, model)
+        if not live.idle():
+            raise AdmissionRejected(live.key, "busy with live turns", live._retry_after())
+        
+        key = (endpoint, model)
+        with self._lock:
+            if key not in self._background:
+                self._background[key] = ConcurrencyLimiter(
+                    key=f"{endpoint}|{model}",
+                    max_concurrency=self.background_concurrency,
+                    max_queue=0,
+                    queue_timeout=0.0
+                )
+            return self._background[key].slot()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Stats for every limiter, keyed by 'endpoint|model'."""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.key: limiter.stats() for limiter in limiters}
+    
+    def background_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Stats for every background limiter, keyed by 'endpoint|model'."""
+        with self._lock:
+            limiters = list(self._background.values())
+        return {limiter.key: limiter.stats() for limiter in limiters}
@@ -0,0 +1,401 @@
+"""
+Bruno Balancer - Spreads LLM requests across several Ollama endpoints
+"""
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import bisect
+import hashlib
+import logging
+import random
+import threading
+import time
+import aiohttp
+
+from .admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaAPIError(Exception):
+    """Non-200 response from an Ollama endpoint."""
+    
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(f"Ollama API error: {status} - {message}")
+
+
+class NoEndpointAvailable(Exception):
+    """Raised when no configured endpoint advertises the requested model."""
+
+
+class OllamaEndpoint:
+    """Health and load bookkeeping for one Ollama server."""
+    
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        # None until the first successful /api/tags check
+        self.models: Optional[Set[str]] = None
+        self.checked_at: Optional[float] = None
+        # Turns that went to the node that served the conversation's previous turn
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.hit_prompt_tokens = 0
+        self.miss_prompt_tokens = 0
+        self.spillovers = 0
+    
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+    
+    def serves(self, model: str) -> bool:
+        """Whether the endpoint advertises the model (assumed until tags are known)."""
+        if self.models is None:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+
+class EndpointLease:
+    """An endpoint claimed for one request, plus its affinity bookkeeping."""
+    __slots__ = ('endpoint', 'affinity_key', 'prefix_hit', 'spillover')
+    
+    def __init__(self, endpoint: OllamaEndpoint, affinity_key: Optional[str], prefix_hit: bool,
+                 spillover: bool = False):
+        self.endpoint = endpoint
+        self.affinity_key = affinity_key
+        self.prefix_hit = prefix_hit
+        self.spillover = spillover
+
+
+class OllamaBalancer:
+    """
+    Least-outstanding-requests balancing over a set of Ollama endpoints.
+    
+    Endpoints are health checked actively, by polling ``/api/tags`` (which
+    also tells us which models each node can serve), and passively, by
+    counting connection errors, timeouts and 5xx responses on real traffic.
+    A node that fails either way is ejected for ``eject_seconds`` and then
+    given traffic again; one more failure ejects it again.
+    
+    Active checks piggyback on requests rather than running on a dedicated
+    loop: the first request awaits a check, later ones schedule a refresh in
+    the background once ``health_check_interval`` has elapsed.
+    
+    Requests carrying an affinity key (the conversation id) are routed with
+    consistent hashing, so every turn of a conversation lands on the node
+    that already holds its prompt prefix in cache. Each node owns
+    ``virtual_nodes`` points on the ring; ejected, saturated or added nodes
+    only move the keys next to their own points. A key whose node already has
+    ``affinity_max_outstanding`` requests spills over to the next node on
+    the ring, and to the least loaded node once every candidate is saturated.
+    """
+    
+    def __init__(
+        self,
+        urls: List[str],
+        session_pool,
+        health_check_interval: Optional[float] = 10.0,
+        health_check_timeout: float = 2.0,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        affinity_max_outstanding: Optional[int] = 4,
+        virtual_nodes: int = 100,
+        affinity_cache_size: int = 10000
+    ):
+        """
+        Args:
+            urls: Base URLs of the Ollama servers
+            session_pool: OllamaSessionPool used for health checks
+            health_check_interval: Seconds between /api/tags checks (None disables them)
+            health_check_timeout: Seconds allowed for one health check
+            max_failures: Consecutive request failures before a node is ejected
+            eject_seconds: How long an ejected node receives no traffic
+            affinity_max_outstanding: Outstanding requests at which a node counts as
+                saturated for affinity routing (None = never spill over)
+            virtual_nodes: Points per node on the consistent-hash ring
+            affinity_cache_size: Conversations whose last serving node is remembered
+        """
+        if not urls:
+            raise ValueError("At least one Ollama endpoint is required")
+        
+        self.endpoints = [OllamaEndpoint(url) for url in dict.fromkeys(urls)]
+        self.session_pool = session_pool
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.affinity_max_outstanding = affinity_max_outstanding
+        self.virtual_nodes = virtual_nodes
+        self.affinity_cache_size = affinity_cache_size
+        
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._ring: List[Tuple[int, OllamaEndpoint]] = []
+        self._ring_points: List[int] = []
+        # affinity key -> URL of the node that served its last successful request
+        self._last_served: "OrderedDict[str, str]" = OrderedDict()
+        self._build_ring()
+        logger.info(f"Initialized OllamaBalancer with endpoints: {[e.url for e in self.endpoints]}")
+    
+    @asynccontextmanager
+    async def lease(self, model: str, affinity_key: Optional[str] = None):
+        """
+        Pick an endpoint for one request and account for it while it runs.
+        
+        Connection errors, timeouts and 5xx responses raised inside the block
+        count against the endpoint; anything else leaves its health untouched.
+        A request rejected by admission control or cancelled never reached the
+        endpoint, so it only gives the lease back: it is not recorded as served
+        and does not count towards the endpoint's request or prefix stats.
+        
+        Args:
+            model: Model the request needs
+            affinity_key: Conversation id to keep on one node, if any
+        """
+        await self._maybe_refresh()
+        lease = self.select(model, affinity_key)
+        try:
+            yield lease
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._finish(lease, failed=True, reason=repr(e))
+            raise
+        except OllamaAPIError as e:
+            self._finish(lease, failed=e.status >= 500, reason=str(e))
+            raise
+        except (AdmissionRejected, asyncio.CancelledError):
+            self._release(lease)
+            raise
+        except BaseException:
+            self._finish(lease, failed=False)
+            raise
+        else:
+            self._finish(lease, failed=False)
+    
+    def select(self, model: str, affinity_key: Optional[str] = None) -> EndpointLease:
+        """Claim an endpoint that serves the model: the key's ring node, else the least loaded."""
+        with self._lock:
+            now = time.monotonic()
+            serving = [e for e in self.endpoints if e.serves(model)]
+            if not serving:
+                raise NoEndpointAvailable(f"No Ollama endpoint serves model {model}")
+            
+            candidates = [e for e in serving if e.available(now)]
+            if not candidates:
+                # Everything is ejected: fail open to the node that comes back first
+                candidates = [min(serving, key=lambda e: e.ejected_until)]
+            
+            endpoint, spillover = None, False
+            if affinity_key is not None:
+                endpoint, spillover = self._affine(affinity_key, candidates)
+            if endpoint is None:
+                fewest = min(e.outstanding for e in candidates)
+                endpoint = random.choice([e for e in candidates if e.outstanding == fewest])
+            
+            endpoint.outstanding += 1
+            # Request and prefix stats are counted in _finish, once the request reached the node
+            prefix_hit = affinity_key is not None and self._last_served.get(affinity_key) == endpoint.url
+            return EndpointLease(endpoint, affinity_key, prefix_hit, spillover)
+    
+    def _affine(self, key: str, candidates: List[OllamaEndpoint]) -> Tuple[Optional[OllamaEndpoint], bool]:
+        """
+        First unsaturated candidate clockwise from the key on the ring, and
+        whether it spilled over past the key's own node; caller holds the lock.
+        """
+        eligible = set(candidates)
+        for position, endpoint in enumerate(e for e in self._walk(key) if e in eligible):
+            if self.affinity_max_outstanding is None or endpoint.outstanding < self.affinity_max_outstanding:
+                return endpoint, position > 0
+        return None, False
+    
+    def _walk(self, key: str) -> Iterator[OllamaEndpoint]:
+        """Distinct endpoints in ring order, starting at the key's position."""
+        if not self._ring:
+            return
+        start = bisect.bisect(self._ring_points, self._hash(key))
+        seen = set()
+        for i in range(len(self._ring)):
+            endpoint = self._ring[(start + i) % len(self._ring)][1]
+            if endpoint not in seen:
+                seen.add(endpoint)
+                yield endpoint
+                if len(seen) == len(self.endpoints):
+                    return
+    
+    def _build_ring(self) -> None:
+        """Place every endpoint's virtual nodes on the ring; caller holds the lock."""
+        self._ring = sorted(
+            (self._hash(f"{endpoint.url}#{i}"), endpoint)
+            for endpoint in self.endpoints
+            for i in range(self.virtual_nodes)
+        )
+        self._ring_points = [point for point, _ in self._ring]
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+    
+    def add_endpoint(self, url: str) -> None:
+        """Bring a new node into rotation; only keys next to its ring points move to it."""
+        with self._lock:
+            if any(e.url == url.rstrip('/') for e in self.endpoints):
+                return
+            self.endpoints.append(OllamaEndpoint(url))
+            self._build_ring()
+        logger.info(f"Added Ollama endpoint {url}")
+    
+    def remove_endpoint(self, url: str) -> None:
+        """Take a node out for good; its keys move to their ring successors."""
+        with self._lock:
+            remaining = [e for e in self.endpoints if e.url != url.rstrip('/')]
+            if not remaining:
+                raise ValueError("Cannot remove the last Ollama endpoint")
+            self.endpoints = remaining
+            self._build_ring()
+        logger.info(f"Removed Ollama endpoint {url}")
+    
+    def record_prompt_eval(self, lease: EndpointLease, prompt_eval_count: int) -> None:
+        """Attribute evaluated prompt tokens to a cache hit or miss on the leased node."""
+        if lease.affinity_key is None:
+            return
+        with self._lock:
+            if lease.prefix_hit:
+                lease.endpoint.hit_prompt_tokens += prompt_eval_count
+            else:
+                lease.endpoint.miss_prompt_tokens += prompt_eval_count
+    
+    def _release(self, lease: EndpointLease) -> None:
+        """Give a lease back without touching the endpoint's health or affinity."""
+        with self._lock:
+            lease.endpoint.outstanding -= 1
+    
+    def _finish(self, lease: EndpointLease, failed: bool, reason: str = "") -> None:
+        endpoint = lease.endpoint
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if lease.spillover:
+                endpoint.spillovers += 1
+            if lease.affinity_key is not None:
+                if lease.prefix_hit:
+                    endpoint.prefix_hits += 1
+                else:
+                    endpoint.prefix_misses += 1
+            
+            if not failed:
+                endpoint.consecutive_failures = 0
+                if lease.affinity_key is not None:
+                    self._last_served[lease.affinity_key] = endpoint.url
+                    self._last_served.move_to_end(lease.affinity_key)
+                    while len(self._last_served) > self.affinity_cache_size:
+                        self._last_served.popitem(last=False)
+                return
+            
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.max_failures:
+                self._eject(endpoint, reason)
+    
+    def _eject(self, endpoint: OllamaEndpoint, reason: str) -> None:
+        """Take an endpoint out of rotation; caller holds the lock."""
+        if endpoint.available(time.monotonic()):
+            endpoint.ejections += 1
+            logger.warning(f"Ejecting Ollama endpoint {endpoint.url} for {self.eject_seconds}s: {reason}")
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+    
+    async def _maybe_refresh(self) -> None:
+        if self.health_check_interval is None:
+            return
+        
+        with self._lock:
+            never_checked = any(e.checked_at is None for e in self.endpoints)
+            oldest = min((e.checked_at or 0.0) for e in self.endpoints)
+            due = time.monotonic() - oldest >= self.health_check_interval
+            start = not self._refreshing and (never_checked or due)
+            if start:
+                self._refreshing = True
+        
+        if not never_checked:
+            if start:
+                task = asyncio.get_running_loop().create_task(self.refresh())
+                self._tasks.add(task)
+                task.add_done_callback(self._refresh_done)
+            return
+        
+        # Learn which models each node serves before routing the first requests
+        if start:
+            try:
+                await self.refresh()
+            finally:
+                self._refresh_done()
+        else:
+            # The first check may be running on another event loop, so poll for it
+            deadline = time.monotonic() + self.health_check_timeout
+            while self._refreshing and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+    
+    def _refresh_done(self, task: Optional[asyncio.Task] = None) -> None:
+        self._tasks.discard(task)
+        with self._lock:
+            self._refreshing = False
+    
+    async def refresh(self) -> None:
+        """Actively check every endpoint and update its advertised models."""
+        await asyncio.gather(*(self._check(endpoint) for endpoint in list(self.endpoints)))
+    
+    async def _check(self, endpoint: OllamaEndpoint) -> None:
+        timeout = aiohttp.ClientTimeout(total=self.health_check_timeout)
+        try:
+            async with self.session_pool.request('GET', f"{endpoint.url}/api/tags", timeout=timeout) as response:
+                if response.status != 200:
+                    raise OllamaAPIError(response.status, await response.text())
+                data = await response.json()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            with self._lock:
+                endpoint.checked_at = time.monotonic()
+                self._eject(endpoint, f"health check failed: {e!r}")
+            return
+        
+        with self._lock:
+            if not endpoint.available(time.monotonic()):
+                logger.info(f"Ollama endpoint {endpoint.url} passed its health check, restoring")
+            endpoint.models = {model['name'] for model in data.get('models', [])}
+            endpoint.checked_at = time.monotonic()
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-endpoint health, load, advertised models and prefix cache hit rate."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "url": e.url,
+                    "healthy": e.available(now),
+                    "outstanding": e.outstanding,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "consecutive_failures": e.consecutive_failures,
+                    "ejections": e.ejections,
+                    "models": sorted(e.models) if e.models is not None else None,
+                    "prefix_hits": e.prefix_hits,
+                    "prefix_misses": e.prefix_misses,
+                    "prefix_hit_rate": _ratio(e.prefix_hits, e.prefix_hits + e.prefix_misses),
+                    "avg_prompt_eval_hit": _ratio(e.hit_prompt_tokens, e.prefix_hits),
+                    "avg_prompt_eval_miss": _ratio(e.miss_prompt_tokens, e.prefix_misses),
+                    "spillovers": e.spillovers,
+                }
+                for e in self.endpoints
+            ]
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
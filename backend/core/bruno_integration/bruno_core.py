@@ -1,12 +1,26 @@
 """
 Bruno Core - Core agent functionality
 """
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
+import asyncio
 import logging
+import time
+
+from .admission import AdmissionRejected
+from .bruno_memory import Role
+from .context_builder import ContextBuilder
+from .tracing import record, span
+from .metrics import registry
 
 logger = logging.getLogger(__name__)
 
+TURNS = registry.counter(
+    'bruno_chat_turns_total',
+    'Chat turns by kind (notes command or LLM) and outcome (success, error, rejected)',
+    ['kind', 'outcome']
+)
+
 
 @dataclass
 class AgentConfig:
@@ -17,16 +31,28 @@ class AgentConfig:
     max_tokens: int = 2000
     system_prompt: str = "You are Bruno, a helpful AI assistant."
     llm_provider: str = "ollama"
+    # Tokens the model can attend to (prompt + reply); sent to Ollama as num_ctx
+    context_window: int = 4096
 
 
 class BrunoAgent:
     """Core Bruno AI Agent."""
     
-    def __init__(self, config: AgentConfig, llm_client, memory_manager=None, notes_ability=None):
+    def __init__(
+        self,
+        config: AgentConfig,
+        llm_client,
+        memory_manager=None,
+        notes_ability=None,
+        context_builder: Optional[ContextBuilder] = None,
+        summarizer=None
+    ):
         self.config = config
         self.llm_client = llm_client
         self.memory_manager = memory_manager
         self.notes_ability = notes_ability
+        self.context_builder = context_builder or ContextBuilder()
+        self.summarizer = summarizer
         logger.info(f"Initialized BrunoAgent: {config.name} with {config.llm_provider}/{config.model}")
     
     async def process_message(
@@ -49,97 +75,294 @@ class BrunoAgent:
             Dict containing response, tokens used, and metadata
         """
         try:
-            # Check if this is a notes command
-            if self.notes_ability and user_id:
-                notes_response = await self.notes_ability.handle_notes_command(
-                    user_id=user_id,
-                    conversation_id=conversation_id,
-                    command=user_message
-                )
-                if notes_response:
-                    # This was a notes command - return notes response
-                    return {
-                        "content": notes_response,
-                        "model": self.config.model,
-                        "tokens_used": 0,
-                        "success": True,
-                        "is_notes_response": True
-                    }
+            notes_response, messages, context_tokens, context_timings = await self._prepare_turn(
+                user_message, conversation_id, user_id
+            )
+            if notes_response is not None:
+                TURNS.inc(kind="notes", outcome="success")
+                return {**notes_response, "context_timings": context_timings}
             
-
-            # Get conversation history from memory if available
-            conversation_history = []
-            if self.memory_manager:
-                conversation_history = await self.memory_manager.get_history(
-                    conversation_id, limit=10
+            # Generate response using LLM
+            with span('llm.generate'):
+                response = await self.llm_client.generate(
+                    messages=messages,
+                    model=self.config.model,
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens,
+                    conversation_id=conversation_id,
+                    context_window=self.config.context_window
                 )
             
-            logger.info(f"Conversation history retrieved: {len(conversation_history)} messages for {conversation_id}")
-            for i, msg in enumerate(conversation_history):
-                logger.info(f"  History {i+1}: [{msg['role']}] {msg['content'][:50]}...")
-            
-            # Build messages for LLM
-            messages = [
-                {"role": "system", "content": self.config.system_prompt}
-            ]
-            
-            # Inject long-term memories into context if available
-            if user_id:
-                from core.bruno_integration.memory_extraction import memory_extractor
-                memory_context = await memory_extractor.format_memories_for_context(user_id, limit=10)
-                if memory_context:
-                    messages.append({
-                        "role": "system",
-                        "content": memory_context
-                    })
-                    logger.info(f"Injected long-term memories into context for user {user_id}")
+            # Note: Messages are saved to database by views.py, not here
+            # Memory manager only reads from database for conversation history
             
-            # Add conversation history (excluding the last user message if it matches current input)
-            # This prevents duplicate messages when the current user message is already in history
-            for msg in conversation_history:
-                # Skip if this is the current user message (already in DB before this function is called)
-                if msg["role"] == "user" and msg["content"] == user_message:
-                    continue
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+            TURNS.inc(kind="llm", outcome="success")
+            return {
+                "content": response["content"],
+                "model": self.config.model,
+                "tokens_used": response.get("tokens_used", 0),
+                **self._prompt_stats(response),
+                "context_tokens": context_tokens,
+                "context_timings": context_timings,
+                "success": True
+            }
             
-            # Add current user message (might be duplicate from history, but we ensure uniqueness above)
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
+        except AdmissionRejected:
+            # Overload is answered with 429 by the caller, not an apology message
+            TURNS.inc(kind="llm", outcome="rejected")
+            raise
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}", exc_info=True)
+            TURNS.inc(kind="llm", outcome="error")
+            return self._error_response(e)
+    
+    async def process_message_stream(
+        self,
+        user_message: str,
+        conversation_id: str,
+        user_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user message, yielding response tokens as they are generated.
+        
+        Args:
+            user_message: The user's input message
+            conversation_id: ID of the conversation
+            user_id: ID of the user (for notes functionality)
             
-            logger.info(f"Total messages being sent to LLM: {len(messages)}")
+        Yields:
+            ``{"type": "token", "content": ...}`` events while the LLM generates,
+            followed by exactly one ``{"type": "done", ...}`` event carrying the
+            same fields ``process_message`` returns
+        """
+        try:
+            notes_response, messages, context_tokens, context_timings = await self._prepare_turn(
+                user_message, conversation_id, user_id
+            )
+            if notes_response is not None:
+                TURNS.inc(kind="notes", outcome="success")
+                yield {"type": "done", **notes_response, "context_timings": context_timings}
+                return
             
-            # Generate response using LLM
-            response = await self.llm_client.generate(
+            content_parts = []
+            final = {}
+            async for chunk in self.llm_client.generate_stream(
                 messages=messages,
                 model=self.config.model,
                 temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens
-            )
-            
-            # Note: Messages are saved to database by views.py, not here
-            # Memory manager only reads from database for conversation history
+                max_tokens=self.config.max_tokens,
+                conversation_id=conversation_id,
+                context_window=self.config.context_window
+            ):
+                if chunk["done"]:
+                    final = chunk
+                    continue
+                content_parts.append(chunk["content"])
+                yield {"type": "token", "content": chunk["content"]}
             
-            return {
-                "content": response["content"],
+            TURNS.inc(kind="llm", outcome="success")
+            yield {
+                "type": "done",
+                "content": "".join(content_parts),
                 "model": self.config.model,
-                "tokens_used": response.get("tokens_used", 0),
+                "tokens_used": final.get("tokens_used", 0),
+                **self._prompt_stats(final),
+                "context_tokens": context_tokens,
+                "context_timings": context_timings,
                 "success": True
             }
             
+        except AdmissionRejected:
+            TURNS.inc(kind="llm", outcome="rejected")
+            raise
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}", exc_info=True)
+            logger.error(f"Error streaming message: {str(e)}", exc_info=True)
+            TURNS.inc(kind="llm", outcome="error")
+            yield {"type": "done", **self._error_response(e)}
+    
+    async def _prepare_turn(
+        self,
+        user_message: str,
+        conversation_id: str,
+        user_id: str = None
+    ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, str]], Dict[str, Any], Dict[str, Any]]:
+        """
+        Handle notes commands and assemble the LLM message list for a turn.
+        
+        The notes check, history, long-term memories and rolling summary are
+        independent, so they are fetched concurrently and the wait before the
+        LLM call is that of the slowest stage rather than the sum. Each context
+        stage is bounded by ``context_builder.stage_timeout``; one that times
+        out or fails is left out of the prompt instead of failing the turn. The
+        notes command always runs to completion.
+        
+        Returns:
+            ``(notes_response, [], {}, timings)`` when the message was a notes
+            command, otherwise ``(None, messages, context_tokens, timings)``
+            with the messages ready to send to the LLM, the tokens each section
+            consumed and the milliseconds each stage took
+        """
+        builder = self.context_builder
+        started = time.perf_counter()
+        timings: Dict[str, Any] = {"stages": {}, "timed_out": [], "failed": []}
+        
+        from core.bruno_integration.memory_extraction import memory_extractor
+        
+        notes_stage = history_stage = memories_stage = summary_stage = None
+        if self.notes_ability and user_id:
+            notes_stage = self.notes_ability.handle_notes_command(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                command=user_message
+            )
+        # The builder decides how much of the history and memories fits
+        if self.memory_manager:
+            history_stage = self.memory_manager.get_history(
+                conversation_id, limit=builder.history_candidates
+            )
+        if user_id:
+            memories_stage = memory_extractor.get_relevant_memories(
+                user_id, limit=builder.memory_candidates
+            )
+        if self.summarizer:
+            summary_stage = self.summarizer.get(conversation_id)
+        
+        notes_response, conversation_history, memories, (summary, through) = await asyncio.gather(
+            self._stage("notes", notes_stage, None, timings, required=True),
+            self._stage("history", history_stage, [], timings),
+            self._stage("memories", memories_stage, [], timings),
+            self._stage("summary", summary_stage, ("", None), timings)
+        )
+        
+        if notes_response:
+            # This was a notes command - return notes response
+            timings["total_ms"] = self._elapsed_ms(started)
             return {
-                "content": "I apologize, but I encountered an error processing your message. Please try again.",
+                "content": notes_response,
                 "model": self.config.model,
                 "tokens_used": 0,
-                "success": False,
-                "error": str(e)
-            }
+                "success": True,
+                "is_notes_response": True
+            }, [], {}, timings
+        
+        logger.debug(f"Conversation history retrieved: {len(conversation_history)} messages for {conversation_id}")
+        format_memories = memory_extractor.format_memories if memories else None
+        
+        # Exclude the current user message from history (already in DB before this function is called)
+        history = [
+            msg for msg in conversation_history
+            if not (msg.role is Role.USER and msg.content == user_message)
+        ]
+        
+        # Turns already folded into the rolling summary are sent as the summary instead
+        summarized = []
+        if self.summarizer:
+            summarized = [msg for msg in history if self.summarizer.covers(msg, through)]
+            history = [msg for msg in history if not self.summarizer.covers(msg, through)]
+        
+        with span('context.build'):
+            messages, context_tokens = builder.build(
+                budget=builder.budget(self.config.context_window, self.config.max_tokens),
+                system_prompt=self.config.system_prompt,
+                user_message=user_message,
+                history=history,
+                memories=memories,
+                format_memories=format_memories,
+                summary=summary,
+                summarized=summarized
+            )
+        if self.summarizer:
+            self.summarizer.record_turn(context_tokens)
+        
+        if context_tokens["memories_included"]:
+            logger.info(f"Injected {context_tokens['memories_included']} long-term memories into context for user {user_id}")
+        logger.info(
+            f"Total messages being sent to LLM: {len(messages)} "
+            f"({context_tokens['total']}/{context_tokens['budget']} tokens: "
+            f"system={context_tokens['system']} memories={context_tokens['memories']} "
+            f"summary={context_tokens['summary']} history={context_tokens['history']} "
+            f"current={context_tokens['current']}, history dropped={context_tokens['history_dropped']}, "
+            f"saved by summary={context_tokens['summary_saved']})"
+        )
+        timings["total_ms"] = self._elapsed_ms(started)
+        logger.debug(
+            f"Context assembled in {timings['total_ms']}ms "
+            + " ".join(f"{name}={ms}ms" for name, ms in timings["stages"].items())
+        )
+        return None, messages, context_tokens, timings
+    
+    async def _stage(
+        self,
+        name: str,
+        awaitable: Optional[Awaitable[Any]],
+        default: Any,
+        timings: Dict[str, Any],
+        required: bool = False
+    ) -> Any:
+        """
+        Await one context stage within the stage timeout, recording how long it took.
+        
+        Args:
+            name: Stage name used in the timings and logs
+            awaitable: The stage's work, or None when it does not apply to this turn
+            default: Result used when the stage is skipped, times out or fails
+            timings: Per-turn timings the stage is recorded in
+            required: The turn depends on the stage (the notes command, which
+                may be writing a note): it is never timed out, since a
+                cancelled command would half-apply and then reach the LLM as
+                a chat message, and failures are re-raised instead of falling
+                back to ``default``
+        """
+        if awaitable is None:
+            return default
+        started = time.perf_counter()
+        timeout = None if required else self.context_builder.stage_timeout
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            timings["timed_out"].append(name)
+            logger.warning(
+                f"Context stage '{name}' timed out after {self.context_builder.stage_timeout}s; "
+                f"continuing without it"
+            )
+            return default
+        except Exception as e:
+            if required:
+                raise
+            timings["failed"].append(name)
+            logger.warning(f"Context stage '{name}' failed; continuing without it: {e}")
+            return default
+        finally:
+            timings["stages"][name] = self._elapsed_ms(started)
+            record(f"context.{name}", timings["stages"][name])
+    
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    @staticmethod
+    def _prompt_stats(response: Dict[str, Any]) -> Dict[str, Any]:
+        """Token usage and timings reported by the LLM client, if any."""
+        return {
+            "prompt_eval_count": response.get("prompt_eval_count", 0),
+            "completion_tokens": response.get("completion_tokens", 0),
+            "prompt_eval_duration_ms": response.get("prompt_eval_duration_ms", 0),
+            "eval_duration_ms": response.get("eval_duration_ms", 0),
+            "load_duration_ms": response.get("load_duration_ms", 0),
+            "total_duration_ms": response.get("total_duration_ms", 0),
+            "context_reused": response.get("context_reused", False),
+            "cached": response.get("cached", False),
+        }
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        """Build the apology response returned when a turn fails."""
+        return {
+            "content": "I apologize, but I encountered an error processing your message. Please try again.",
+            "model": self.config.model,
+            "tokens_used": 0,
+            "success": False,
+            "error": str(error)
+        }
     
     def update_config(self, **kwargs):
         """Update agent configuration."""
@@ -1,20 +1,286 @@
 """
 Bruno LLM - Language model integration with Ollama support
 """
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 import aiohttp
 import logging
 import json
 
+from .admission import AdmissionController, AdmissionRejected
+from .balancer import EndpointLease, OllamaAPIError, OllamaBalancer
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+from .tracing import record, span
+from .metrics import registry
+
 logger = logging.getLogger(__name__)
 
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    'bruno_ollama_time_to_first_token_seconds',
+    'Time from sending a generation to its first token, by model',
+    ['model']
+)
+TOKENS_PER_SECOND = registry.histogram(
+    'bruno_ollama_tokens_per_second',
+    'Generation speed reported by Ollama, by model',
+    ['model'],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200)
+)
+
+
+class OllamaSessionPool:
+    """
+    Per-event-loop pool of keep-alive aiohttp sessions.
+    
+    aiohttp sessions and connectors are bound to the event loop they were
+    created on, so one session is kept per loop. Under ASGI every request runs
+    on the server's loop (``async_to_sync`` from a sync view schedules onto it
+    as well) and shares a single connector. When ``async_to_sync`` has to spin
+    up a throwaway loop, a keeper task closes that loop's session when
+    ``asyncio.run`` cancels the remaining tasks, so nothing leaks.
+    """
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 30.0,
+        use_dns_cache: bool = True,
+        ttl_dns_cache: Optional[int] = 300,
+        connect_timeout: Optional[float] = 10.0,
+        request_timeout: Optional[float] = None
+    ):
+        """
+        Initialize the session pool.
+        
+        Args:
+            limit: Maximum number of simultaneous connections per loop (0 = unlimited)
+            limit_per_host: Maximum simultaneous connections per endpoint (0 = unlimited)
+            keepalive_timeout: Seconds an idle connection is kept open for reuse
+            use_dns_cache: Whether resolved hostnames are cached
+            ttl_dns_cache: Seconds a DNS cache entry stays valid (None = forever)
+            connect_timeout: Seconds allowed to establish a connection
+            request_timeout: Total seconds allowed per request (None = no limit)
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.use_dns_cache = use_dns_cache
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout, sock_connect=connect_timeout)
+        
+        # loop -> (session, keeper task); the entry is removed when the loop shuts down
+        self._sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, asyncio.Task]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "sessions_created": 0,
+            "sessions_closed": 0,
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+    
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+    
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Build trace hooks that feed the pool statistics."""
+        trace_config = aiohttp.TraceConfig()
+        
+        async def on_connection_create_end(session, ctx, params):
+            self._incr("connections_created")
+        
+        async def on_connection_reuseconn(session, ctx, params):
+            self._incr("connections_reused")
+        
+        async def on_dns_cache_hit(session, ctx, params):
+            self._incr("dns_cache_hits")
+        
+        async def on_dns_cache_miss(session, ctx, params):
+            self._incr("dns_cache_misses")
+        
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the session for the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        
+        with self._lock:
+            entry = self._sessions.get(loop)
+            if entry is not None and not entry[0].closed:
+                return entry[0]
+            
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=self.use_dns_cache,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()],
+            )
+            # Close the session on this loop when the loop shuts down
+            keeper = loop.create_task(self._keep(loop, session))
+            self._sessions[loop] = (session, keeper)
+            self._stats["sessions_created"] += 1
+        
+        logger.debug(f"Created pooled Ollama session for loop {id(loop)}")
+        return session
+    
+    async def _keep(self, loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession) -> None:
+        """Hold a session open until the owning loop cancels its tasks."""
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            with self._lock:
+                entry = self._sessions.get(loop)
+                if entry is not None and entry[0] is session:
+                    del self._sessions[loop]
+            await self._close_session(session)
+    
+    async def _close_session(self, session: aiohttp.ClientSession) -> None:
+        if session.closed:
+            return
+        await session.close()
+        self._incr("sessions_closed")
+    
+    def request(self, method: str, url: str, **kwargs):
+        """
+        Issue a request on the pooled session for the running loop.
+        
+        Usage: ``async with pool.request('POST', url, json=payload) as response``
+        """
+        return _PooledRequest(self, method, url, kwargs)
+    
+    async def close(self) -> None:
+        """Close every pooled session, on whichever loop owns it."""
+        current_loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = list(self._sessions.items())
+        
+        for loop, (session, keeper) in entries:
+            if loop is current_loop:
+                await self._stop_keeper(keeper)
+            elif loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self._stop_keeper(keeper), loop)
+                await asyncio.wrap_future(future)
+        
+        logger.info("Closed Ollama session pool")
+    
+    @staticmethod
+    async def _stop_keeper(keeper: asyncio.Task) -> None:
+        """Cancel a keeper task, which closes its session on the way out."""
+        keeper.cancel()
+        await asyncio.gather(keeper, return_exceptions=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters and the connection reuse rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active_sessions"] = sum(1 for s, _ in self._sessions.values() if not s.closed)
+        
+        acquired = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_rate"] = stats["connections_reused"] / acquired if acquired else 0.0
+        return stats
+
+
+class _PooledRequest:
+    """Async context manager returned by ``OllamaSessionPool.request``."""
+    
+    def __init__(self, pool: OllamaSessionPool, method: str, url: str, kwargs: Dict[str, Any]):
+        self.pool = pool
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self._context = None
+    
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        session = await self.pool.get_session()
+        self.pool._incr("requests")
+        self._context = session.request(self.method, self.url, **self.kwargs)
+        return await self._context.__aenter__()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return await self._context.__aexit__(exc_type, exc, tb)
+
 
 class OllamaClient:
-    """Client for Ollama LLM API."""
+    """
+    Client for Ollama LLM API.
+    
+    Supports the native ``/api/chat`` endpoint (default), where Ollama reuses
+    its KV cache for a matching prompt prefix while the model stays loaded
+    (``keep_alive``), and the legacy ``/api/generate`` prompt mode, where the
+    ``context`` returned for a conversation is sent back on the next turn so
+    only the new messages have to be evaluated.
+    
+    Requests go to whichever endpoint the balancer picks (the conversation's
+    home node when a conversation id is given); without a balancer every
+    request goes to ``base_url``.
+    """
+    
+    API_MODES = ('chat', 'generate')
     
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        session_pool: Optional[OllamaSessionPool] = None,
+        api_mode: str = "chat",
+        keep_alive: Optional[str] = None,
+        context_cache_size: int = 1024,
+        admission: Optional[AdmissionController] = None,
+        balancer: Optional[OllamaBalancer] = None,
+        response_cache: Optional[ResponseCache] = None,
+        single_flight: Optional[SingleFlight] = None
+    ):
+        """
+        Args:
+            base_url: Ollama server URL
+            session_pool: Shared HTTP session pool (a private one is created if omitted)
+            api_mode: 'chat' for /api/chat or 'generate' for /api/generate
+            keep_alive: How long Ollama keeps the model loaded after a request (e.g. '30m')
+            context_cache_size: Conversations whose generate-mode context is retained
+            admission: Concurrency limits per endpoint/model (unlimited if omitted)
+            balancer: Endpoint pool to spread requests over (only base_url if omitted)
+            response_cache: Exact-match cache for deterministic completions (off if omitted)
+            single_flight: Coalesces concurrent identical generations (a private one if omitted)
+        """
+        if api_mode not in self.API_MODES:
+            raise ValueError(f"Unsupported Ollama API mode: {api_mode}")
+        
         self.base_url = base_url.rstrip('/')
-        logger.info(f"Initialized OllamaClient with base_url: {self.base_url}")
+        self.session_pool = session_pool or OllamaSessionPool()
+        self.api_mode = api_mode
+        self.keep_alive = keep_alive
+        self.context_cache_size = context_cache_size
+        self.admission = admission
+        self.response_cache = response_cache
+        self.single_flight = single_flight or SingleFlight("ollama generate")
+        self.balancer = balancer or OllamaBalancer(
+            [self.base_url], self.session_pool, health_check_interval=None
+        )
+        # conversation_id -> (prefix message count, prefix digest, context tokens)
+        self._contexts: "OrderedDict[str, Tuple[int, str, List[int]]]" = OrderedDict()
+        endpoints = [endpoint.url for endpoint in self.balancer.endpoints]
+        logger.info(f"Initialized OllamaClient with endpoints: {endpoints} ({api_mode} API)")
     
     async def generate(
         self,
@@ -22,7 +288,10 @@ class OllamaClient:
         model: str = "llama3.2",
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        stream: bool = False
+        stream: bool = False,
+        conversation_id: Optional[str] = None,
+        context_window: Optional[int] = None,
+        background: bool = False
     ) -> Dict[str, Any]:
         """
         Generate a response using Ollama.
@@ -33,61 +302,366 @@ class OllamaClient:
             temperature: Sampling temperature (0-1)
             max_tokens: Maximum tokens to generate
             stream: Whether to stream the response
+            conversation_id: Conversation the turn belongs to, used to reuse
+                the evaluated prompt context across turns
+            context_window: Context length to load the model with (Ollama's
+                ``num_ctx``); the model's default if omitted
+            background: Low-priority work that must not hold up user turns;
+                rejected at once unless the model is idle (see
+                ``AdmissionController.background_slot``)
             
         Returns:
-            Dict with 'content', 'tokens_used', and other metadata
+            Dict with 'content', usage ('tokens_used', 'prompt_eval_count',
+            'completion_tokens' and the '*_duration_ms' timings), 'context_reused',
+            'cached' when served from the response cache, and other metadata
         """
-        try:
-            # Convert messages to Ollama format
-            prompt = self._messages_to_prompt(messages)
-            
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "temperature": temperature,
-                "options": {
-                    "num_predict": max_tokens,
-                },
-                "stream": stream
-            }
-            
-            url = f"{self.base_url}/api/generate"
+        if stream:
+            # Consume the token stream and return the assembled completion
+            content_parts = []
+            final = {}
+            async for chunk in self.generate_stream(
+                messages, model, temperature, max_tokens,
+                conversation_id=conversation_id, context_window=context_window
+            ):
+                if chunk["done"]:
+                    final = chunk
+                else:
+                    content_parts.append(chunk["content"])
             
-            # Create a new session for each request to avoid event loop issues with async_to_sync
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"Ollama API error: {response.status} - {error_text}")
-                    
-                    if stream:
-                        # Handle streaming response
-                        full_response = ""
-                        async for line in response.content:
-                            if line:
-                                data = json.loads(line.decode('utf-8'))
-                                if 'response' in data:
-                                    full_response += data['response']
+            final = {key: value for key, value in final.items() if key not in ("content", "done")}
+            return {"content": "".join(content_parts), "model": model, **final}
+        
+        cache_key = self._cache_key(model, temperature, max_tokens, messages, context_window)
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return self._cached_response(cached)
+        
+        if background:
+            # Rejected rather than queued, so a user turn never shares its flight
+            return await self._generate(
+                messages, model, temperature, max_tokens, conversation_id, context_window, cache_key,
+                background=True
+            )
+        
+        # Identical requests already generating for the same conversation (retries,
+        # double submits) share that generation; other conversations sample their own
+        # reply and, in generate mode, keep their own prompt context
+        flight_key = (
+            conversation_id,
+            cache_key or ResponseCache.make_key(model, temperature, max_tokens, messages, context_window)
+        )
+        return await self.single_flight.do(
+            flight_key,
+            lambda: self._generate(
+                messages, model, temperature, max_tokens, conversation_id, context_window, cache_key
+            )
+        )
+    
+    async def _generate(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        conversation_id: Optional[str],
+        context_window: Optional[int],
+        cache_key: Optional[str],
+        background: bool = False
+    ) -> Dict[str, Any]:
+        """Run one non-streaming generation against a leased endpoint."""
+        try:
+            async with self.balancer.lease(model, conversation_id) as lease, \
+                    self._admit(lease.endpoint.url, model, background):
+                url, payload, context_reused = self._build_request(
+                    lease.endpoint.url, messages, model, temperature, max_tokens,
+                    stream=False, conversation_id=conversation_id, context_window=context_window
+                )
+                
+                # Pooled per-loop session keeps the connection alive between turns
+                with span('ollama.request'):
+                    async with self.session_pool.request('POST', url, json=payload) as response:
+                        if response.status != 200:
+                            raise OllamaAPIError(response.status, await response.text())
                         
-                        return {
-                            "content": full_response,
-                            "model": model,
-                            "tokens_used": 0  # Ollama doesn't provide token count in streaming
-                        }
-                    else:
-                        # Handle non-streaming response
                         data = await response.json()
+                        content = self._extract_content(data)
+                        self._remember_context(conversation_id, messages, content, data)
                         
-                        return {
-                            "content": data.get('response', ''),
+                        result = {
+                            "content": content,
                             "model": model,
-                            "tokens_used": data.get('eval_count', 0)
+                            **self._usage(lease, model, data, context_reused)
                         }
-                    
+                        if cache_key:
+                            await self.response_cache.set(cache_key, result)
+                        return result
+        
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            raise
         except Exception as e:
             logger.error(f"Error generating response with Ollama: {str(e)}", exc_info=True)
             raise
     
+    async def generate_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "llama3.2",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        conversation_id: Optional[str] = None,
+        context_window: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate a response using Ollama, yielding tokens as they arrive.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model name to use
+            temperature: Sampling temperature (0-1)
+            max_tokens: Maximum tokens to generate
+            conversation_id: Conversation the turn belongs to (see ``generate``)
+            context_window: Context length to load the model with (see ``generate``)
+            
+        Yields:
+            ``{"content": <token>, "done": False}`` for every generated chunk,
+            then one ``{"content": "", "done": True, "model", "tokens_used", ...}``
+            frame built from Ollama's final stats line
+        """
+        cache_key = self._cache_key(model, temperature, max_tokens, messages, context_window)
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                # Replay the whole completion as a single chunk
+                final = self._cached_response(cached)
+                yield {"content": final.pop("content"), "done": False}
+                yield {"content": "", "done": True, **final}
+                return
+        
+        try:
+            # The endpoint and slot are held until the stream is consumed or abandoned
+            async with self.balancer.lease(model, conversation_id) as lease, self._admit(lease.endpoint.url, model):
+                url, payload, context_reused = self._build_request(
+                    lease.endpoint.url, messages, model, temperature, max_tokens,
+                    stream=True, conversation_id=conversation_id, context_window=context_window
+                )
+                
+                # Spans the whole stream, including time the caller spends relaying tokens
+                with span('ollama.stream'):
+                    requested = time.perf_counter()
+                    async with self.session_pool.request('POST', url, json=payload) as response:
+                        if response.status != 200:
+                            raise OllamaAPIError(response.status, await response.text())
+                        
+                        # Ollama streams newline-delimited JSON objects
+                        content_parts = []
+                        first_token = None
+                        async for line in response.content:
+                            if not line.strip():
+                                continue
+                            
+                            data = json.loads(line.decode('utf-8'))
+                            if data.get('done'):
+                                content = "".join(content_parts)
+                                self._remember_context(conversation_id, messages, content, data)
+                                final = {
+                                    "model": model,
+                                    **self._usage(lease, model, data, context_reused, first_token)
+                                }
+                                if cache_key:
+                                    await self.response_cache.set(cache_key, {"content": content, **final})
+                                yield {"content": "", "done": True, **final}
+                                return
+                            
+                            token = self._extract_content(data)
+                            if token:
+                                if first_token is None:
+                                    first_token = time.perf_counter() - requested
+                                content_parts.append(token)
+                                yield {"content": token, "done": False}
+        
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming response from Ollama: {str(e)}", exc_info=True)
+            raise
+    
+    def _cache_key(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        messages: List[Dict[str, str]],
+        context_window: Optional[int] = None
+    ) -> Optional[str]:
+        """Response cache key, or None when the cache is off or the request is sampled."""
+        if self.response_cache is None or not self.response_cache.cacheable(temperature):
+            return None
+        return self.response_cache.make_key(model, temperature, max_tokens, messages, context_window)
+    
+    @staticmethod
+    def _cached_response(cached: Dict[str, Any]) -> Dict[str, Any]:
+        """A cached completion; serving it used no tokens or model time."""
+        logger.info(f"Serving {cached.get('model')} completion from response cache")
+        return {
+            **cached,
+            "tokens_used": 0,
+            "prompt_eval_count": 0,
+            "completion_tokens": 0,
+            "prompt_eval_duration_ms": 0.0,
+            "eval_duration_ms": 0.0,
+            "load_duration_ms": 0.0,
+            "total_duration_ms": 0.0,
+            "context_reused": False,
+            "cached": True,
+        }
+    
+    def _admit(self, endpoint: str, model: str, background: bool = False):
+        """Generation slot for this endpoint and model, or a no-op without admission control."""
+        if self.admission is None:
+            return nullcontext()
+        if background:
+            return self.admission.background_slot(endpoint, model)
+        return self.admission.slot(endpoint, model)
+    
+    def _build_request(
+        self,
+        base_url: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        stream: bool,
+        conversation_id: Optional[str] = None,
+        context_window: Optional[int] = None
+    ) -> Tuple[str, Dict[str, Any], bool]:
+        """
+        Build the endpoint URL and request body for the configured API mode.
+        
+        ``context_window`` is sent as ``num_ctx`` so Ollama loads the model
+        with the window the prompt was budgeted for; otherwise a model whose
+        default context is smaller silently drops the start of the prompt
+        (system prompt, memories and summary).
+        
+        Returns:
+            ``(url, payload, context_reused)``
+        """
+        payload = {
+            "model": model,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+            },
+        }
+        if context_window:
+            payload["options"]["num_ctx"] = context_window
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        
+        if self.api_mode == "chat":
+            payload["messages"] = [
+                {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+                for msg in messages
+            ]
+            return f"{base_url}/api/chat", payload, False
+        
+        # Generate mode: continue from the stored context when this turn only
+        # appends to the messages that produced it
+        context_reused = False
+        entry = self._contexts.get(conversation_id) if conversation_id else None
+        if entry is not None:
+            prefix_count, prefix_digest, context = entry
+            if len(messages) > prefix_count and self._digest(messages[:prefix_count]) == prefix_digest:
+                payload["prompt"] = "\n\n" + self._messages_to_prompt(messages[prefix_count:])
+                payload["context"] = context
+                self._contexts.move_to_end(conversation_id)
+                context_reused = True
+        
+        if not context_reused:
+            payload["prompt"] = self._messages_to_prompt(messages)
+        
+        return f"{base_url}/api/generate", payload, context_reused
+    
+    def _extract_content(self, data: Dict[str, Any]) -> str:
+        """Pull generated text out of a /api/chat or /api/generate frame."""
+        if self.api_mode == "chat":
+            return (data.get('message') or {}).get('content', '')
+        return data.get('response', '')
+    
+    def _remember_context(
+        self,
+        conversation_id: Optional[str],
+        messages: List[Dict[str, str]],
+        reply: str,
+        data: Dict[str, Any]
+    ) -> None:
+        """Store the returned generate-mode context for the conversation's next turn."""
+        if not conversation_id or not data.get('context'):
+            return
+        
+        prefix = list(messages) + [{"role": "assistant", "content": reply}]
+        self._contexts[conversation_id] = (len(prefix), self._digest(prefix), data['context'])
+        self._contexts.move_to_end(conversation_id)
+        while len(self._contexts) > self.context_cache_size:
+            self._contexts.popitem(last=False)
+    
+    @staticmethod
+    def _digest(messages: List[Dict[str, str]]) -> str:
+        canonical = json.dumps(
+            [[msg.get("role", "user"), msg.get("content", "")] for msg in messages],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def _usage(
+        self,
+        lease: EndpointLease,
+        model: str,
+        data: Dict[str, Any],
+        context_reused: bool,
+        first_token: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Token counts and timings from Ollama's final frame.
+        
+        ``tokens_used`` is prompt plus completion tokens; Ollama's nanosecond
+        durations are converted to milliseconds. Also records time to first
+        token (measured for streams, otherwise Ollama's model load plus prompt
+        evaluation time) and tokens per second.
+        """
+        prompt_tokens = data.get('prompt_eval_count') or 0
+        completion_tokens = data.get('eval_count') or 0
+        usage = {
+            "tokens_used": prompt_tokens + completion_tokens,
+            "prompt_eval_count": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "prompt_eval_duration_ms": (data.get('prompt_eval_duration') or 0) / 1_000_000,
+            "eval_duration_ms": (data.get('eval_duration') or 0) / 1_000_000,
+            "load_duration_ms": (data.get('load_duration') or 0) / 1_000_000,
+            "total_duration_ms": (data.get('total_duration') or 0) / 1_000_000,
+            "context_reused": context_reused,
+        }
+        # Ollama's own split of the request into prompt evaluation and generation
+        record('ollama.prompt_eval', usage["prompt_eval_duration_ms"])
+        record('ollama.generation', usage["eval_duration_ms"])
+        
+        if first_token is None:
+            first_token = (usage["load_duration_ms"] + usage["prompt_eval_duration_ms"]) / 1000
+        TIME_TO_FIRST_TOKEN.observe(first_token, model=model)
+        if usage["eval_duration_ms"]:
+            TOKENS_PER_SECOND.observe(completion_tokens / (usage["eval_duration_ms"] / 1000), model=model)
+        self.balancer.record_prompt_eval(lease, usage["prompt_eval_count"])
+        logger.info(
+            f"Ollama {self.api_mode} {model} @ {lease.endpoint.url}: "
+            f"prompt_eval_count={usage['prompt_eval_count']} "
+            f"prompt_eval_duration={usage['prompt_eval_duration_ms']:.1f}ms "
+            f"context_reused={context_reused} prefix_hit={lease.prefix_hit}"
+        )
+        return usage
+    
     def _messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
         """Convert messages array to a single prompt string."""
         prompt_parts = []
@@ -107,44 +681,69 @@ class OllamaClient:
         return "\n\n".join(prompt_parts)
     
     async def list_models(self) -> List[str]:
-        """List available Ollama models."""
-        try:
-            url = f"{self.base_url}/api/tags"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
+        """List models available on any of the client's Ollama endpoints."""
+        models: List[str] = []
+        for endpoint in self.balancer.endpoints:
+            try:
+                url = f"{endpoint.url}/api/tags"
+                async with self.session_pool.request('GET', url) as response:
                     if response.status != 200:
                         raise Exception(f"Failed to list models: {response.status}")
                     
                     data = await response.json()
-                    models = [model['name'] for model in data.get('models', [])]
-                    logger.info(f"Available Ollama models: {models}")
-                    return models
-                
-        except Exception as e:
-            logger.error(f"Error listing Ollama models: {str(e)}", exc_info=True)
-            return []
+                    for model in data.get('models', []):
+                        if model['name'] not in models:
+                            models.append(model['name'])
+                    
+            except Exception as e:
+                logger.error(f"Error listing Ollama models on {endpoint.url}: {str(e)}", exc_info=True)
+        
+        logger.info(f"Available Ollama models: {models}")
+        return models
     
     async def pull_model(self, model: str) -> bool:
-        """Pull a model from Ollama registry."""
-        try:
-            url = f"{self.base_url}/api/pull"
-            payload = {"name": model}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
+        """Pull a model from Ollama registry onto every endpoint."""
+        pulled = True
+        for endpoint in self.balancer.endpoints:
+            try:
+                url = f"{endpoint.url}/api/pull"
+                payload = {"name": model}
+                
+                async with self.session_pool.request('POST', url, json=payload) as response:
                     if response.status != 200:
                         raise Exception(f"Failed to pull model: {response.status}")
                     
-                    logger.info(f"Successfully pulled model: {model}")
-                    return True
-                
-        except Exception as e:
-            logger.error(f"Error pulling Ollama model: {str(e)}", exc_info=True)
-            return False
+                    logger.info(f"Successfully pulled model {model} on {endpoint.url}")
+                    
+            except Exception as e:
+                logger.error(f"Error pulling Ollama model on {endpoint.url}: {str(e)}", exc_info=True)
+                pulled = False
+        
+        return pulled
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for this client's transport."""
+        return self.session_pool.stats()
+    
+    def admission_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, wait times and rejections per endpoint/model."""
+        return self.admission.stats() if self.admission else {}
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache hit/miss counters."""
+        return self.response_cache.stats() if self.response_cache else {}
+    
+    def single_flight_stats(self) -> Dict[str, Any]:
+        """Generations started versus requests that joined one already running."""
+        return self.single_flight.stats()
+    
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        """Health, load, advertised models and prefix cache hit rate per endpoint."""
+        return self.balancer.stats()
     
     async def close(self):
-        """Close method for compatibility (no-op since we don't maintain a session)."""
-        pass
+        """Close the pooled sessions used by this client."""
+        await self.session_pool.close()
 
 
 class LLMFactory:
@@ -164,6 +763,16 @@ class LLMFactory:
         """
         if provider.lower() == 'ollama':
             base_url = kwargs.get('base_url', 'http://localhost:11434')
-            return OllamaClient(base_url=base_url)
+            return OllamaClient(
+                base_url=base_url,
+                session_pool=kwargs.get('session_pool'),
+                api_mode=kwargs.get('api_mode', 'chat'),
+                keep_alive=kwargs.get('keep_alive'),
+                context_cache_size=kwargs.get('context_cache_size', 1024),
+                admission=kwargs.get('admission'),
+                balancer=kwargs.get('balancer'),
+                response_cache=kwargs.get('response_cache'),
+                single_flight=kwargs.get('single_flight')
+            )
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
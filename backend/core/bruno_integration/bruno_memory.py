@@ -1,25 +1,369 @@
 """
 Bruno Memory - Conversation memory management
 """
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from enum import Enum
+import base64
 import logging
+import random
+import threading
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Per-message usage kept in message metadata and on the Message model
+USAGE_FIELDS = (
+    "tokens_used",
+    "prompt_tokens",
+    "completion_tokens",
+    "prompt_eval_duration_ms",
+    "eval_duration_ms",
+    "load_duration_ms",
+    "total_duration_ms",
+)
+
+
+class Role(str, Enum):
+    """Message roles; one shared instance per role instead of a string per message."""
+    SYSTEM = "system"
+    USER = "user"
+    ASSISTANT = "assistant"
+
+
+_ROLES = {role.value: role for role in Role}
+
+
+class HistoryMessage:
+    """
+    One message of conversation history.
+    
+    Kept compact because the history cache holds many of them: slots
+    instead of a dict per message, a shared ``Role``, the creation time as a
+    datetime (``timestamp`` formats it only when asked for) and usage as one
+    tuple in ``USAGE_FIELDS`` order, or None when nothing was reported.
+    """
+    __slots__ = ("role", "content", "created_at", "model", "usage")
+    
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        created_at: Optional[datetime] = None,
+        model: str = "",
+        usage: Optional[Tuple[Any, ...]] = None
+    ):
+        self.role = _ROLES.get(role) or Role(role)
+        self.content = content
+        self.created_at = created_at
+        self.model = model
+        self.usage = usage if usage and any(value is not None for value in usage) else None
+    
+    @classmethod
+    def from_metadata(cls, role: str, content: str, created_at: datetime, metadata: Dict[str, Any]) -> "HistoryMessage":
+        """Build a record from the metadata dict taken by ``MemoryManager.add_message``."""
+        return cls(
+            role,
+            content,
+            created_at,
+            metadata.get("model", ""),
+            tuple(metadata.get(field) for field in USAGE_FIELDS)
+        )
+    
+    @property
+    def timestamp(self) -> Optional[str]:
+        return self.created_at.isoformat() if self.created_at else None
+    
+    def usage_value(self, field: str) -> Any:
+        """One of ``USAGE_FIELDS``, or None when not reported."""
+        if self.usage is None:
+            return None
+        return self.usage[USAGE_FIELDS.index(field)]
+    
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        usage = self.usage or (None,) * len(USAGE_FIELDS)
+        return {"model": self.model, **dict(zip(USAGE_FIELDS, usage))}
+    
+    def to_prompt(self) -> Dict[str, str]:
+        """The message as sent to the LLM."""
+        # ``_value_`` is the plain attribute behind the much slower ``value`` property
+        return {"role": self.role._value_, "content": self.content}
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """The message in the dict format used before records (role, content, timestamp, metadata)."""
+        return {
+            "role": self.role.value,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "metadata": self.metadata,
+        }
+    
+    def __eq__(self, other):
+        if not isinstance(other, HistoryMessage):
+            return NotImplemented
+        return (
+            self.role is other.role
+            and self.content == other.content
+            and self.created_at == other.created_at
+            and self.model == other.model
+            and self.usage == other.usage
+        )
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"HistoryMessage({self.role.value}, {self.content[:30]!r}, {self.timestamp})"
+
+
+def encode_cursor(created_at: datetime, message_id: Any) -> str:
+    """Opaque keyset cursor for the position of a message: its creation time and ID."""
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    Position encoded by ``encode_cursor``.
+    
+    Raises:
+        ValueError: If the cursor was not made by ``encode_cursor``
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, message_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_filter(before: Optional[Tuple] = None, after: Optional[Tuple] = None):
+    """
+    Q object selecting messages strictly between two (created_at, id) positions.
+    
+    The ID breaks ties between messages created in the same instant, so a
+    page boundary never skips or repeats one.
+    """
+    from django.db.models import Q
+    
+    condition = Q()
+    if before:
+        created_at, message_id = before
+        condition &= Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+    if after:
+        created_at, message_id = after
+        condition &= Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+    return condition
+
+
+class SharedVersions:
+    """
+    Per-conversation write counters in a Django cache shared by every worker.
+    
+    A worker's cached history is current while the counter still has the
+    value it had when the history was cached. Counters start at a random
+    value, so one lost to cache eviction cannot come back at a value a stale
+    entry remembers.
+    """
+    
+    def __init__(self, alias: str = 'default', key_prefix: str = 'bruno:history:'):
+        """
+        Args:
+            alias: Name of the cache in settings.CACHES
+            key_prefix: Prefix added to every cache key
+        """
+        self.alias = alias
+        self.key_prefix = key_prefix
+    
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+    
+    async def get(self, conversation_id: str) -> int:
+        key = self.key_prefix + conversation_id
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, random.getrandbits(48), timeout=None)
+            version = await self.cache.aget(key)
+        return version
+    
+    def bump(self, conversation_id: str) -> int:
+        """Advance the counter after a write; returns the new value. Runs in the writing thread."""
+        key = self.key_prefix + conversation_id
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # No counter yet (or it was evicted)
+            self.cache.add(key, random.getrandbits(48), timeout=None)
+            return self.cache.incr(key)
+
+
+class _CachedHistory:
+    __slots__ = ("messages", "version", "filling", "stale")
+    
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+        self.version = None
+        self.filling = True
+        self.stale = False
+
+
+class HistoryCache:
+    """
+    Recent messages of the most active conversations, so history reads can skip the database.
+    
+    Each conversation holds a ring buffer of its newest ``max_messages``
+    messages; conversations are evicted least recently used first beyond
+    ``max_conversations``. Buffers are filled from the database on a miss
+    and kept current by ``append`` as messages are saved. With
+    ``SharedVersions``, a write in one worker invalidates every other
+    worker's copy of that conversation; without it the cache is only
+    correct in a single-process deployment.
+    """
+    
+    def __init__(
+        self,
+        max_conversations: int = 1000,
+        max_messages: int = 50,
+        versions: Optional[SharedVersions] = None
+    ):
+        """
+        Args:
+            max_conversations: Conversations kept before LRU eviction
+            max_messages: Newest messages kept per conversation; longer reads go to the database
+            versions: Optional write counters shared between processes
+        """
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.versions = versions
+        
+        self._entries: "OrderedDict[str, _CachedHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+    
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+    
+    async def lookup(self, conversation_id: str, limit: Optional[int]) -> Tuple[Optional[List[HistoryMessage]], Any]:
+        """
+        Newest ``limit`` messages from the cache.
+        
+        Returns:
+            ``(messages, token)``; on a miss messages is None, and the caller
+            reads the newest ``max_messages`` from the database and hands
+            them to ``fill`` with the token
+        """
+        if not limit or limit > self.max_messages:
+            self._incr("bypassed")
+            return None, None
+        
+        version = await self.versions.get(conversation_id) if self.versions else None
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and not entry.filling and entry.version == version:
+                self._entries.move_to_end(conversation_id)
+                self._stats["hits"] += 1
+                return list(entry.messages)[-limit:], None
+            
+            # Claim the slot, so writes made while the caller reads the database are noticed
+            entry = _CachedHistory(self.max_messages)
+            entry.version = version
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            self._stats["misses"] += 1
+            self._evict()
+            return None, entry
+    
+    def fill(self, conversation_id: str, messages: List[HistoryMessage], token: Any) -> None:
+        """Cache the newest messages read from the database after a ``lookup`` miss."""
+        if token is None:
+            return
+        with self._lock:
+            if self._entries.get(conversation_id) is not token:
+                # Evicted or replaced while the database was read
+                return
+            if token.stale:
+                del self._entries[conversation_id]
+                return
+            token.messages.extend(messages)
+            token.filling = False
+    
+    def append(self, conversation_id: str, message: HistoryMessage) -> None:
+        """Add a message just saved to the database to its conversation's buffer."""
+        version = self.versions.bump(conversation_id) if self.versions else None
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if entry.filling:
+                entry.stale = True
+            elif self.versions and entry.version != version - 1:
+                # Another worker wrote in between; the next read refills
+                del self._entries[conversation_id]
+                self._stats["invalidations"] += 1
+            else:
+                entry.messages.append(message)
+                entry.version = version
+    
+    def invalidate(self, conversation_id: str) -> None:
+        """Forget a conversation everywhere, after messages were changed or deleted."""
+        if self.versions:
+            self.versions.bump(conversation_id)
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if entry.filling:
+                entry.stale = True
+            else:
+                del self._entries[conversation_id]
+            self._stats["invalidations"] += 1
+    
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["conversations"] = len(self._entries)
+            stats["messages"] = sum(len(entry.messages) for entry in self._entries.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
 
 class MemoryManager:
     """Manages conversation history and context."""
     
-    def __init__(self, db_backend=None):
+    def __init__(self, db_backend=None, history_cache: Optional[HistoryCache] = None):
         """
         Initialize memory manager.
         
         Args:
             db_backend: Database backend for persistent storage (optional)
+            history_cache: Cache of recent messages in front of the database
+                backend (optional); the backend must keep it current, see
+                ``DjangoMemoryBackend.track_writes``
         """
         self.db_backend = db_backend
-        self.in_memory_cache: Dict[str, List[Dict]] = {}
+        self.history_cache = history_cache if db_backend else None
+        # Message store when there is no database backend
+        self.in_memory_cache: Dict[str, List[HistoryMessage]] = {}
         logger.info("Initialized MemoryManager")
     
     async def add_message(
@@ -38,21 +382,13 @@ class MemoryManager:
             content: Message content
             metadata: Additional metadata (tokens, model, etc.)
         """
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat(),
-            "metadata": metadata or {}
-        }
-        
-        # Add to in-memory cache
-        if conversation_id not in self.in_memory_cache:
-            self.in_memory_cache[conversation_id] = []
-        self.in_memory_cache[conversation_id].append(message)
+        message = HistoryMessage.from_metadata(role, content, datetime.now(timezone.utc), metadata or {})
         
-        # Persist to database if backend is available
+        # Persist to database if backend is available, otherwise keep it here
         if self.db_backend:
             await self.db_backend.save_message(conversation_id, message)
+        else:
+            self.in_memory_cache.setdefault(conversation_id, []).append(message)
         
         logger.debug(f"Added message to conversation {conversation_id}: {role}")
     
@@ -60,17 +396,30 @@ class MemoryManager:
         self,
         conversation_id: str,
         limit: Optional[int] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[HistoryMessage]:
         """
         Retrieve conversation history.
         
         Args:
             conversation_id: ID of the conversation
             limit: Maximum number of messages to return (most recent)
-            
+        
         Returns:
-            List of message dicts
+            Messages, oldest first; shared with the history cache, so callers
+            must not modify them
         """
+        cache = self.history_cache
+        if cache:
+            messages, token = await cache.lookup(conversation_id, limit)
+            if messages is not None:
+                return messages
+            if token is not None:
+                # Read a full buffer, so later reads of any size up to it hit
+                recent = await self.db_backend.get_messages(conversation_id, cache.max_messages)
+                if recent:
+                    cache.fill(conversation_id, recent, token)
+                return recent[-limit:]
+        
         # Try to get from database first
         if self.db_backend:
             messages = await self.db_backend.get_messages(conversation_id, limit)
@@ -97,22 +446,30 @@ class MemoryManager:
         logger.info(f"Cleared conversation {conversation_id}")
     
     async def get_summary(self, conversation_id: str) -> Dict[str, Any]:
-        """Get conversation summary statistics."""
-        messages = await self.get_history(conversation_id)
+        """
+        Get conversation summary statistics.
         
-        user_messages = [m for m in messages if m["role"] == "user"]
-        assistant_messages = [m for m in messages if m["role"] == "assistant"]
+        Counts are aggregated in the database when a backend is configured,
+        so long conversations are not loaded to be summed.
+        """
+        if self.db_backend:
+            summary = await self.db_backend.get_usage(conversation_id)
+            if summary and summary["total_messages"]:
+                return {**summary, "conversation_id": conversation_id}
         
-        total_tokens = sum(
-            m.get("metadata", {}).get("tokens_used", 0)
-            for m in messages
-        )
+        messages = self.in_memory_cache.get(conversation_id, [])
+        
+        def total(key: str) -> int:
+            # Replies without reported usage store None
+            return sum(m.usage_value(key) or 0 for m in messages)
         
         return {
             "total_messages": len(messages),
-            "user_messages": len(user_messages),
-            "assistant_messages": len(assistant_messages),
-            "total_tokens": total_tokens,
+            "user_messages": sum(1 for m in messages if m.role is Role.USER),
+            "assistant_messages": sum(1 for m in messages if m.role is Role.ASSISTANT),
+            "prompt_tokens": total("prompt_tokens"),
+            "completion_tokens": total("completion_tokens"),
+            "total_tokens": total("tokens_used"),
             "conversation_id": conversation_id
         }
 
@@ -131,10 +488,50 @@ class DjangoMemoryBackend:
         self.message_model = message_model
         self.conversation_model = conversation_model
     
+    # Message columns read for history, in HistoryMessage argument order
+    HISTORY_COLUMNS = ('role', 'content', 'created_at', 'model') + USAGE_FIELDS
+    
+    @staticmethod
+    def message_record(msg) -> HistoryMessage:
+        """A Message instance as a history record."""
+        return HistoryMessage(
+            msg.role,
+            msg.content,
+            msg.created_at,
+            msg.model,
+            tuple(getattr(msg, field) for field in USAGE_FIELDS)
+        )
+    
+    def track_writes(self, history_cache: HistoryCache) -> None:
+        """
+        Keep a history cache current with every saved or deleted message.
+        
+        Uses model signals, so messages written by any code path (views,
+        WebSocket consumer, admin, cascades) reach the cache, once their
+        transaction commits. Bulk operations that skip signals do not.
+        """
+        from django.db import transaction
+        from django.db.models.signals import post_delete, post_save
+        
+        def saved(sender, instance, created, **kwargs):
+            conversation_id = str(instance.conversation_id)
+            if created:
+                message = self.message_record(instance)
+                transaction.on_commit(lambda: history_cache.append(conversation_id, message))
+            else:
+                transaction.on_commit(lambda: history_cache.invalidate(conversation_id))
+        
+        def deleted(sender, instance, **kwargs):
+            conversation_id = str(instance.conversation_id)
+            transaction.on_commit(lambda: history_cache.invalidate(conversation_id))
+        
+        post_save.connect(saved, sender=self.message_model, weak=False, dispatch_uid='bruno_history_cache_saved')
+        post_delete.connect(deleted, sender=self.message_model, weak=False, dispatch_uid='bruno_history_cache_deleted')
+    
     async def save_message(
         self,
         conversation_id: str,
-        message: Dict[str, Any]
+        message: HistoryMessage
     ) -> None:
         """Save message to Django database."""
         try:
@@ -145,10 +542,10 @@ class DjangoMemoryBackend:
                 conversation = self.conversation_model.objects.get(id=conversation_id)
                 self.message_model.objects.create(
                     conversation=conversation,
-                    role=message["role"],
-                    content=message["content"],
-                    model=message.get("metadata", {}).get("model", ""),
-                    tokens_used=message.get("metadata", {}).get("tokens_used")
+                    role=message.role.value,
+                    content=message.content,
+                    model=message.model,
+                    **{field: message.usage_value(field) for field in USAGE_FIELDS}
                 )
             
             await _save()
@@ -159,43 +556,48 @@ class DjangoMemoryBackend:
         self,
         conversation_id: str,
         limit: Optional[int] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[HistoryMessage]:
         """Retrieve messages from Django database."""
         try:
-            from asgiref.sync import sync_to_async
+            # Plain rows straight into records, without building model instances
+            queryset = self.message_model.objects.filter(
+                conversation_id=conversation_id
+            ).order_by('created_at').values_list(*self.HISTORY_COLUMNS)
             
-            @sync_to_async
-            def _get():
-                queryset = self.message_model.objects.filter(
-                    conversation_id=conversation_id
-                ).order_by('created_at')
-                
-                if limit:
-                    # Get the last N messages
-                    queryset = queryset.reverse()[:limit]
-                    messages = list(queryset)
-                    messages.reverse()
-                else:
-                    messages = list(queryset)
-                
-                return [
-                    {
-                        "role": msg.role,
-                        "content": msg.content,
-                        "timestamp": msg.created_at.isoformat(),
-                        "metadata": {
-                            "model": msg.model,
-                            "tokens_used": msg.tokens_used
-                        }
-                    }
-                    for msg in messages
-                ]
+            if limit:
+                # Get the last N messages
+                rows = [row async for row in queryset.reverse()[:limit]]
+                rows.reverse()
+            else:
+                rows = [row async for row in queryset]
             
-            return await _get()
+            # Columns are role, content, created_at and model, then usage
+            return [HistoryMessage(*row[:4], row[4:]) for row in rows]
         except Exception as e:
             logger.error(f"Error getting messages from database: {str(e)}", exc_info=True)
             return []
     
+    async def get_usage(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Message counts and token totals for a conversation, in one query."""
+        try:
+            from django.db.models import Count, Q, Sum
+            
+            totals = await self.message_model.objects.filter(
+                conversation_id=conversation_id
+            ).aaggregate(
+                total_messages=Count('id'),
+                user_messages=Count('id', filter=Q(role='user')),
+                assistant_messages=Count('id', filter=Q(role='assistant')),
+                prompt_tokens=Sum('prompt_tokens'),
+                completion_tokens=Sum('completion_tokens'),
+                total_tokens=Sum('tokens_used')
+            )
+            # Sums over no usage come back as None
+            return {key: value or 0 for key, value in totals.items()}
+        except Exception as e:
+            logger.error(f"Error aggregating conversation usage: {str(e)}", exc_info=True)
+            return None
+    
     async def clear_conversation(self, conversation_id: str) -> None:
         """Clear all messages for a conversation."""
         try:
@@ -203,9 +605,16 @@ class DjangoMemoryBackend:
             
             @sync_to_async
             def _clear():
-                self.message_model.objects.filter(
-                    conversation_id=conversation_id
-                ).delete()
+                from django.db import transaction
+                
+                with transaction.atomic():
+                    self.message_model.objects.filter(
+                        conversation_id=conversation_id
+                    ).delete()
+                    # A queryset delete skips Message.delete, which keeps the counters
+                    self.conversation_model.objects.filter(id=conversation_id).update(
+                        **self.conversation_model.empty_message_stats()
+                    )
             
             await _clear()
         except Exception as e:
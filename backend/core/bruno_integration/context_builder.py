@@ -0,0 +1,239 @@
+"""
+Bruno Context Builder - Fits prompt sections into a token budget
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
+import logging
+import re
+
+from .bruno_memory import HistoryMessage
+
+logger = logging.getLogger(__name__)
+
+# Word runs and single punctuation marks, roughly how BPE tokenizers split text
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate a BPE token count without loading a tokenizer.
+    
+    Each punctuation mark is a token and word runs cost one token per four
+    characters, which tracks llama-family tokenizers closely enough for
+    budgeting English text and errs high on code and long identifiers.
+    """
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECES.findall(text))
+
+
+class TokenCounter:
+    """Counts tokens with a memoized tokenizer, so history is not re-tokenized every turn."""
+    
+    # Chat templates add role markers and separators around every message
+    MESSAGE_OVERHEAD = 4
+    
+    def __init__(self, tokenize: Optional[Callable[[str], int]] = None, cache_size: int = 8192):
+        """
+        Args:
+            tokenize: Function returning the token count of a string
+                (defaults to ``estimate_tokens``)
+            cache_size: Distinct strings whose counts are memoized
+        """
+        self._count = lru_cache(maxsize=cache_size)(tokenize or estimate_tokens)
+    
+    def count(self, text: str) -> int:
+        return self._count(text)
+    
+    def count_message(self, message: Dict[str, str]) -> int:
+        return self._count(message.get("content", "")) + self.MESSAGE_OVERHEAD
+    
+    def count_record(self, message: HistoryMessage) -> int:
+        return self._count(message.content) + self.MESSAGE_OVERHEAD
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to fit max_tokens, keeping the beginning."""
+        if self.count(text) <= max_tokens:
+            return text
+        marker = "\n[...truncated]"
+        # Candidate prefixes are one-offs, so count them without filling the cache
+        count = self._count.__wrapped__
+        low, high = 0, len(text)
+        # Binary search on character length for the longest prefix that fits
+        while low < high:
+            mid = (low + high + 1) // 2
+            if count(text[:mid] + marker) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + marker
+    
+    def cache_info(self):
+        return self._count.cache_info()
+
+
+class ContextBuilder:
+    """
+    Assembles the message list for a turn within the model's context window.
+    
+    The prompt budget is the model's window minus the tokens reserved for the
+    reply (``AgentConfig.max_tokens``). Sections are filled in priority order:
+    
+    1. the system prompt, always included
+    2. the current user message, truncated only if it alone exceeds the budget
+    3. long-term memories, most important first, up to ``memory_share`` of the budget
+    4. the rolling summary of older turns, truncated to what is left
+    5. recent history, newest first, with whatever is left
+    
+    History is kept contiguous: once a message does not fit, older ones are
+    dropped as well.
+    """
+    
+    def __init__(
+        self,
+        token_counter: Optional[TokenCounter] = None,
+        memory_share: float = 0.25,
+        min_prompt_tokens: int = 256,
+        history_candidates: int = 50,
+        memory_candidates: int = 10,
+        stage_timeout: float = 2.0
+    ):
+        """
+        Args:
+            token_counter: Tokenizer used for every section
+            memory_share: Largest fraction of the budget memories may take
+            min_prompt_tokens: Floor for the prompt budget when max_tokens
+                leaves little of the window
+            history_candidates: Most recent messages fetched for the history section
+            memory_candidates: Highest priority memories fetched for the memory section
+            stage_timeout: Seconds each context-gathering stage may take before
+                the turn goes ahead without it
+        """
+        self.token_counter = token_counter or TokenCounter()
+        self.memory_share = memory_share
+        self.min_prompt_tokens = min_prompt_tokens
+        self.history_candidates = history_candidates
+        self.memory_candidates = memory_candidates
+        self.stage_timeout = stage_timeout
+    
+    def budget(self, context_window: int, max_tokens: int) -> int:
+        """Prompt tokens available once the reply's max_tokens is reserved."""
+        return max(self.min_prompt_tokens, context_window - max_tokens)
+    
+    def build(
+        self,
+        budget: int,
+        system_prompt: str,
+        user_message: str,
+        history: List[HistoryMessage],
+        memories: Optional[List[Dict[str, Any]]] = None,
+        format_memories: Optional[Callable[[List[Dict[str, Any]]], str]] = None,
+        summary: str = "",
+        summarized: Optional[List[HistoryMessage]] = None
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Build the LLM messages for a turn.
+        
+        Args:
+            budget: Prompt tokens available (see ``budget``)
+            system_prompt: The agent's system prompt
+            user_message: The current user message
+            history: Candidate history messages, oldest first
+            memories: Candidate memories in priority order
+            format_memories: Renders a list of memories as one system message
+            summary: Rolling summary of the turns before ``history``
+            summarized: Candidate messages the summary stands in for, oldest
+                first; only used to report the tokens the summary saved
+        
+        Returns:
+            ``(messages, report)`` where report holds the tokens used per section
+        """
+        counter = self.token_counter
+        system = {"role": "system", "content": system_prompt}
+        system_tokens = counter.count_message(system)
+        
+        # The current message must fit alongside the system prompt
+        current_budget = max(0, budget - system_tokens - TokenCounter.MESSAGE_OVERHEAD)
+        current_content = counter.truncate(user_message, current_budget)
+        current = {"role": "user", "content": current_content}
+        current_tokens = counter.count_message(current)
+        remaining = budget - system_tokens - current_tokens
+        
+        memory_message, memory_tokens, memories_used = self._fit_memories(
+            memories or [], format_memories, min(remaining, int(budget * self.memory_share))
+        )
+        remaining -= memory_tokens
+        
+        summary_message = None
+        summary_tokens = 0
+        summary_budget = remaining - TokenCounter.MESSAGE_OVERHEAD
+        if summary and summary_budget > 0:
+            summary_message = {
+                "role": "system",
+                "content": counter.truncate(f"{SUMMARY_HEADER}\n{summary}", summary_budget)
+            }
+            summary_tokens = counter.count_message(summary_message)
+        
+        included: List[HistoryMessage] = []
+        history_tokens = 0
+        for msg in reversed(history):
+            tokens = counter.count_record(msg)
+            if tokens > remaining - summary_tokens - history_tokens:
+                break
+            included.append(msg)
+            history_tokens += tokens
+        included.reverse()
+        
+        # What the summarized turns would have cost sent raw in the summary's place
+        replaced_tokens = 0
+        if summary_message and len(included) == len(history):
+            for msg in reversed(summarized or []):
+                tokens = counter.count_record(msg)
+                if tokens > remaining - history_tokens - replaced_tokens:
+                    break
+                replaced_tokens += tokens
+        
+        messages = [system]
+        if memory_message:
+            messages.append(memory_message)
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend(msg.to_prompt() for msg in included)
+        messages.append(current)
+        
+        report = {
+            "budget": budget,
+            "system": system_tokens,
+            "memories": memory_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+            "current": current_tokens,
+            "total": system_tokens + memory_tokens + summary_tokens + history_tokens + current_tokens,
+            # Negative when the summary costs more than the turns it replaced
+            "summary_saved": replaced_tokens - summary_tokens if summary_message else 0,
+            "memories_included": memories_used,
+            "memories_dropped": len(memories or []) - memories_used,
+            "history_included": len(included),
+            "history_dropped": len(history) - len(included),
+            "current_truncated": current_content != user_message,
+        }
+        return messages, report
+    
+    def _fit_memories(
+        self,
+        memories: List[Dict[str, Any]],
+        format_memories: Optional[Callable[[List[Dict[str, Any]]], str]],
+        budget: int
+    ) -> Tuple[Optional[Dict[str, str]], int, int]:
+        """Largest priority prefix of memories whose rendering fits the budget."""
+        if not memories or format_memories is None or budget <= 0:
+            return None, 0, 0
+        
+        best: Tuple[Optional[Dict[str, str]], int, int] = (None, 0, 0)
+        for count in range(1, len(memories) + 1):
+            message = {"role": "system", "content": format_memories(memories[:count])}
+            tokens = self.token_counter.count_message(message)
+            if tokens > budget:
+                break
+            best = (message, tokens, count)
+        return best
@@ -5,6 +5,10 @@ from typing import Dict, List, Optional, Any
 import logging
 import re
 from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils import timezone
+
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -134,7 +138,8 @@ class MemoryExtractor:
         
         # Save extracted memories
         if memories:
-            saved = await self.save_memories(user_id, memories, message_id)
+            with span('memory.save'):
+                saved = await self.save_memories(user_id, memories, message_id)
             logger.info(f"Extracted and saved {len(saved)} memories for user {user_id}")
             return saved
         
@@ -214,37 +219,34 @@ class MemoryExtractor:
         Returns:
             List of relevant memories
         """
-        @sync_to_async
-        def get():
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            user = User.objects.get(id=user_id)
-            
-            queryset = self.UserMemory.objects.filter(user=user)
+        # Native async queries, like the summarizer's, so no extra thread or connection per call
+        with span('memory.query'):
+            queryset = self.UserMemory.objects.filter(user_id=user_id)
             
             if memory_types:
                 queryset = queryset.filter(memory_type__in=memory_types)
             
             # Order by importance and recency
-            queryset = queryset.order_by('-importance', '-last_accessed')[:limit]
+            selected = [mem async for mem in queryset.order_by('-importance', '-last_accessed')[:limit]]
             
-            memories = []
-            for mem in queryset:
-                # Update access tracking
-                mem.access()
-                
-                memories.append({
-                    'id': str(mem.id),
-                    'key': mem.key,
-                    'value': mem.value,
-                    'type': mem.memory_type,
-                    'importance': mem.importance,
-                    'access_count': mem.access_count
-                })
-            
-            return memories
+            # Update access tracking in one statement rather than one save per memory
+            if selected:
+                await self.UserMemory.objects.filter(id__in=[mem.id for mem in selected]).aupdate(
+                    access_count=F('access_count') + 1,
+                    last_accessed=timezone.now()
+                )
         
-        return await get()
+        return [
+            {
+                'id': str(mem.id),
+                'key': mem.key,
+                'value': mem.value,
+                'type': mem.memory_type,
+                'importance': mem.importance,
+                'access_count': mem.access_count + 1
+            }
+            for mem in selected
+        ]
     
     async def format_memories_for_context(
         self,
@@ -262,7 +264,18 @@ class MemoryExtractor:
             Formatted string of memories
         """
         memories = await self.get_relevant_memories(user_id, limit=limit)
+        return self.format_memories(memories)
+    
+    def format_memories(self, memories: List[Dict[str, Any]]) -> str:
+        """
+        Format already retrieved memories as a context string for the LLM.
         
+        Args:
+            memories: Memories as returned by get_relevant_memories
+            
+        Returns:
+            Formatted string of memories ("" if there are none)
+        """
         if not memories:
             return ""
         
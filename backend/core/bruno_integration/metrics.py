@@ -0,0 +1,428 @@
+"""
+Bruno Metrics - Prometheus-style counters, gauges and histograms shared across workers
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import atexit
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Family:
+    """
+    One metric and its samples, keyed by label values.
+    
+    Counter and gauge samples are floats; histogram samples are
+    ``[per-bucket counts (last is +Inf), sum, count]``.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = ()
+    ):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.samples: Dict[LabelValues, Any] = {}
+    
+    def add(self, labels: LabelValues, value: Any) -> None:
+        """Merge a sample from another snapshot into this one (summing)."""
+        current = self.samples.get(labels)
+        if current is None:
+            self.samples[labels] = value
+        elif self.kind == "histogram":
+            self.samples[labels] = [
+                [a + b for a, b in zip(current[0], value[0])],
+                current[1] + value[1],
+                current[2] + value[2],
+            ]
+        else:
+            self.samples[labels] = current + value
+    
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "buckets": list(self.buckets),
+            "samples": [[list(labels), value] for labels, value in self.samples.items()],
+        }
+
+
+class _Metric:
+    """A metric owned by this process and updated in place."""
+    
+    kind = ""
+    
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.family = Family(name, self.kind, documentation, labelnames, getattr(self, "buckets", ()))
+    
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.family.labelnames)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    
+    kind = "counter"
+    
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self.registry.lock:
+            self.family.samples[key] = self.family.samples.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Point-in-time value; across workers only live processes are summed."""
+    
+    kind = "gauge"
+    
+    def set(self, value: float, **labels) -> None:
+        with self.registry.lock:
+            self.family.samples[self._key(labels)] = float(value)
+    
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self.registry.lock:
+            self.family.samples[key] = self.family.samples.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, documentation, labelnames)
+    
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.registry.lock:
+            sample = self.family.samples.get(key)
+            if sample is None:
+                sample = self.family.samples[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+
+class MetricsRegistry:
+    """
+    Metrics for this process, plus collectors that report other components' stats.
+    
+    Collectors are called at snapshot time and return ready-made families,
+    which keeps values such as queue depth or cache counters in the component
+    that owns them instead of mirroring every update here.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            existing = self._metrics.get(metric.family.name)
+            if existing is not None:
+                # Module reloads re-declare metrics; keep the original
+                return existing
+            self._metrics[metric.family.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+    
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self.lock:
+            self._collectors.append(collector)
+    
+    def snapshot(self) -> Dict[str, Family]:
+        """Copy of every metric and collector family in this process."""
+        families: Dict[str, Family] = {}
+        with self.lock:
+            for name, metric in self._metrics.items():
+                source = metric.family
+                family = Family(name, source.kind, source.documentation, source.labelnames, source.buckets)
+                if source.kind == "histogram":
+                    family.samples = {k: [list(v[0]), v[1], v[2]] for k, v in source.samples.items()}
+                else:
+                    family.samples = dict(source.samples)
+                families[name] = family
+            collectors = list(self._collectors)
+        
+        for collector in collectors:
+            try:
+                for family in collector():
+                    families[family.name] = family
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector!r} failed: {e}")
+        return families
+
+
+class MultiprocessStore:
+    """
+    Aggregates metrics across worker processes through a shared directory.
+    
+    Every worker periodically writes its snapshot to
+    ``<directory>/<pid>-<token>.json``, where the token is drawn when the
+    worker starts, so a restarted worker that gets a recycled pid never
+    overwrites the snapshot of the one that had it before. Reading merges all
+    files: counters and histograms are summed over every worker, including
+    those that have exited, so totals never go backwards; gauges are summed
+    over live workers only. Snapshots of exited workers are folded into
+    ``retired.json`` and removed, which keeps the directory from growing with
+    every restart.
+    """
+    
+    RETIRED = "retired.json"
+    
+    def __init__(self, directory: str, interval: float = 5.0):
+        """
+        Args:
+            directory: Directory shared by all workers of the deployment
+            interval: Seconds between snapshot writes from each worker
+        """
+        self.directory = directory
+        self.interval = interval
+        self._pid: Optional[int] = None
+        self._path: Optional[str] = None
+        self._started: Optional[str] = None
+        self._lock = threading.Lock()
+        self._registry: Optional[MetricsRegistry] = None
+    
+    def ensure_running(self, registry: MetricsRegistry) -> None:
+        """Start this process's writer thread (again after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._registry = registry
+            self._path = os.path.join(self.directory, f"{pid}-{uuid.uuid4().hex[:12]}.json")
+            self._started = _process_start(pid)
+            self._pid = pid
+            threading.Thread(target=self._run, name="bruno-metrics-writer", daemon=True).start()
+            atexit.register(self.write)
+    
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.interval)
+            self.write()
+    
+    def write(self) -> None:
+        """Write this process's current snapshot."""
+        # A forked child inherits the parent's path until ensure_running runs in it
+        if self._registry is None or self._pid != os.getpid():
+            return
+        payload = {
+            "pid": self._pid,
+            "start": self._started,
+            "written": time.time(),
+            "families": {name: family.to_json() for name, family in self._registry.snapshot().items()},
+        }
+        try:
+            self._dump(self._path, payload)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {self._path}: {e}")
+    
+    def collect(self) -> Dict[str, Family]:
+        """Merged families from every worker's latest snapshot."""
+        self.write()
+        self._retire_exited()
+        merged: Dict[str, Family] = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json"):
+                continue
+            payload = self._load(filename)
+            if payload is None:
+                continue
+            live = filename != self.RETIRED and _worker_alive(payload)
+            _merge(merged, payload["families"], gauges=live)
+        return merged
+    
+    def _retire_exited(self) -> None:
+        """Fold the counters and histograms of exited workers into the retired totals."""
+        try:
+            with open(os.path.join(self.directory, "retired.lock"), "w") as lock:
+                # Workers scrape concurrently; only one may fold a given snapshot
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                exited = []
+                for filename in sorted(os.listdir(self.directory)):
+                    if not filename.endswith(".json") or filename == self.RETIRED:
+                        continue
+                    payload = self._load(filename)
+                    if payload is not None and not _worker_alive(payload):
+                        exited.append((filename, payload))
+                if not exited:
+                    return
+                
+                retired = self._load(self.RETIRED) or {"families": {}, "folded": []}
+                # Folded last time but not removed, e.g. after a crash in between
+                folded = set(retired.get("folded", []))
+                merged: Dict[str, Family] = {}
+                _merge(merged, retired["families"], gauges=False)
+                for filename, payload in exited:
+                    if filename not in folded:
+                        _merge(merged, payload["families"], gauges=False)
+                
+                self._dump(os.path.join(self.directory, self.RETIRED), {
+                    "families": {name: family.to_json() for name, family in merged.items()},
+                    "folded": [filename for filename, _ in exited],
+                })
+                for filename, _ in exited:
+                    os.remove(os.path.join(self.directory, filename))
+        except OSError as e:
+            logger.warning(f"Could not retire exited workers' metrics in {self.directory}: {e}")
+    
+    def _load(self, filename: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.directory, filename)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Being replaced right now, truncated or already retired; the next scrape picks it up
+            return None
+    
+    @staticmethod
+    def _dump(path: str, payload: Dict[str, Any]) -> None:
+        """Replace the file atomically, so readers never see a partial snapshot."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+
+def _merge(merged: Dict[str, Family], families: Dict[str, Any], gauges: bool) -> None:
+    """Sum serialized families into ``merged``, skipping gauges unless ``gauges``."""
+    for name, data in families.items():
+        if data["kind"] == "gauge" and not gauges:
+            continue
+        family = merged.get(name)
+        if family is None:
+            family = merged[name] = Family(name, data["kind"], data["help"], data["labelnames"], data["buckets"])
+        for labels, value in data["samples"]:
+            family.add(tuple(labels), value)
+
+
+def _worker_alive(payload: Dict[str, Any]) -> bool:
+    """Whether the process that wrote a snapshot is still running (and not a recycled pid)."""
+    pid = payload["pid"]
+    if not _pid_alive(pid):
+        return False
+    started = payload.get("start")
+    current = _process_start(pid)
+    return started is None or current is None or started == current
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of a process in clock ticks since boot, where /proc provides it."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesized command name; starttime is field 22 of the line
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(families: Dict[str, Family]) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family.documentation}")
+        lines.append(f"# TYPE {name} {family.kind}")
+        for labels, value in sorted(family.samples.items()):
+            if family.kind != "histogram":
+                lines.append(f"{name}{_labels(family.labelnames, labels)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip([*family.buckets, math.inf], counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(family.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(family.labelnames, labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(family.labelnames, labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# Process-wide registry every component declares its metrics on
+registry = MetricsRegistry()
@@ -0,0 +1,184 @@
+"""
+Bruno Response Cache - Exact-match cache for LLM completions
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTier(ABC):
+    """Interface for a shared cache tier behind the in-process LRU."""
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored response for the key, or None."""
+    
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        """Store a response for ``ttl`` seconds."""
+
+
+class DjangoCacheTier(CacheTier):
+    """Shared tier backed by one of the project's Django cache aliases."""
+    
+    def __init__(self, alias: str = 'default', key_prefix: str = 'bruno:llm:'):
+        """
+        Args:
+            alias: Name of the cache in settings.CACHES
+            key_prefix: Prefix added to every cache key
+        """
+        self.alias = alias
+        self.key_prefix = key_prefix
+    
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.cache.aget(self.key_prefix + key)
+    
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        await self.cache.aset(self.key_prefix + key, value, timeout=ttl)
+
+
+class ResponseCache:
+    """
+    Exact-match cache of completions, keyed on model, sampling settings and messages.
+    
+    Only deterministic requests are cached: anything sampled with a
+    temperature above zero bypasses the cache, since a repeated prompt is
+    expected to produce a different reply. Entries live in a size-bounded,
+    TTL-expiring LRU in this process and, optionally, in a shared tier so
+    other workers can answer the same request.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 1024,
+        shared_tier: Optional[CacheTier] = None
+    ):
+        """
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Entries kept in the in-process tier before LRU eviction
+            shared_tier: Optional second tier shared between processes
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_tier = shared_tier
+        
+        # key -> (expires_at, response)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+    
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+    
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        messages: List[Dict[str, str]],
+        context_window: Optional[int] = None
+    ) -> str:
+        """Canonical hash of everything that determines the completion."""
+        canonical = json.dumps(
+            {
+                "model": model,
+                "temperature": float(temperature),
+                "max_tokens": int(max_tokens),
+                # A smaller window can truncate the prompt and change the reply
+                "num_ctx": int(context_window) if context_window else None,
+                "messages": [[msg.get("role", "user"), msg.get("content", "")] for msg in messages],
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def cacheable(self, temperature: float) -> bool:
+        """Whether a request sampled at this temperature may be served from cache."""
+        if temperature > 0:
+            self._incr("bypassed")
+            return False
+        return True
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look the key up in the local tier, then the shared tier."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry[1])
+                del self._entries[key]
+                self._stats["expired"] += 1
+        
+        if self.shared_tier is not None:
+            try:
+                value = await self.shared_tier.get(key)
+            except Exception as e:
+                logger.warning(f"Shared response cache lookup failed: {e}")
+                value = None
+            if value is not None:
+                self._store_local(key, value)
+                self._incr("shared_hits")
+                return dict(value)
+        
+        self._incr("misses")
+        return None
+    
+    async def set(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a completion in both tiers."""
+        self._store_local(key, response)
+        self._incr("stores")
+        if self.shared_tier is not None:
+            try:
+                await self.shared_tier.set(key, response, self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared response cache store failed: {e}")
+    
+    def _store_local(self, key: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def clear(self) -> None:
+        """Drop every entry in the in-process tier."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, current size and hit ratio."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,103 @@
+"""
+Bruno Single Flight - Coalesces concurrent identical work onto one task
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight call and the number of callers awaiting it."""
+    __slots__ = ('loop', 'task', 'waiters')
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        self.loop = loop
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers share its result.
+    
+    The work runs in its own task, so a caller that goes away (a client
+    disconnect cancels its request) does not take the shared call down with
+    it. The task is only cancelled once every caller awaiting it is gone.
+    Calls are only shared between callers on the same event loop, since the
+    task cannot be awaited from another one.
+    """
+    
+    def __init__(self, name: str = "single-flight"):
+        """
+        Args:
+            name: Label used in log messages
+        """
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0, "cancelled": 0}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await ``fn()``, or the identical call already running under ``key``.
+        
+        Args:
+            key: Identity of the work; equal keys must mean identical results
+            fn: Zero-argument coroutine function doing the work
+        
+        Returns:
+            The result of the shared call (the same object for every caller)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.loop is loop and not flight.task.done():
+                self._stats["coalesced"] += 1
+                logger.info(f"{self.name}: joining in-flight call ({flight.waiters} waiting)")
+            else:
+                flight = _Flight(loop, loop.create_task(fn()))
+                self._flights[key] = flight
+                self._stats["calls"] += 1
+                flight.task.add_done_callback(lambda task, f=flight: self._forget(key, f, task))
+            flight.waiters += 1
+        
+        try:
+            # Shielded so one caller's cancellation leaves the shared task running
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.waiters -= 1
+                abandon = flight.waiters == 0 and not flight.task.done()
+                if abandon:
+                    # Unlisted before cancelling so a newcomer starts a fresh call
+                    self._stats["cancelled"] += 1
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+            if abandon:
+                flight.task.cancel()
+            raise
+        except BaseException:
+            with self._lock:
+                flight.waiters -= 1
+            raise
+        with self._lock:
+            flight.waiters -= 1
+        return result
+    
+    def _forget(self, key: Hashable, flight: _Flight, task: asyncio.Task) -> None:
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller already left
+            task.exception()
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Calls started, callers that joined an existing call, and abandoned calls."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
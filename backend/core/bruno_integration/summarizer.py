@@ -0,0 +1,289 @@
+"""
+Bruno Summarizer - Folds older turns into a rolling conversation summary
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import logging
+import threading
+
+from .admission import AdmissionRejected
+from .bruno_memory import HistoryMessage
+from .context_builder import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Meggy, "
+    "their AI companion. Rewrite the current summary so it also covers the new "
+    "messages. Keep names, facts, decisions, commitments and open questions; drop "
+    "greetings and small talk. Write plain prose of at most {words} words and reply "
+    "with the summary only."
+)
+
+
+class DjangoSummaryStore:
+    """Reads and writes rolling summaries on the Django Conversation model."""
+    
+    def __init__(self, message_model, conversation_model):
+        """
+        Args:
+            message_model: Django Message model class
+            conversation_model: Django Conversation model class
+        """
+        self.message_model = message_model
+        self.conversation_model = conversation_model
+    
+    async def load(self, conversation_id: str) -> Tuple[str, Optional[datetime]]:
+        """The stored summary and the creation time of the last message it covers."""
+        row = await self.conversation_model.objects.filter(
+            id=conversation_id
+        ).values('summary', 'summary_through').afirst()
+        if row is None:
+            return "", None
+        return row['summary'], row['summary_through']
+    
+    async def pending(
+        self,
+        conversation_id: str,
+        through: Optional[datetime],
+        keep_recent: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Oldest messages not yet summarized, leaving the newest ``keep_recent`` alone.
+        
+        Returns:
+            Up to ``limit`` messages, oldest first
+        """
+        queryset = self.message_model.objects.filter(conversation_id=conversation_id)
+        if through is not None:
+            queryset = queryset.filter(created_at__gt=through)
+        rows = [
+            row async for row in queryset.order_by('created_at').values(
+                'role', 'content', 'created_at'
+            )[:limit + keep_recent]
+        ]
+        return rows[:max(0, len(rows) - keep_recent)][:limit]
+    
+    async def save(
+        self,
+        conversation_id: str,
+        summary: str,
+        previous_through: Optional[datetime],
+        through: datetime
+    ) -> bool:
+        """
+        Store a new summary unless another worker advanced it first.
+        
+        Returns:
+            Whether the summary was written
+        """
+        updated = await self.conversation_model.objects.filter(
+            id=conversation_id, summary_through=previous_through
+        ).aupdate(summary=summary, summary_through=through)
+        return updated == 1
+
+
+class ConversationSummarizer:
+    """
+    Maintains a rolling summary per conversation so old turns leave the prompt.
+    
+    After a turn completes, ``schedule`` starts a background update that folds
+    the oldest unsummarized messages (everything but the newest
+    ``keep_recent``) into the stored summary with one LLM call. Updates wait
+    until ``min_batch`` messages have accumulated, so most turns cost nothing,
+    and fold at most ``max_batch`` at a time so a long backlog catches up over
+    several turns. The agent then sends the summary in place of the messages
+    it covers.
+    
+    Summaries are background generations: they only start while no user
+    turn is running or waiting for the model and never take a turn's slot,
+    so an update that finds the model busy is deferred to a later turn.
+    Background updates live on the event loop of the request that scheduled
+    them; one cut short by shutdown is simply redone after a later turn.
+    """
+    
+    def __init__(
+        self,
+        store: DjangoSummaryStore,
+        token_counter: Optional[TokenCounter] = None,
+        keep_recent: int = 20,
+        min_batch: int = 10,
+        max_batch: int = 40,
+        max_summary_tokens: int = 300,
+        max_message_tokens: int = 200
+    ):
+        """
+        Args:
+            store: Where summaries and messages are read and written
+            token_counter: Tokenizer used to cap each message in the summary prompt
+            keep_recent: Newest messages never folded into the summary
+            min_batch: Unsummarized messages needed before an update runs
+            max_batch: Most messages folded in by one update
+            max_summary_tokens: Reply budget for the summary
+            max_message_tokens: Longest a single message may be in the summary prompt
+        """
+        self.store = store
+        self.token_counter = token_counter or TokenCounter()
+        self.keep_recent = keep_recent
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.max_summary_tokens = max_summary_tokens
+        self.max_message_tokens = max_message_tokens
+        
+        # conversation_id -> running update; also keeps the task referenced
+        self._running: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "updates": 0,
+            "messages_folded": 0,
+            "failures": 0,
+            "conflicts": 0,
+            "deferred": 0,
+            "turns": 0,
+            "turns_with_summary": 0,
+            "tokens_saved": 0,
+        }
+    
+    def _incr(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+    
+    async def get(self, conversation_id: str) -> Tuple[str, Optional[datetime]]:
+        """The current summary and the creation time of the last message it covers."""
+        return await self.store.load(conversation_id)
+    
+    def schedule(
+        self,
+        conversation_id: str,
+        llm_client,
+        model: str,
+        context_window: Optional[int] = None
+    ) -> None:
+        """Start a background update for the conversation unless one is running."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            running = self._running.get(conversation_id)
+            if running is not None and not running.done():
+                return
+            task = loop.create_task(self.update(conversation_id, llm_client, model, context_window))
+            self._running[conversation_id] = task
+        task.add_done_callback(lambda t: self._finished(conversation_id, t))
+    
+    def _finished(self, conversation_id: str, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._running.get(conversation_id) is task:
+                del self._running[conversation_id]
+    
+    async def update(
+        self,
+        conversation_id: str,
+        llm_client,
+        model: str,
+        context_window: Optional[int] = None
+    ) -> bool:
+        """
+        Fold the oldest unsummarized messages into the summary.
+        
+        Args:
+            conversation_id: ID of the conversation
+            llm_client: Client used to write the summary
+            model: Model the summary is written with
+            context_window: The agent's ``num_ctx``, so the summary does not
+                make Ollama reload the model with a different context length
+        
+        Returns:
+            Whether a new summary was stored
+        """
+        try:
+            summary, through = await self.store.load(conversation_id)
+            pending = await self.store.pending(
+                conversation_id, through, self.keep_recent, self.max_batch
+            )
+            if len(pending) < self.min_batch:
+                return False
+            
+            response = await llm_client.generate(
+                messages=self._prompt(summary, pending),
+                model=model,
+                temperature=0.0,
+                max_tokens=self.max_summary_tokens,
+                context_window=context_window,
+                background=True
+            )
+            new_summary = response.get("content", "").strip()
+            if not new_summary:
+                self._incr("failures")
+                return False
+            
+            if not await self.store.save(
+                conversation_id, new_summary, through, pending[-1]["created_at"]
+            ):
+                # Another worker folded these messages first; its summary stands
+                self._incr("conflicts")
+                return False
+            
+            with self._lock:
+                self._stats["updates"] += 1
+                self._stats["messages_folded"] += len(pending)
+            logger.info(
+                f"Folded {len(pending)} messages into the summary of {conversation_id} "
+                f"({self.token_counter.count(new_summary)} tokens)"
+            )
+            return True
+        except asyncio.CancelledError:
+            raise
+        except AdmissionRejected:
+            # The model is busy with live turns; the next turn retries
+            self._incr("deferred")
+            return False
+        except Exception as e:
+            self._incr("failures")
+            logger.warning(f"Summary update failed for {conversation_id}: {e}")
+            return False
+    
+    def _prompt(self, summary: str, pending: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Messages asking the LLM to extend the summary with the pending messages."""
+        counter = self.token_counter
+        transcript = "\n".join(
+            f"{msg['role']}: {counter.truncate(msg['content'], self.max_message_tokens)}"
+            for msg in pending
+        )
+        # Roughly three words per four tokens
+        words = self.max_summary_tokens * 3 // 4
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=words)},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}"
+            },
+        ]
+    
+    @staticmethod
+    def covers(message: HistoryMessage, through: Optional[datetime]) -> bool:
+        """Whether a history message is already in the summary."""
+        if through is None or message.created_at is None:
+            return False
+        created_at = message.created_at
+        if created_at.tzinfo is None:
+            # Naive times are UTC (databases without time zone support)
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at <= through
+    
+    def record_turn(self, report: Dict[str, Any]) -> None:
+        """Add a turn's context report to the prompt-tokens-saved totals."""
+        with self._lock:
+            self._stats["turns"] += 1
+            if report.get("summary"):
+                self._stats["turns_with_summary"] += 1
+                self._stats["tokens_saved"] += report.get("summary_saved", 0)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Update counters and the prompt tokens saved by summaries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["running"] = len(self._running)
+        turns = stats["turns_with_summary"]
+        stats["avg_tokens_saved"] = stats["tokens_saved"] / turns if turns else 0.0
+        return stats
@@ -0,0 +1,35 @@
+import asyncio
+from unittest import TestCase
+
+from core.bruno_integration.admission import AdmissionController, AdmissionRejected
+
+ENDPOINT = "http://localhost:11434"
+
+
+class BackgroundSlotTests(TestCase):
+    def test_background_rejected_while_turn_runs(self):
+        admission = AdmissionController(max_concurrency=1)
+        
+        async def run():
+            async with admission.slot(ENDPOINT, "llama3.2"):
+                with self.assertRaises(AdmissionRejected):
+                    async with admission.background_slot(ENDPOINT, "llama3.2"):
+                        pass
+        asyncio.run(run())
+    
+    def test_turn_not_held_up_by_background(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=0)
+        
+        async def run():
+            async with admission.background_slot(ENDPOINT, "llama3.2"):
+                # A queue of zero would reject the turn if the summary held its slot
+                async with admission.slot(ENDPOINT, "llama3.2"):
+                    pass
+                with self.assertRaises(AdmissionRejected):
+                    async with admission.background_slot(ENDPOINT, "llama3.2"):
+                        pass
+            async with admission.background_slot(ENDPOINT, "llama3.2"):
+                pass
+        asyncio.run(run())
+        self.assertEqual(admission.stats()[f"{ENDPOINT}|llama3.2"]["in_flight"], 0)
+        self.assertEqual(admission.background_stats()[f"{ENDPOINT}|llama3.2"]["admitted"], 2)
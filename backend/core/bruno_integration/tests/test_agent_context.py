@@ -0,0 +1,39 @@
+import asyncio
+from unittest import TestCase, mock
+
+from core.bruno_integration.bruno_core import AgentConfig, BrunoAgent
+from core.bruno_integration.context_builder import ContextBuilder
+from core.bruno_integration.memory_extraction import memory_extractor
+
+
+class SlowNotes:
+    """Notes ability whose command takes longer than the context stage timeout."""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self.completed = False
+    
+    async def handle_notes_command(self, user_id, conversation_id, command):
+        await asyncio.sleep(self.delay)
+        self.completed = True
+        return "Note saved."
+
+
+class NotesStageTests(TestCase):
+    def test_slow_notes_command_is_not_cut_short(self):
+        notes = SlowNotes(delay=0.05)
+        llm_client = mock.Mock(generate=mock.AsyncMock())
+        agent = BrunoAgent(
+            AgentConfig(name="Bruno", model="llama3.2"),
+            llm_client,
+            notes_ability=notes,
+            context_builder=ContextBuilder(stage_timeout=0.01)
+        )
+        with mock.patch.object(memory_extractor, 'get_relevant_memories', mock.AsyncMock(return_value=[])):
+            response = asyncio.run(agent.process_message("add note buy milk", "conversation", user_id="user"))
+        
+        self.assertTrue(notes.completed)
+        self.assertTrue(response["is_notes_response"])
+        self.assertEqual(response["content"], "Note saved.")
+        self.assertNotIn("notes", response["context_timings"]["timed_out"])
+        llm_client.generate.assert_not_awaited()
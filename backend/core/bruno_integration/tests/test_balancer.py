@@ -0,0 +1,101 @@
+import asyncio
+from unittest import TestCase
+
+from core.bruno_integration.admission import AdmissionRejected
+from core.bruno_integration.balancer import OllamaBalancer
+
+URLS = ["http://ollama-a:11434", "http://ollama-b:11434"]
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        self.balancer = OllamaBalancer(URLS, session_pool=None, health_check_interval=None)
+    
+    def lease(self, error=None):
+        async def run():
+            async with self.balancer.lease("llama3.2", "conversation") as lease:
+                if error is not None:
+                    raise error
+                return lease.endpoint
+        return asyncio.run(run())
+    
+    def test_served_request_sets_affinity(self):
+        endpoint = self.lease()
+        self.assertEqual(endpoint.outstanding, 0)
+        self.assertEqual(self.balancer._last_served["conversation"], endpoint.url)
+    
+    def test_rejected_or_cancelled_request_is_not_served(self):
+        for error in (AdmissionRejected("ollama|llama3.2", "queue full", 1), asyncio.CancelledError()):
+            with self.assertRaises(type(error)):
+                self.lease(error)
+            self.assertEqual([e.outstanding for e in self.balancer.endpoints], [0, 0])
+            self.assertNotIn("conversation", self.balancer._last_served)
+            self.assertEqual([e.failures for e in self.balancer.endpoints], [0, 0])
+    
+    def test_only_requests_that_reach_the_node_count_in_stats(self):
+        with self.assertRaises(AdmissionRejected):
+            self.lease(AdmissionRejected("ollama|llama3.2", "queue full", 1))
+        for stats in self.balancer.stats():
+            self.assertEqual((stats["requests"], stats["prefix_hits"], stats["prefix_misses"]), (0, 0, 0))
+        
+        first = self.lease()
+        second = self.lease()
+        self.assertIs(first, second)
+        stats = next(s for s in self.balancer.stats() if s["url"] == first.url)
+        self.assertEqual((stats["requests"], stats["prefix_hits"], stats["prefix_misses"]), (2, 1, 1))
+
+
+class ConsistentHashTests(TestCase):
+    KEYS = [f"conversation-{i}" for i in range(2000)]
+    
+    def routes(self, balancer):
+        routes = {}
+        for key in self.KEYS:
+            lease = balancer.select("llama3.2", key)
+            balancer._release(lease)
+            routes[key] = lease.endpoint.url
+        return routes
+    
+    def balancer(self, urls):
+        # No saturation, so routing is purely the ring
+        return OllamaBalancer(urls, session_pool=None, health_check_interval=None, affinity_max_outstanding=None)
+    
+    def test_routing_is_stable_and_spread(self):
+        urls = URLS + ["http://ollama-c:11434"]
+        routes = self.routes(self.balancer(urls))
+        self.assertEqual(routes, self.routes(self.balancer(list(reversed(urls)))))
+        for url in urls:
+            share = sum(1 for routed in routes.values() if routed == url) / len(self.KEYS)
+            self.assertGreater(share, 0.2)
+    
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        balancer = self.balancer(URLS)
+        before = self.routes(balancer)
+        balancer.add_endpoint("http://ollama-c:11434")
+        after = self.routes(balancer)
+        
+        moved = [key for key in self.KEYS if before[key] != after[key]]
+        self.assertTrue(all(after[key] == "http://ollama-c:11434" for key in moved))
+        # Roughly its fair third, not a reshuffle
+        self.assertLess(len(moved) / len(self.KEYS), 0.45)
+    
+    def test_removing_a_node_only_moves_its_keys(self):
+        urls = URLS + ["http://ollama-c:11434"]
+        balancer = self.balancer(urls)
+        before = self.routes(balancer)
+        balancer.remove_endpoint("http://ollama-c:11434")
+        after = self.routes(balancer)
+        
+        for key in self.KEYS:
+            if before[key] != "http://ollama-c:11434":
+                self.assertEqual(after[key], before[key])
+    
+    def test_ejected_node_keys_come_back_after_recovery(self):
+        balancer = self.balancer(URLS)
+        before = self.routes(balancer)
+        ejected = balancer.endpoints[0]
+        ejected.ejected_until = float("inf")
+        during = self.routes(balancer)
+        self.assertTrue(all(url != ejected.url for url in during.values()))
+        ejected.ejected_until = 0.0
+        self.assertEqual(self.routes(balancer), before)
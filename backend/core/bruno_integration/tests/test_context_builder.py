@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from core.bruno_integration.bruno_memory import HistoryMessage
+from core.bruno_integration.context_builder import ContextBuilder, TokenCounter
+
+OVERHEAD = TokenCounter.MESSAGE_OVERHEAD
+
+
+def words(count, tag="w"):
+    return " ".join(f"{tag}{i}" for i in range(count))
+
+
+def message(role, content):
+    return HistoryMessage(role, content, None, "llama3.2", ())
+
+
+class ContextBuilderTests(TestCase):
+    def setUp(self):
+        # One token per word keeps the arithmetic readable
+        self.builder = ContextBuilder(
+            token_counter=TokenCounter(tokenize=lambda text: len(text.split())),
+            memory_share=0.25,
+            min_prompt_tokens=10
+        )
+        # Oldest first; each costs 10 words + overhead
+        self.history = [message("user" if i % 2 == 0 else "assistant", words(10, f"m{i}-")) for i in range(6)]
+    
+    def build(self, budget, **kwargs):
+        kwargs.setdefault("history", self.history)
+        return self.builder.build(budget, "You are Meggy", "What now", **kwargs)
+    
+    def test_everything_fits(self):
+        messages, report = self.build(1000)
+        self.assertEqual(report["history_included"], 6)
+        self.assertEqual([m["content"] for m in messages[1:-1]], [m.content for m in self.history])
+        self.assertEqual(messages[0], {"role": "system", "content": "You are Meggy"})
+        self.assertEqual(messages[-1], {"role": "user", "content": "What now"})
+        self.assertEqual(report["total"], 3 + 2 + 6 * 10 + 8 * OVERHEAD)
+    
+    def test_oldest_history_is_dropped_first(self):
+        # System and current take 13; room for three 14-token messages
+        messages, report = self.build(13 + 3 * 14 + 5)
+        self.assertEqual((report["history_included"], report["history_dropped"]), (3, 3))
+        self.assertEqual([m["content"] for m in messages[1:-1]], [m.content for m in self.history[-3:]])
+        self.assertLessEqual(report["total"], report["budget"])
+    
+    def test_history_stays_contiguous(self):
+        history = [message("user", "short"), message("assistant", words(50)), message("user", "newest")]
+        messages, report = self.build(13 + 5 + 20, history=history)
+        # The long message does not fit, so the short one before it is dropped too
+        self.assertEqual([m["content"] for m in messages[1:-1]], ["newest"])
+        self.assertEqual(report["history_dropped"], 2)
+    
+    def test_oversized_user_message_is_truncated_to_the_budget(self):
+        messages, report = self.builder.build(100, "You are Meggy", words(500), history=self.history)
+        self.assertTrue(report["current_truncated"])
+        self.assertEqual(report["history_included"], 0)
+        self.assertLessEqual(report["total"], 100)
+        self.assertTrue(messages[-1]["content"].endswith("[...truncated]"))
+    
+    def test_memories_are_capped_at_their_share(self):
+        memories = [{"value": words(10, f"mem{i}-")} for i in range(10)]
+        messages, report = self.build(
+            200, memories=memories, format_memories=lambda items: "\n".join(item["value"] for item in items)
+        )
+        self.assertLessEqual(report["memories"], 200 * 0.25)
+        self.assertEqual(report["memories_included"], 4)
+        self.assertEqual(report["memories_included"] + report["memories_dropped"], 10)
+        self.assertLessEqual(report["total"], 200)
+    
+    def test_summary_reports_tokens_saved(self):
+        summarized = [message("user", words(30)) for _ in range(4)]
+        _, report = self.build(1000, summary="They talked about milk", summarized=summarized)
+        # Header (5 words) plus summary (4 words)
+        self.assertEqual(report["summary"], 9 + OVERHEAD)
+        self.assertEqual(report["summary_saved"], 4 * (30 + OVERHEAD) - report["summary"])
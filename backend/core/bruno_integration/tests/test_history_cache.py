@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.chat.models import Conversation, Message
+from core.bruno_integration.bruno_memory import (
+    DjangoMemoryBackend, HistoryCache, HistoryMessage, MemoryManager, SharedVersions,
+)
+
+
+def record(content):
+    return HistoryMessage('user', content, None, 'llama3.2', ())
+
+
+class SharedVersionTests(unittest.TestCase):
+    """Two HistoryCache instances on one SharedVersions behave like two workers."""
+    
+    def setUp(self):
+        versions = SharedVersions(key_prefix=f'test:history:{uuid.uuid4().hex}:')
+        self.worker_a = HistoryCache(versions=versions)
+        self.worker_b = HistoryCache(versions=versions)
+    
+    def load(self, cache, messages):
+        async def run():
+            cached, token = await cache.lookup('conversation', 10)
+            if cached is None:
+                cache.fill('conversation', messages, token)
+            return cached
+        return asyncio.run(run())
+    
+    def test_write_in_another_worker_invalidates(self):
+        history = [record('one'), record('two')]
+        self.assertIsNone(self.load(self.worker_a, history))
+        self.assertEqual(self.load(self.worker_a, history), history)
+        
+        # Worker B saves a message; A's copy is now a version behind
+        self.worker_b.append('conversation', record('three'))
+        self.assertIsNone(self.load(self.worker_a, history + [record('three')]))
+        self.assertEqual([m.content for m in self.load(self.worker_a, [])], ['one', 'two', 'three'])
+    
+    def test_own_append_stays_current(self):
+        self.load(self.worker_a, [record('one')])
+        self.worker_a.append('conversation', record('two'))
+        self.assertEqual([m.content for m in self.load(self.worker_a, [])], ['one', 'two'])
+        self.assertEqual(self.worker_a.stats()['hits'], 1)
+    
+    def test_write_during_fill_discards_the_read(self):
+        async def run():
+            _, token = await self.worker_a.lookup('conversation', 10)
+            self.worker_a.append('conversation', record('two'))
+            self.worker_a.fill('conversation', [record('one')], token)
+            return await self.worker_a.lookup('conversation', 10)
+        
+        messages, token = asyncio.run(run())
+        self.assertIsNone(messages)
+        self.assertIsNotNone(token)
+
+
+class TrackWritesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='history@example.com', name='History', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+        cls.first = Message.objects.create(conversation=cls.conversation, role='user', content='Hello')
+    
+    def setUp(self):
+        self.cache = HistoryCache()
+        backend = DjangoMemoryBackend(Message, Conversation)
+        backend.track_writes(self.cache)
+        self.addCleanup(post_save.disconnect, sender=Message, dispatch_uid='bruno_history_cache_saved')
+        self.addCleanup(post_delete.disconnect, sender=Message, dispatch_uid='bruno_history_cache_deleted')
+        self.manager = MemoryManager(db_backend=backend, history_cache=self.cache)
+    
+    def history(self):
+        # async_to_sync keeps the ORM on this thread's connection and test transaction
+        messages = async_to_sync(self.manager.get_history)(str(self.conversation.pk), limit=10)
+        return [m.content for m in messages]
+    
+    def test_save_edit_and_delete_keep_the_cache_current(self):
+        self.assertEqual(self.history(), ['Hello'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = Message.objects.create(conversation=self.conversation, role='assistant', content='Hi')
+        self.assertEqual(self.history(), ['Hello', 'Hi'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reply.content = 'Hi there'
+            reply.save()
+        self.assertEqual(self.history(), ['Hello', 'Hi there'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reply.delete()
+        self.assertEqual(self.history(), ['Hello'])
+        self.assertEqual(self.cache.stats()['invalidations'], 2)
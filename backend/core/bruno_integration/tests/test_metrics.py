@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from core.bruno_integration.metrics import MetricsRegistry, MultiprocessStore
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+class MultiprocessStoreTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = MetricsRegistry()
+        self.registry.counter("bruno_test_total", "Test counter").inc(2)
+        self.registry.gauge("bruno_test_gauge", "Test gauge").set(1)
+        self.store = MultiprocessStore(self.directory, interval=3600)
+        self.store.ensure_running(self.registry)
+        # Keep the atexit hook from writing into the removed directory
+        self.addCleanup(setattr, self.store, "_registry", None)
+    
+    def write_worker(self, filename, pid, counter, gauge):
+        families = {
+            "bruno_test_total": {"kind": "counter", "help": "Test counter", "labelnames": [], "buckets": [],
+                                 "samples": [[[], counter]]},
+            "bruno_test_gauge": {"kind": "gauge", "help": "Test gauge", "labelnames": [], "buckets": [],
+                                 "samples": [[[], gauge]]},
+        }
+        with open(os.path.join(self.directory, filename), "w") as f:
+            json.dump({"pid": pid, "start": None, "written": 0, "families": families}, f)
+    
+    def values(self):
+        merged = self.store.collect()
+        return merged["bruno_test_total"].samples[()], merged["bruno_test_gauge"].samples[()]
+    
+    def test_snapshot_name_is_unique_per_worker_start(self):
+        other = MultiprocessStore(self.directory, interval=3600)
+        other.ensure_running(self.registry)
+        self.addCleanup(setattr, other, "_registry", None)
+        self.assertNotEqual(self.store._path, other._path)
+        self.assertTrue(os.path.basename(self.store._path).startswith(f"{os.getpid()}-"))
+    
+    def test_exited_workers_fold_into_retired_totals(self):
+        pid = exited_pid()
+        self.write_worker(f"{pid}-aaaa.json", pid, counter=3, gauge=5)
+        self.assertEqual(self.values(), (5, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f"{pid}-aaaa.json")))
+        
+        # A later worker reusing the pid keeps its own file and does not double count
+        self.write_worker(f"{pid}-bbbb.json", pid, counter=4, gauge=5)
+        self.assertEqual(self.values(), (9, 1))
+        self.assertEqual(self.values(), (9, 1))
+    
+    def test_retired_snapshot_left_behind_is_not_counted_twice(self):
+        pid = exited_pid()
+        self.write_worker(f"{pid}-aaaa.json", pid, counter=3, gauge=5)
+        self.store.collect()
+        # As if the fold crashed before removing the snapshot it had folded
+        self.write_worker(f"{pid}-aaaa.json", pid, counter=3, gauge=5)
+        self.assertEqual(self.values(), (5, 1))
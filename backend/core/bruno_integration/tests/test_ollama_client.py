@@ -0,0 +1,79 @@
+import asyncio
+from unittest import TestCase
+
+from core.bruno_integration.bruno_llm import OllamaClient
+
+
+class RecordingResponse:
+    status = 200
+    
+    async def json(self):
+        return {"message": {"role": "assistant", "content": "Hi"}, "done": True, "eval_count": 1}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class RecordingPool:
+    """Session pool stand-in that records request bodies instead of sending them."""
+    
+    def __init__(self):
+        self.payloads = []
+    
+    def request(self, method, url, **kwargs):
+        self.payloads.append(kwargs["json"])
+        return RecordingResponse()
+
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hello"}]
+
+
+class ContextWindowTests(TestCase):
+    def test_chat_request_sets_num_ctx(self):
+        client = OllamaClient(session_pool=RecordingPool())
+        _, payload, _ = client._build_request(
+            client.base_url, MESSAGES, "llama3.2", 0.7, 512, stream=False, context_window=8192
+        )
+        self.assertEqual(payload["options"], {"temperature": 0.7, "num_predict": 512, "num_ctx": 8192})
+    
+    def test_generate_request_sets_num_ctx(self):
+        client = OllamaClient(session_pool=RecordingPool(), api_mode="generate")
+        _, payload, _ = client._build_request(
+            client.base_url, MESSAGES, "llama3.2", 0.7, 512, stream=True, context_window=2048
+        )
+        self.assertEqual(payload["options"]["num_ctx"], 2048)
+    
+    def test_num_ctx_omitted_without_context_window(self):
+        client = OllamaClient(session_pool=RecordingPool())
+        _, payload, _ = client._build_request(client.base_url, MESSAGES, "llama3.2", 0.7, 512, stream=False)
+        self.assertNotIn("num_ctx", payload["options"])
+    
+    def test_generate_sends_context_window(self):
+        pool = RecordingPool()
+        client = OllamaClient(session_pool=pool)
+        response = asyncio.run(client.generate(MESSAGES, max_tokens=512, context_window=4096))
+        self.assertEqual(response["content"], "Hi")
+        self.assertEqual(pool.payloads[0]["options"]["num_ctx"], 4096)
+
+
+class GenerationFlightTests(TestCase):
+    def generate_twice(self, first, second):
+        pool = RecordingPool()
+        client = OllamaClient(session_pool=pool)
+        
+        async def run():
+            return await asyncio.gather(
+                client.generate(MESSAGES, conversation_id=first),
+                client.generate(MESSAGES, conversation_id=second)
+            )
+        asyncio.run(run())
+        return len(pool.payloads)
+    
+    def test_same_conversation_shares_generation(self):
+        self.assertEqual(self.generate_twice("conversation-a", "conversation-a"), 1)
+    
+    def test_other_conversations_generate_their_own(self):
+        self.assertEqual(self.generate_twice("conversation-a", "conversation-b"), 2)
@@ -0,0 +1,79 @@
+import asyncio
+from unittest import TestCase, mock
+
+from core.bruno_integration.response_cache import CacheTier, DjangoCacheTier, ResponseCache
+
+MESSAGES = [{"role": "system", "content": "Be brief"}, {"role": "user", "content": "Hi"}]
+REPLY = {"content": "Hello", "model": "llama3.2"}
+
+
+class CacheKeyTests(TestCase):
+    def test_key_covers_everything_that_shapes_the_reply(self):
+        base = dict(model="llama3.2", temperature=0, max_tokens=256, messages=MESSAGES, context_window=4096)
+        key = ResponseCache.make_key(**base)
+        self.assertEqual(key, ResponseCache.make_key(**base))
+        
+        variants = [
+            {"model": "mistral"},
+            {"temperature": 0.5},
+            {"max_tokens": 512},
+            {"messages": MESSAGES + [{"role": "assistant", "content": "Hello"}]},
+            {"messages": [{"role": "user", "content": "Be brief"}, MESSAGES[1]]},
+            {"context_window": 8192},
+            {"context_window": None},
+        ]
+        for variant in variants:
+            with self.subTest(variant=variant):
+                self.assertNotEqual(ResponseCache.make_key(**{**base, **variant}), key)
+    
+    def test_sampled_requests_bypass_the_cache(self):
+        cache = ResponseCache()
+        self.assertTrue(cache.cacheable(0))
+        self.assertFalse(cache.cacheable(0.7))
+        self.assertEqual(cache.stats()["bypassed"], 1)
+    
+    def test_cache_tier_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CacheTier()
+
+
+class ResponseCacheTests(TestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(ttl=10)
+        
+        async def run():
+            with mock.patch("core.bruno_integration.response_cache.time.monotonic", return_value=100.0):
+                await cache.set("key", REPLY)
+                self.assertEqual(await cache.get("key"), REPLY)
+            with mock.patch("core.bruno_integration.response_cache.time.monotonic", return_value=111.0):
+                self.assertIsNone(await cache.get("key"))
+        asyncio.run(run())
+        
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["expired"], stats["misses"], stats["entries"]), (1, 1, 1, 0))
+    
+    def test_shared_tier_answers_other_workers(self):
+        tier = DjangoCacheTier(key_prefix="test:llm:")
+        writer = ResponseCache(shared_tier=tier)
+        reader = ResponseCache(shared_tier=tier)
+        
+        async def run():
+            await writer.set("shared", REPLY)
+            return await reader.get("shared")
+        
+        self.assertEqual(asyncio.run(run()), REPLY)
+        self.assertEqual(reader.stats()["shared_hits"], 1)
+    
+    def test_broken_shared_tier_falls_back_to_local(self):
+        # An alias missing from settings.CACHES fails on every call
+        cache = ResponseCache(shared_tier=DjangoCacheTier(alias="missing"))
+        
+        async def run():
+            with self.assertLogs("core.bruno_integration.response_cache", "WARNING"):
+                await cache.set("key", REPLY)
+                self.assertIsNone(await cache.get("other"))
+            return await cache.get("key")
+        
+        self.assertEqual(asyncio.run(run()), REPLY)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
@@ -0,0 +1,97 @@
+import asyncio
+from unittest import TestCase
+
+from core.bruno_integration.single_flight import SingleFlight
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "reply"
+        
+        async def run():
+            return await asyncio.gather(*[flights.do("key", work) for _ in range(3)])
+        
+        self.assertEqual(asyncio.run(run()), ["reply"] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()["coalesced"], 2)
+    
+    def test_leader_failure_reaches_followers(self):
+        flights = SingleFlight()
+        
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("generation failed")
+        
+        async def run():
+            return await asyncio.gather(*[flights.do("key", work) for _ in range(3)], return_exceptions=True)
+        
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flights.stats()["in_flight"], 0)
+    
+    def test_cancelled_leader_leaves_call_to_followers(self):
+        flights = SingleFlight()
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "reply"
+        
+        async def run():
+            leader = asyncio.ensure_future(flights.do("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do("key", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            result = await follower
+            self.assertTrue(leader.cancelled())
+            return result
+        
+        self.assertEqual(asyncio.run(run()), "reply")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()["cancelled"], 0)
+    
+    def test_call_cancelled_once_every_caller_leaves(self):
+        flights = SingleFlight()
+        finished = []
+        
+        async def work():
+            await asyncio.sleep(1)
+            finished.append(1)
+        
+        async def run():
+            callers = [asyncio.ensure_future(flights.do("key", work)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0.01)
+        
+        asyncio.run(run())
+        self.assertEqual(finished, [])
+        self.assertEqual(flights.stats()["cancelled"], 1)
+    
+    def test_keys_are_isolated(self):
+        flights = SingleFlight()
+        
+        def work(value):
+            async def call():
+                await asyncio.sleep(0.01)
+                return value
+            return call
+        
+        async def run():
+            return await asyncio.gather(
+                flights.do(("conversation-a", "hi"), work("a")),
+                flights.do(("conversation-b", "hi"), work("b"))
+            )
+        
+        self.assertEqual(asyncio.run(run()), ["a", "b"])
+        self.assertEqual(flights.stats()["coalesced"], 0)
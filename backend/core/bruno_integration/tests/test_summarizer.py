@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.chat.models import Conversation, Message
+from core.bruno_integration.admission import AdmissionRejected
+from core.bruno_integration.bruno_memory import HistoryMessage
+from core.bruno_integration.summarizer import ConversationSummarizer, DjangoSummaryStore
+
+THROUGH = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def at(created_at):
+    return HistoryMessage('user', 'Hi', created_at, 'llama3.2', ())
+
+
+class CoversTests(unittest.TestCase):
+    def test_covers_messages_up_to_through(self):
+        covers = ConversationSummarizer.covers
+        self.assertTrue(covers(at(THROUGH - timedelta(seconds=1)), THROUGH))
+        self.assertTrue(covers(at(THROUGH), THROUGH))
+        self.assertFalse(covers(at(THROUGH + timedelta(microseconds=1)), THROUGH))
+    
+    def test_nothing_is_covered_without_a_summary_or_timestamp(self):
+        self.assertFalse(ConversationSummarizer.covers(at(THROUGH), None))
+        self.assertFalse(ConversationSummarizer.covers(at(None), THROUGH))
+    
+    def test_naive_times_are_utc(self):
+        naive = THROUGH.replace(tzinfo=None)
+        self.assertTrue(ConversationSummarizer.covers(at(naive), THROUGH))
+        self.assertFalse(ConversationSummarizer.covers(at(naive + timedelta(seconds=1)), THROUGH))
+
+
+class FakeStore:
+    def __init__(self, pending, saves=True):
+        self.pending_rows = pending
+        self.saves = saves
+        self.saved = None
+    
+    async def load(self, conversation_id):
+        return "", None
+    
+    async def pending(self, conversation_id, through, keep_recent, limit):
+        return self.pending_rows[:limit]
+    
+    async def save(self, conversation_id, summary, previous_through, through):
+        if self.saves:
+            self.saved = (summary, through)
+        return self.saves
+
+
+class UpdateTests(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            {'role': 'user', 'content': f'Message {i}', 'created_at': THROUGH + timedelta(minutes=i)}
+            for i in range(4)
+        ]
+    
+    def update(self, store, generate):
+        summarizer = ConversationSummarizer(store, keep_recent=0, min_batch=3)
+        client = mock.Mock(generate=mock.AsyncMock(side_effect=generate))
+        stored = asyncio.run(summarizer.update('conversation', client, 'llama3.2'))
+        return stored, summarizer.stats(), client
+    
+    def test_folds_pending_messages(self):
+        store = FakeStore(self.rows)
+        stored, stats, client = self.update(store, [{'content': ' A summary '}])
+        self.assertTrue(stored)
+        self.assertEqual(store.saved, ('A summary', self.rows[-1]['created_at']))
+        self.assertEqual((stats['updates'], stats['messages_folded']), (1, 4))
+        self.assertTrue(client.generate.await_args.kwargs['background'])
+    
+    def test_waits_for_a_full_batch(self):
+        stored, stats, client = self.update(FakeStore(self.rows[:2]), [{'content': 'unused'}])
+        self.assertFalse(stored)
+        client.generate.assert_not_awaited()
+    
+    def test_conflicting_save_keeps_the_other_summary(self):
+        stored, stats, _ = self.update(FakeStore(self.rows, saves=False), [{'content': 'Mine'}])
+        self.assertFalse(stored)
+        self.assertEqual((stats['conflicts'], stats['updates'], stats['failures']), (1, 0, 0))
+    
+    def test_busy_model_defers(self):
+        stored, stats, _ = self.update(FakeStore(self.rows), AdmissionRejected('ollama|llama3.2', 'busy', 1))
+        self.assertFalse(stored)
+        self.assertEqual((stats['deferred'], stats['failures']), (1, 0))
+
+
+class DjangoSummaryStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='summary@example.com', name='Summary', password='secret-pass')
+        cls.conversation, _ = Conversation.get_or_create_for_user(cls.user)
+    
+    def setUp(self):
+        self.store = DjangoSummaryStore(Message, Conversation)
+        self.id = str(self.conversation.pk)
+    
+    async def test_save_only_advances_from_the_expected_position(self):
+        self.assertTrue(await self.store.save(self.id, 'First', None, THROUGH))
+        # A worker that started from the old position loses
+        self.assertFalse(await self.store.save(self.id, 'Stale', None, THROUGH + timedelta(minutes=1)))
+        self.assertEqual(await self.store.load(self.id), ('First', THROUGH))
+        
+        later = THROUGH + timedelta(minutes=5)
+        self.assertTrue(await self.store.save(self.id, 'Second', THROUGH, later))
+        self.assertEqual(await self.store.load(self.id), ('Second', later))
@@ -0,0 +1,204 @@
+"""
+Bruno Tracing - Per-stage timings for a chat turn, carried in a contextvar
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from contextvars import ContextVar
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram kept per span name
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("bruno_trace", default=None)
+
+
+class _NoopSpan:
+    """Returned when no trace is active, so an untraced span costs one contextvar read."""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Trace:
+    """The spans recorded while handling one request, turn or connection message."""
+    __slots__ = ('name', 'started', 'spans', 'finished')
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        # (name, start offset ms, duration ms), in completion order
+        self.spans: List[Tuple[str, float, float]] = []
+        self.finished = False
+    
+    def add(self, name: str, started: float, duration_ms: float) -> None:
+        self.spans.append((name, (started - self.started) * 1000, duration_ms))
+
+
+class _Span:
+    """Times the enclosed block into the active trace."""
+    __slots__ = ('trace', 'name', 'started')
+    
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.started, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _TraceScope:
+    """Makes a new trace current for the enclosed block and reports it on exit."""
+    __slots__ = ('tracer', 'trace', 'token')
+    
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.trace = Trace(name)
+    
+    def __enter__(self):
+        self.token = _current.set(self.trace)
+        return self.trace
+    
+    def __exit__(self, *exc):
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            # Exited from a different context, e.g. an async generator resumed elsewhere
+            _current.set(None)
+        self.tracer.finish(self.trace)
+        return False
+
+
+def span(name: str):
+    """
+    Time a block into the current trace, if there is one.
+    
+    Works in sync and async code alike (``with span("history.query"):``).
+    Spans started in tasks created inside the block, such as concurrent
+    stages under ``asyncio.gather``, land in the same trace.
+    """
+    trace = _current.get()
+    if trace is None or trace.finished:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def record(name: str, duration_ms: float) -> None:
+    """Add a duration measured elsewhere (e.g. reported by Ollama) to the current trace."""
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        # Assume it just ended, so the span sorts where it ran
+        trace.add(name, time.perf_counter() - duration_ms / 1000, duration_ms)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+class Tracer:
+    """
+    Starts traces and aggregates their spans into per-name latency histograms.
+    
+    A finished trace is logged as one line (at INFO when slower than
+    ``slow_ms``, DEBUG otherwise) and folded into the totals served by the
+    metrics endpoint. When disabled, no trace is started and every ``span``
+    call is a no-op.
+    """
+    
+    def __init__(self, enabled: bool = True, slow_ms: float = 1000.0):
+        """
+        Args:
+            enabled: Whether traces are recorded at all
+            slow_ms: Traces at least this slow are logged at INFO
+        """
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        # span name -> [count, total ms, max ms, per-bucket counts (last is +Inf)]
+        self._totals: Dict[str, List[Any]] = {}
+    
+    def configure(self, enabled: Optional[bool] = None, slow_ms: Optional[float] = None) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+    
+    def trace(self, name: str):
+        """
+        Start a trace for the enclosed block.
+        
+        Nested under an active trace it is just a span, so entry points that
+        call each other produce one trace.
+        """
+        if not self.enabled:
+            return _NOOP
+        if _current.get() is not None:
+            return span(name)
+        return _TraceScope(self, name)
+    
+    def finish(self, trace: Trace) -> None:
+        """Log a completed trace and add its spans to the totals."""
+        trace.finished = True
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        spans = sorted(trace.spans, key=lambda s: s[1])
+        
+        level = logging.INFO if total_ms >= self.slow_ms else logging.DEBUG
+        if logger.isEnabledFor(level):
+            breakdown = " ".join(f"{name}={duration:.1f}ms" for name, _, duration in spans)
+            logger.log(level, f"Trace {trace.name} took {total_ms:.1f}ms: {breakdown}")
+        
+        with self._lock:
+            self._observe(trace.name, total_ms)
+            for name, _, duration in spans:
+                self._observe(name, duration)
+    
+    def _observe(self, name: str, duration_ms: float) -> None:
+        totals = self._totals.get(name)
+        if totals is None:
+            totals = self._totals[name] = [0, 0.0, 0.0, [0] * (len(BUCKETS_MS) + 1)]
+        totals[0] += 1
+        totals[1] += duration_ms
+        totals[2] = max(totals[2], duration_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if duration_ms <= bound:
+                totals[3][i] += 1
+                break
+        else:
+            totals[3][-1] += 1
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Count, total, mean, max and histogram for every trace and span name."""
+        with self._lock:
+            snapshot = {name: (t[0], t[1], t[2], list(t[3])) for name, t in self._totals.items()}
+        return {
+            name: {
+                "count": count,
+                "total_ms": round(total, 1),
+                "avg_ms": round(total / count, 1) if count else 0.0,
+                "max_ms": round(peak, 1),
+                "buckets": dict(zip([*map(str, BUCKETS_MS), "+Inf"], buckets)),
+            }
+            for name, (count, total, peak, buckets) in sorted(snapshot.items())
+        }
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+# Process-wide tracer used by the chat pipeline
+tracer = Tracer()
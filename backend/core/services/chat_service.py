@@ -1,20 +1,38 @@
 """
 Chat Service - Handles chat operations with Bruno integration
 """
-from typing import Dict, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 import logging
 from asgiref.sync import sync_to_async
+from django.conf import settings
 
-from apps.chat.models import Conversation, Message
+from apps.chat.models import Conversation, DailyUsage, Message
 from apps.agents.models import Agent
 from core.bruno_integration import (
     BrunoAgent,
     AgentConfig,
     LLMFactory,
+    OllamaSessionPool,
+    AdmissionController,
+    AdmissionRejected,
+    OllamaBalancer,
+    ResponseCache,
+    DjangoCacheTier,
+    SingleFlight,
+    ContextBuilder,
+    ConversationSummarizer,
+    DjangoSummaryStore,
     MemoryManager,
     DjangoMemoryBackend,
+    HistoryCache,
+    SharedVersions,
+    tracer,
+    span,
+    registry,
+    Family,
     create_default_abilities
 )
+from core.bruno_integration.tracing import BUCKETS_MS
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +44,92 @@ class ChatService:
         """Initialize chat service."""
         self.agent_instances: Dict[str, BrunoAgent] = {}
         self.memory_backend = DjangoMemoryBackend(Message, Conversation)
-        self.memory_manager = MemoryManager(db_backend=self.memory_backend)
+        
+        # Recent messages of active conversations, kept current as messages are saved
+        self.history_cache = None
+        if settings.BRUNO_HISTORY_CACHE_SIZE:
+            alias = settings.BRUNO_HISTORY_CACHE_ALIAS
+            self.history_cache = HistoryCache(
+                max_conversations=settings.BRUNO_HISTORY_CACHE_SIZE,
+                max_messages=settings.BRUNO_HISTORY_CACHE_MESSAGES,
+                versions=SharedVersions(alias) if alias else None
+            )
+            self.memory_backend.track_writes(self.history_cache)
+        self.memory_manager = MemoryManager(db_backend=self.memory_backend, history_cache=self.history_cache)
         self.ability_manager = create_default_abilities()
         
+        # Keep-alive HTTP transport shared by every agent's LLM client
+        self.session_pool = OllamaSessionPool(
+            limit=settings.OLLAMA_POOL_LIMIT,
+            limit_per_host=settings.OLLAMA_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.OLLAMA_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.OLLAMA_DNS_CACHE_TTL,
+            connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT
+        )
+        
+        # Ollama endpoints shared by every agent, so load and health are tracked globally
+        self.balancer = OllamaBalancer(
+            urls=settings.OLLAMA_ENDPOINTS,
+            session_pool=self.session_pool,
+            health_check_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL,
+            health_check_timeout=settings.OLLAMA_HEALTH_CHECK_TIMEOUT,
+            max_failures=settings.OLLAMA_MAX_FAILURES,
+            eject_seconds=settings.OLLAMA_EJECT_SECONDS,
+            affinity_max_outstanding=settings.OLLAMA_AFFINITY_MAX_OUTSTANDING,
+            virtual_nodes=settings.OLLAMA_AFFINITY_VIRTUAL_NODES
+        )
+        
+        # Opt-in cache of deterministic completions, optionally shared through Django's cache
+        self.response_cache = None
+        if settings.OLLAMA_RESPONSE_CACHE_ENABLED:
+            alias = settings.OLLAMA_RESPONSE_CACHE_ALIAS
+            self.response_cache = ResponseCache(
+                ttl=settings.OLLAMA_RESPONSE_CACHE_TTL,
+                max_entries=settings.OLLAMA_RESPONSE_CACHE_SIZE,
+                shared_tier=DjangoCacheTier(alias) if alias else None
+            )
+        
+        # Concurrent identical work shares one call: per generation and per conversation turn
+        self.generation_flights = SingleFlight("ollama generate")
+        self.turn_flights = SingleFlight("chat turn")
+        
+        # Bounded concurrency and wait queue per Ollama endpoint and model
+        self.admission = AdmissionController(
+            max_concurrency=settings.OLLAMA_MAX_CONCURRENCY,
+            max_queue=settings.OLLAMA_MAX_QUEUE,
+            queue_timeout=settings.OLLAMA_QUEUE_TIMEOUT,
+            model_concurrency=settings.OLLAMA_MODEL_CONCURRENCY
+        )
+        
+        # Prompt assembly shared by every agent, so token counts are cached across them
+        self.context_builder = ContextBuilder(
+            memory_share=settings.BRUNO_CONTEXT_MEMORY_SHARE,
+            history_candidates=settings.BRUNO_CONTEXT_HISTORY_CANDIDATES,
+            memory_candidates=settings.BRUNO_CONTEXT_MEMORY_CANDIDATES,
+            stage_timeout=settings.BRUNO_CONTEXT_STAGE_TIMEOUT
+        )
+        
+        # Older turns are folded into a per-conversation summary after each turn
+        self.summarizer = None
+        if settings.BRUNO_SUMMARY_ENABLED:
+            self.summarizer = ConversationSummarizer(
+                store=DjangoSummaryStore(Message, Conversation),
+                token_counter=self.context_builder.token_counter,
+                keep_recent=settings.BRUNO_SUMMARY_KEEP_RECENT,
+                min_batch=settings.BRUNO_SUMMARY_MIN_BATCH,
+                max_batch=settings.BRUNO_SUMMARY_MAX_BATCH,
+                max_summary_tokens=settings.BRUNO_SUMMARY_MAX_TOKENS
+            )
+        
+        # Per-stage timings for every turn, logged and served by the metrics endpoint
+        tracer.configure(
+            enabled=settings.BRUNO_TRACING_ENABLED,
+            slow_ms=settings.BRUNO_TRACE_SLOW_MS
+        )
+        
+        # Load and cache gauges are read from the components at scrape time
+        registry.register_collector(self.collect_metrics)
+        
         # Initialize notes ability
         from core.bruno_integration.notes_ability import NotesAbility
         self.notes_ability = NotesAbility()
@@ -59,15 +160,27 @@ class ChatService:
                 temperature=agent.temperature,
                 max_tokens=agent.max_tokens,
                 system_prompt=agent.system_prompt,
-                llm_provider=agent.llm_provider
+                llm_provider=agent.llm_provider,
+                context_window=settings.OLLAMA_MODEL_CONTEXT_WINDOWS.get(
+                    agent.model, settings.OLLAMA_CONTEXT_WINDOW
+                )
             )
         
-        config = await get_agent_config()
+        with span('agent.load'):
+            config = await get_agent_config()
         
         # Create LLM client
         llm_client = LLMFactory.create_client(
             provider=config.llm_provider,
-            base_url='http://localhost:11434'  # Ollama default URL
+            base_url=settings.OLLAMA_BASE_URL,
+            session_pool=self.session_pool,
+            api_mode=settings.OLLAMA_API_MODE,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE or None,
+            context_cache_size=settings.OLLAMA_CONTEXT_CACHE_SIZE,
+            admission=self.admission,
+            balancer=self.balancer,
+            response_cache=self.response_cache,
+            single_flight=self.generation_flights
         )
         
         # Create Bruno agent
@@ -75,7 +188,9 @@ class ChatService:
             config=config,
             llm_client=llm_client,
             memory_manager=self.memory_manager,
-            notes_ability=self.notes_ability
+            notes_ability=self.notes_ability,
+            context_builder=self.context_builder,
+            summarizer=self.summarizer
         )
         
         # Cache the agent instance
@@ -84,6 +199,70 @@ class ChatService:
         logger.info(f"Created Bruno agent for agent_id: {agent_id}")
         return bruno_agent
     
+    async def send_turn(
+        self,
+        conversation: Conversation,
+        content: str,
+        user_id: str
+    ) -> Tuple[Message, Message, Dict[str, Any]]:
+        """
+        Run a whole chat turn: persist the user message, generate the reply
+        and record it.
+        
+        A message resubmitted while the same turn is still running (a retry or
+        double submit) joins that turn instead of starting another, and gets
+        the messages it saved, so the turn is generated, stored and counted
+        once. When the turn is rejected by admission control, the user message
+        is deleted again so the client can resend it.
+        
+        Args:
+            conversation: Conversation the turn belongs to, with its agent loaded
+            content: User's input message
+            user_id: ID of the user
+            
+        Returns:
+            ``(user_message, assistant_message, response)``
+            
+        Raises:
+            AdmissionRejected: When the model is saturated and the turn should be retried later
+        """
+        return await self.turn_flights.do(
+            (str(conversation.id), str(conversation.agent_id), user_id, content),
+            lambda: self._send_turn(conversation, content, user_id)
+        )
+    
+    async def _send_turn(
+        self,
+        conversation: Conversation,
+        content: str,
+        user_id: str
+    ) -> Tuple[Message, Message, Dict[str, Any]]:
+        with span('message.create'):
+            user_message = await conversation.aadd_user_message(content)
+        
+        try:
+            with span('chat.process'):
+                response = await self.process_message(
+                    conversation_id=str(conversation.id),
+                    user_message=content,
+                    agent_id=str(conversation.agent_id),
+                    user_id=user_id
+                )
+        except AdmissionRejected:
+            # The turn never started
+            await user_message.adelete()
+            raise
+        
+        with span('reply.record'):
+            assistant_message = await self.record_reply(
+                conversation=conversation,
+                agent=conversation.agent,
+                user_message=user_message,
+                response=response,
+                user_id=user_id
+            )
+        return user_message, assistant_message, response
+    
     async def process_message(
         self,
         conversation_id: str,
@@ -102,6 +281,9 @@ class ChatService:
             
         Returns:
             Dict with response content and metadata
+            
+        Raises:
+            AdmissionRejected: When the model is saturated and the turn should be retried later
         """
         try:
             # Get or create agent
@@ -116,6 +298,8 @@ class ChatService:
             
             return response
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}", exc_info=True)
             return {
@@ -124,6 +308,114 @@ class ChatService:
                 "error": str(e)
             }
     
+    async def stream_message(
+        self,
+        conversation_id: str,
+        user_message: str,
+        agent_id: str,
+        user_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user message, yielding response tokens as they are generated.
+        
+        Args:
+            conversation_id: ID of the conversation
+            user_message: User's input message
+            agent_id: ID of the agent to use
+            user_id: ID of the user (for notes functionality)
+            
+        Yields:
+            ``token`` events followed by a single ``done`` event with the
+            response content and metadata
+        """
+        try:
+            agent = await self.get_or_create_agent(agent_id)
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}", exc_info=True)
+            yield {
+                "type": "done",
+                "content": "I apologize, but I encountered an error. Please try again.",
+                "success": False,
+                "error": str(e)
+            }
+            return
+        
+        async for event in agent.process_message_stream(
+            user_message=user_message,
+            conversation_id=conversation_id,
+            user_id=user_id
+        ):
+            yield event
+    
+    async def record_reply(
+        self,
+        conversation: Conversation,
+        agent: Agent,
+        user_message: Message,
+        response: Dict[str, Any],
+        user_id: str
+    ) -> Message:
+        """
+        Persist the assistant reply and its usage for a turn, extract long-term
+        memories and schedule the background summary update.
+        
+        Args:
+            conversation: Conversation the turn belongs to
+            agent: Agent that produced the reply
+            user_message: The persisted user message that started the turn
+            response: Final response dict from the agent
+            user_id: ID of the user
+            
+        Returns:
+            The created assistant Message
+        """
+        usage = Message.usage_fields(response)
+        with span('reply.save'):
+            assistant_message = await Message.objects.acreate(
+                conversation=conversation,
+                role='assistant',
+                content=response.get('content', 'I apologize, but I encountered an error.'),
+                model=response.get('model', agent.model),
+                **usage
+            )
+        
+        try:
+            with span('usage.record'):
+                await DailyUsage.arecord(
+                    conversation.user_id,
+                    assistant_message.created_at.date(),
+                    usage
+                )
+        except Exception as usage_error:
+            # The reply is saved; rebuild_daily_usage can restore the rollup from messages
+            logger.warning(f"Usage rollup failed: {usage_error}")
+        
+        # Extract and save long-term memories from user message
+        try:
+            from core.bruno_integration.memory_extraction import memory_extractor
+            await memory_extractor.extract_memories_from_conversation(
+                user_id=user_id,
+                conversation_text=user_message.content,
+                message_id=str(user_message.id)
+            )
+        except Exception as mem_error:
+            # Don't fail the turn if memory extraction fails
+            logger.warning(f"Memory extraction failed: {mem_error}")
+        
+        if self.summarizer:
+            try:
+                bruno_agent = await self.get_or_create_agent(str(agent.id))
+                self.summarizer.schedule(
+                    str(conversation.id),
+                    bruno_agent.llm_client,
+                    bruno_agent.config.model,
+                    bruno_agent.config.context_window
+                )
+            except Exception as summary_error:
+                logger.warning(f"Could not schedule summary update: {summary_error}")
+        
+        return assistant_message
+    
     async def create_conversation(
         self,
         user_id: str,
@@ -167,7 +459,129 @@ class ChatService:
     ) -> list:
         """Get conversation message history."""
         messages = await self.memory_manager.get_history(conversation_id, limit)
-        return messages
+        return [message.as_dict() for message in messages]
+    
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of this worker's chat pipeline counters.
+        
+        Returns:
+            Per-stage trace timings plus the LLM transport, admission,
+            balancing, caching, coalescing and summary counters
+        """
+        return {
+            "traces": tracer.stats(),
+            "pool": self.session_pool.stats(),
+            "admission": self.admission.stats(),
+            "admission_background": self.admission.background_stats(),
+            "endpoints": self.balancer.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "history_cache": self.history_cache.stats() if self.history_cache else None,
+            "single_flight": {
+                "generation": self.generation_flights.stats(),
+                "turn": self.turn_flights.stats(),
+            },
+            "summarizer": self.summarizer.stats() if self.summarizer else None,
+        }
+    
+    def collect_metrics(self) -> List[Family]:
+        """Prometheus families for in-flight generations, queues, caches, summaries and trace spans."""
+        in_flight = Family(
+            'bruno_ollama_in_flight_generations', 'gauge',
+            'Generations currently running, by endpoint and model',
+            ['endpoint', 'model']
+        )
+        queue_depth = Family(
+            'bruno_ollama_queue_depth', 'gauge',
+            'Generations waiting for a slot, by endpoint and model',
+            ['endpoint', 'model']
+        )
+        for key, stats in self.admission.stats().items():
+            labels = tuple(key.split('|', 1))
+            in_flight.samples[labels] = stats['in_flight']
+            queue_depth.samples[labels] = stats['queue_depth']
+        
+        prefix = Family(
+            'bruno_ollama_prefix_affinity_total', 'counter',
+            'Generations routed to the endpoint that evaluated the conversation before',
+            ['endpoint', 'result']
+        )
+        for endpoint in self.balancer.stats():
+            prefix.samples[(endpoint['url'], 'hit')] = endpoint['prefix_hits']
+            prefix.samples[(endpoint['url'], 'miss')] = endpoint['prefix_misses']
+        
+        response_cache = Family(
+            'bruno_response_cache_lookups_total', 'counter',
+            'LLM response cache lookups by result',
+            ['result']
+        )
+        if self.response_cache:
+            stats = self.response_cache.stats()
+            for result in ('hits', 'shared_hits', 'misses', 'bypassed'):
+                response_cache.samples[(result,)] = stats[result]
+        
+        history_cache = Family(
+            'bruno_history_cache_lookups_total', 'counter',
+            'Conversation history cache lookups by result',
+            ['result']
+        )
+        if self.history_cache:
+            stats = self.history_cache.stats()
+            for result in ('hits', 'misses', 'bypassed'):
+                history_cache.samples[(result,)] = stats[result]
+        
+        token_cache = Family(
+            'bruno_token_count_cache_lookups_total', 'counter',
+            'Memoized token count lookups by result',
+            ['result']
+        )
+        info = self.context_builder.token_counter.cache_info()
+        token_cache.samples[('hit',)] = info.hits
+        token_cache.samples[('miss',)] = info.misses
+        
+        summary_updates = Family(
+            'bruno_summary_updates_total', 'counter',
+            'Rolling summary updates by result',
+            ['result']
+        )
+        summary_turns = Family(
+            'bruno_summary_turns_total', 'counter',
+            'Turns whose prompt was built with or without a rolling summary',
+            ['summary']
+        )
+        tokens_saved = Family(
+            'bruno_summary_prompt_tokens_saved_total', 'counter',
+            'Prompt tokens saved by summaries; divide by turns with a summary for the average'
+        )
+        summaries_running = Family(
+            'bruno_summary_updates_running', 'gauge',
+            'Summary updates currently running'
+        )
+        if self.summarizer:
+            stats = self.summarizer.stats()
+            for result, key in (('updated', 'updates'), ('failed', 'failures'),
+                                ('conflict', 'conflicts'), ('deferred', 'deferred')):
+                summary_updates.samples[(result,)] = stats[key]
+            summary_turns.samples[('used',)] = stats['turns_with_summary']
+            summary_turns.samples[('none',)] = stats['turns'] - stats['turns_with_summary']
+            tokens_saved.samples[()] = stats['tokens_saved']
+            summaries_running.samples[()] = stats['running']
+        
+        spans = Family(
+            'bruno_trace_span_seconds', 'histogram',
+            'Duration of each traced stage of a chat turn',
+            ['span'],
+            buckets=[bound / 1000 for bound in BUCKETS_MS]
+        )
+        for name, stats in tracer.stats().items():
+            spans.samples[(name,)] = [
+                list(stats['buckets'].values()), stats['total_ms'] / 1000, stats['count']
+            ]
+        
+        return [
+            in_flight, queue_depth, prefix, response_cache, history_cache, token_cache,
+            summary_updates, summary_turns, tokens_saved, summaries_running, spans
+        ]
     
     def clear_agent_cache(self, agent_id: Optional[str] = None):
         """Clear cached agent instances."""